@@ -0,0 +1,93 @@
+#!/usr/bin/env python2
+# coding=utf-8
+
+"""
+Measures the peak memory usage of "gitver update" and "gitver preview" as the
+template size grows
+
+A throw-away repository is created in a temporary directory, then templates of
+increasing size, holding just a few placeholders, are rendered: the peak
+resident set size of each gitver process is reported.
+
+    python2 bench/render_memory.py [size in MiB, ...]
+"""
+
+import os
+import sys
+import shutil
+import tempfile
+import subprocess
+
+GITVER = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'bin',
+                      'gitver')
+
+DEFAULT_SIZES = [1, 16, 64, 256]
+
+FILLER = 'component "libfoo" license "MIT" checksum "0123456789abcdef"\n'
+
+
+def git(cwd, *args):
+    with open(os.devnull, 'w') as null:
+        subprocess.check_call(['git'] + list(args), cwd=cwd, stdout=null)
+
+
+def make_repo():
+    path = tempfile.mkdtemp(prefix='gitver-bench-')
+    git(path, 'init', '-q')
+    git(path, 'config', 'user.name', 'bench')
+    git(path, 'config', 'user.email', 'bench@localhost')
+    git(path, 'commit', '-q', '--allow-empty', '-m', 'initial')
+    git(path, 'tag', '-a', '-m', 'v1.0.0', 'v1.0.0')
+    git(path, 'commit', '-q', '--allow-empty', '-m', 'second')
+    run(path, 'init')
+    os.mkdir(os.path.join(path, 'out'))
+    return path
+
+
+def make_template(repo, mib):
+    name = 'sbom-' + str(mib)
+    path = os.path.join(repo, '.gitver', 'templates', name)
+    with open(path, 'wb') as fp:
+        fp.write('# out/' + name + '.txt\n')
+        fp.write('version ${CURRENT_VERSION} build ${BUILD_ID}\n')
+        block = FILLER * (1024 * 1024 / len(FILLER) + 1)
+        for i in range(mib):
+            fp.write(block[:1024 * 1024])
+        fp.write('end of ${CURRENT_VERSION}\n')
+    return name
+
+
+def run(repo, *args):
+    """
+    Runs gitver in the specified repository and returns its peak resident set
+    size, in KiB.
+    """
+    with open(os.devnull, 'w') as null:
+        p = subprocess.Popen([sys.executable, GITVER] + list(args),
+                             cwd=repo, stdout=null, stderr=null)
+        _, status, usage = os.wait4(p.pid, 0)
+    if status != 0:
+        raise RuntimeError("gitver " + ' '.join(args) + " failed")
+    return usage.ru_maxrss
+
+
+def main():
+    sizes = [int(a) for a in sys.argv[1:]] or DEFAULT_SIZES
+
+    repo = make_repo()
+    try:
+        print "%10s %14s %14s" % ("size (MiB)", "update (KiB)",
+                                  "preview (KiB)")
+        for mib in sizes:
+            name = make_template(repo, mib)
+            update = run(repo, 'update', name)
+            preview = run(repo, 'preview', name)
+            print "%10d %14d %14d" % (mib, update, preview)
+            os.unlink(os.path.join(repo, 'out', name + '.txt'))
+            os.unlink(os.path.join(repo, '.gitver', 'templates', name))
+    finally:
+        shutil.rmtree(repo)
+
+
+if __name__ == '__main__':
+    main()
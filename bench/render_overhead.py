@@ -0,0 +1,99 @@
+#!/usr/bin/env python2
+# coding=utf-8
+
+"""
+Checks that rendering templates doesn't add a fixed delay to "gitver update"
+
+A throw-away repository is created in a temporary directory, then "gitver
+current" and "gitver update" with one and with several small templates are
+timed: since computing the version is the same for all of them, the time
+"update" takes on top of "current" is all rendering and writing the outputs,
+which for a few lines of text must stay under the budget (i.e. no worker pool
+taking its time to shut down). The exit status is non-zero if it doesn't.
+
+    python2 bench/render_overhead.py [--runs N] [--budget MS]
+"""
+
+import os
+import sys
+import time
+import shutil
+import argparse
+import subprocess
+
+from render_memory import GITVER, make_repo
+
+TEMPLATES = 4
+
+
+def make_templates(repo, count):
+    names = []
+    for i in range(count):
+        name = 'small-' + str(i)
+        path = os.path.join(repo, '.gitver', 'templates', name)
+        with open(path, 'w') as fp:
+            fp.write('# out/' + name + '.txt\n')
+            fp.write('version ${CURRENT_VERSION} build ${BUILD_ID}\n')
+        names.append(name)
+    return names
+
+
+def median(repo, args, runs):
+    """
+    Runs gitver with the specified arguments, once to warm up its caches then
+    the specified number of times, and returns the median wall time.
+    """
+    cmd = [sys.executable, GITVER] + list(args)
+    samples = []
+    with open(os.devnull, 'w') as null:
+        for i in range(runs + 1):
+            started = time.time()
+            subprocess.check_call(cmd, cwd=repo, stdout=null, stderr=null)
+            samples.append(time.time() - started)
+    samples = sorted(samples[1:])
+    return samples[len(samples) // 2]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Checks the time rendering "
+                                                 "templates adds to gitver "
+                                                 "update.")
+    parser.add_argument('--runs',
+                        help='Runs per measurement (default: 21).',
+                        type=int,
+                        default=21)
+    parser.add_argument('--budget',
+                        help='Time rendering may add, in milliseconds '
+                             '(default: 40).',
+                        type=float,
+                        default=40.0)
+    args = parser.parse_args()
+
+    repo = make_repo()
+    try:
+        names = make_templates(repo, TEMPLATES)
+        base = median(repo, ['current'], args.runs)
+        print "%-24s %8.1fms" % ("current", base * 1000)
+
+        over = []
+        for label, templates in [('update (1 template)', names[:1]),
+                                 ('update (%d templates)' % len(names),
+                                  names)]:
+            elapsed = median(repo, ['update'] + templates, args.runs)
+            extra = (elapsed - base) * 1000
+            print "%-24s %8.1fms %+8.1fms%s" % (
+                label, elapsed * 1000, extra,
+                "  OVER BUDGET" if extra > args.budget else "")
+            if extra > args.budget:
+                over.append(label)
+    finally:
+        shutil.rmtree(repo)
+
+    if len(over) > 0:
+        print "\n%d measurement(s) over the %.0f ms budget" % (len(over),
+                                                               args.budget)
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
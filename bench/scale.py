@@ -0,0 +1,321 @@
+#!/usr/bin/env python2
+# coding=utf-8
+
+"""
+Measures how gitver scales with the repository size
+
+Synthetic repositories are generated by synthrepo.py, then the "current",
+"info", "update" and "next" commands are timed end to end, both cold (no
+cache in gitver's configuration directory) and warm, along with the main
+functions they depend on, called in-process with every cache disabled.
+
+Results are written as JSON: when a baseline, i.e. the results of a previous
+run, is specified, each measurement is compared against it and any slowdown
+beyond the threshold is flagged as a regression, making the exit status
+non-zero.
+
+    python2 bench/scale.py [--scenarios PATTERN,..] [--runs N]
+                           [--output FILE] [--baseline FILE]
+"""
+
+import os
+import sys
+import json
+import time
+import fnmatch
+import argparse
+import platform
+import tempfile
+import subprocess
+
+import synthrepo
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(1, ROOT)
+
+# name: (shape, commits, tags, shallow clone depth or None)
+SCENARIOS = [
+    ('linear-10k', ('linear', 10000, 10, None)),
+    ('merges-10k', ('merges', 10000, 100, None)),
+    ('merges-10k-shallow', ('merges', 10000, 100, 50)),
+    ('linear-100k', ('linear', 100000, 1000, None)),
+    ('merges-100k', ('merges', 100000, 1000, None)),
+    ('merges-100k-shallow', ('merges', 100000, 1000, 50)),
+    ('tags-100k', ('linear', 100000, 50000, None)),
+    ('linear-1m', ('linear', 1000000, 1000, None)),
+    ('merges-1m', ('merges', 1000000, 10000, None)),
+    ('merges-1m-shallow', ('merges', 1000000, 10000, 50)),
+]
+
+COMMANDS = [
+    ('current', ['current']),
+    ('info', ['info']),
+    ('update', ['update', 'version']),
+    ('next', ['next', '9.9.9']),
+]
+
+# files gitver keeps in its configuration directory that are safe to delete
+CACHE_FILES = ['.repo_cache', '.template_cache', '.config_cache',
+               '.tag_index', '.hashlen_state']
+
+# slowdowns smaller than this, in seconds, are considered noise
+NOISE_FLOOR = 0.005
+
+
+def clear_caches(repo):
+    """
+    Removes the caches from gitver's configuration directory, any other file
+    in there (e.g. the NEXT version store) is left alone.
+    """
+    cfg = os.path.join(repo, '.gitver')
+    for name in CACHE_FILES:
+        path = os.path.join(cfg, name)
+        if os.path.isfile(path):
+            os.unlink(path)
+
+
+def summary(samples):
+    samples = sorted(samples)
+    return {'median': samples[len(samples) // 2], 'min': samples[0],
+            'max': samples[-1], 'runs': len(samples)}
+
+
+def scenario_env(repo):
+    env = dict(os.environ)
+    env.pop('GITVER_TRACE', None)
+    anchor = synthrepo.anchor(repo)
+    if anchor is not None:
+        env['GITVER_ANCHOR'] = anchor
+    return env
+
+
+def time_command(repo, args, runs, cold):
+    """
+    Runs gitver with the specified arguments the specified number of times
+    and returns the summary of the wall times.
+    """
+    env = scenario_env(repo)
+    cmd = [sys.executable, synthrepo.GITVER] + args
+    samples = []
+
+    with open(os.devnull, 'w') as null:
+        if not cold:
+            subprocess.check_call(cmd, cwd=repo, env=env, stdout=null,
+                                  stderr=null)
+        for i in range(runs):
+            if cold:
+                clear_caches(repo)
+            started = time.time()
+            subprocess.check_call(cmd, cwd=repo, env=env, stdout=null,
+                                  stderr=null)
+            samples.append(time.time() - started)
+
+    return summary(samples)
+
+
+def time_functions(repo, runs):
+    """
+    Times the main gitver functions in-process, with every cache disabled,
+    and returns a dictionary mapping each of them to the summary of their
+    wall times.
+    """
+    from gitver import defines, git
+    from gitver.backends import create_backend
+    from gitver.cache import repo_cache
+    from gitver.config import read_user_config
+    from gitver.commands import parse_templates, load_next_custom
+    from gitver.termcolors import term
+
+    saved = os.environ.get('GITVER_ANCHOR')
+    anchor = synthrepo.anchor(repo)
+    if anchor is not None:
+        os.environ['GITVER_ANCHOR'] = anchor
+
+    term.set_quiet_flags(True, True)
+    repo_cache.enable(False)
+    output = os.path.join(repo, 'out', 'version.txt')
+    results = dict()
+    backend = create_backend(cwd=repo)
+    try:
+        with defines.repository(repo, backend):
+            clear_caches(repo)
+            cfg = read_user_config()
+            patterns = cfg['tag_match']
+            repo_info = git.compute_repo_info(None, patterns)
+            next_custom = load_next_custom(repo_info)
+
+            def render():
+                if os.path.exists(output):
+                    os.unlink(output)
+                parse_templates(cfg, ['version'], repo_info, next_custom,
+                                False)
+
+            functions = [
+                ('get_repo_info',
+                 lambda: git.compute_repo_info(None, patterns)),
+                ('min_hash_length', git.min_hash_length),
+                ('last_tag', lambda: git.last_tag(patterns)),
+                ('describe_head', lambda: git.describe_head(patterns)),
+                ('load_user_config', read_user_config),
+                ('parse_templates', render),
+            ]
+            for name, func in functions:
+                samples = []
+                for i in range(runs):
+                    clear_caches(repo)
+                    started = time.time()
+                    func()
+                    samples.append(time.time() - started)
+                results[name] = summary(samples)
+    finally:
+        backend.close()
+        repo_cache.enable(True)
+        term.set_quiet_flags(False, False)
+        if saved is None:
+            os.environ.pop('GITVER_ANCHOR', None)
+        else:
+            os.environ['GITVER_ANCHOR'] = saved
+
+    return results
+
+
+def prepare(workdir, name, spec):
+    """
+    Generates the repository for the specified scenario, unless it exists
+    already, and returns its path.
+    """
+    shape, commits, tags, depth = spec
+    full = os.path.join(workdir, "%s-%d-%d" % (shape, commits, tags))
+    started = time.time()
+    synthrepo.generate(full, shape, commits, tags)
+    if depth is not None:
+        shallow = "%s-shallow-%d" % (full, depth)
+        path = synthrepo.shallow_clone(full, shallow, depth)
+    else:
+        path = full
+    elapsed = time.time() - started
+    if elapsed > 1.0:
+        sys.stderr.write("Generated %s in %.1f s\n" % (name, elapsed))
+    return path
+
+
+def run(scenarios, workdir, runs):
+    results = dict()
+    for name, spec in scenarios:
+        repo = prepare(workdir, name, spec)
+        sys.stderr.write("Measuring " + name + "...\n")
+
+        for cmd, args in COMMANDS:
+            for cold in [True, False]:
+                key = "%s/%s/%s" % (name, cmd, 'cold' if cold else 'warm')
+                results[key] = time_command(repo, args, runs, cold)
+
+        for func, res in time_functions(repo, runs).items():
+            results["%s/%s/function" % (name, func)] = res
+
+    return results
+
+
+def git_version():
+    try:
+        return subprocess.check_output(['git', '--version']).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, baseline, threshold):
+    """
+    Prints the measurements side by side with the baseline ones and returns
+    the keys of the ones which regressed.
+    """
+    regressions = []
+    print "%-48s %10s %10s %8s" % ("measurement", "baseline", "current",
+                                   "change")
+    for key in sorted(results):
+        current = results[key]['median']
+        base = baseline.get(key, {}).get('median')
+        if base is None:
+            print "%-48s %10s %8.1fms %8s" % (key, '-', current * 1000, 'new')
+            continue
+
+        change = (current - base) / base if base > 0 else 0.0
+        regressed = current > base * (1 + threshold) and \
+            current - base > NOISE_FLOOR
+        if regressed:
+            regressions.append(key)
+        print "%-48s %8.1fms %8.1fms %+7.1f%%%s" % (
+            key, base * 1000, current * 1000, change * 100,
+            "  REGRESSION" if regressed else "")
+
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measures how gitver "
+                                                 "scales with the repository "
+                                                 "size.")
+    parser.add_argument('--scenarios',
+                        help='Comma-separated scenario name patterns '
+                             '(default: all), available scenarios are: ' +
+                             ', '.join(name for name, spec in SCENARIOS),
+                        default='*')
+    parser.add_argument('--runs',
+                        help='Runs per measurement (default: 5).',
+                        type=int,
+                        default=5)
+    parser.add_argument('--workdir',
+                        help='Directory the generated repositories are kept '
+                             'in, to be reused by later runs.',
+                        default=os.path.join(tempfile.gettempdir(),
+                                             'gitver-bench'))
+    parser.add_argument('--output',
+                        help='File to write the results to (default: '
+                             'stdout).',
+                        default=None)
+    parser.add_argument('--baseline',
+                        help='Results of a previous run to compare against.',
+                        default=None)
+    parser.add_argument('--threshold',
+                        help='Slowdown flagged as a regression (default: '
+                             '0.25, i.e. 25%%).',
+                        type=float,
+                        default=0.25)
+    args = parser.parse_args()
+
+    patterns = args.scenarios.split(',')
+    scenarios = [(name, spec) for name, spec in SCENARIOS
+                 if any(fnmatch.fnmatch(name, p) for p in patterns)]
+    if len(scenarios) == 0:
+        parser.error("no scenario matches \"" + args.scenarios + "\"")
+
+    if not os.path.exists(args.workdir):
+        os.makedirs(args.workdir)
+
+    report = {
+        'date': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'host': platform.node(),
+        'python': platform.python_version(),
+        'git': git_version(),
+        'runs': args.runs,
+        'results': run(scenarios, args.workdir, args.runs)
+    }
+
+    text = json.dumps(report, indent=2, sort_keys=True)
+    if args.output is not None:
+        with open(args.output, 'w') as f:
+            f.write(text + '\n')
+    elif args.baseline is None:
+        print text
+
+    if args.baseline is not None:
+        with open(args.baseline, 'r') as f:
+            baseline = json.load(f)['results']
+        regressions = compare(report['results'], baseline, args.threshold)
+        if len(regressions) > 0:
+            print "\n%d regression(s) beyond %d%%" % (
+                len(regressions), args.threshold * 100)
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,234 @@
+#!/usr/bin/env python2
+# coding=utf-8
+
+"""
+Generates synthetic git repositories of realistic scale for benchmarking
+
+History is streamed to "git fast-import", so that even a million commits only
+take a few minutes to generate: every commit changes one of a hundred files,
+commit dates grow steadily and annotated version tags are spread evenly over
+the main line. "merges" shaped repositories branch off a short topic branch
+every few commits and merge it back, "linear" ones don't merge at all.
+
+Generated repositories are reused by later runs, shallow variants are cloned
+from the full ones along with a version anchor.
+
+    python2 bench/synthrepo.py <directory> <linear|merges> <commits> <tags>
+"""
+
+import os
+import sys
+import json
+import shutil
+import subprocess
+
+GITVER = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'bin',
+                      'gitver')
+
+SHAPES = ['linear', 'merges']
+
+# merges shaped repositories merge a topic branch of TOPIC_LENGTH commits
+# every MERGE_EVERY main line commits
+MERGE_EVERY = 10
+TOPIC_LENGTH = 3
+
+FILES = 100
+
+# first commit date and seconds between commits
+EPOCH = 1300000000
+INTERVAL = 600
+
+IDENTITY = 'Bench <bench@localhost>'
+
+TEMPLATE = '#out/version.txt\n' \
+           'version ${CURRENT_VERSION}\n' \
+           'build ${BUILD_ID}\n'
+
+# the file holding the version anchor of shallow variants
+ANCHOR_FILE = 'bench-anchor'
+
+
+def git(cwd, *args):
+    with open(os.devnull, 'w') as null:
+        subprocess.check_call(['git'] + list(args), cwd=cwd, stdout=null)
+
+
+def gitver(cwd, *args):
+    with open(os.devnull, 'w') as null:
+        return subprocess.check_output([sys.executable, GITVER] + list(args),
+                                       cwd=cwd, stderr=null)
+
+
+def data_command(text):
+    return "data %d\n%s\n" % (len(text), text)
+
+
+class Stream(object):
+    """
+    Writes the fast-import commands creating the history.
+    """
+    def __init__(self, out, total_tags, main_commits):
+        self.out = out
+        self.mark = 0
+        self.commits = 0
+        self.main = None
+        self.tags = 0
+        self.total_tags = total_tags
+        # tag every n-th main line commit
+        self.tag_every = max(1, main_commits // max(1, total_tags))
+        self.main_commits = 0
+
+    def commit(self, ref, parent, merge=None, message=None):
+        self.mark += 1
+        self.commits += 1
+        date = EPOCH + self.commits * INTERVAL
+        message = message or "Change %d" % self.commits
+        path = "src/file%02d.txt" % (self.commits % FILES)
+
+        w = self.out.write
+        w("commit %s\nmark :%d\n" % (ref, self.mark))
+        w("author %s %d +0000\n" % (IDENTITY, date))
+        w("committer %s %d +0000\n" % (IDENTITY, date))
+        w(data_command(message))
+        if parent is not None:
+            w("from :%d\n" % parent)
+        if merge is not None:
+            w("merge :%d\n" % merge)
+        if parent is None:
+            w("M 644 inline .gitignore\n" + data_command(".gitver\n"))
+        w("M 644 inline %s\n" % path +
+          data_command("revision %d of %s\n" % (self.commits, path)))
+        return self.mark
+
+    def main_commit(self, merge=None):
+        self.main = self.commit('refs/heads/master', self.main, merge)
+        self.main_commits += 1
+        if self.tags < self.total_tags and \
+                (self.main_commits - 1) % self.tag_every == 0:
+            self.tag(self.main)
+
+    def tag(self, mark):
+        n = self.tags
+        self.tags += 1
+        name = "v%d.%d.%d" % (1 + n // 10000, (n // 100) % 100, n % 100)
+        date = EPOCH + self.commits * INTERVAL
+        w = self.out.write
+        w("tag %s\nfrom :%d\n" % (name, mark))
+        w("tagger %s %d +0000\n" % (IDENTITY, date))
+        w(data_command("Release " + name))
+
+
+def write_history(out, shape, commits, tags):
+    """
+    Writes the fast-import stream for a repository of the specified shape,
+    holding the specified number of commits and tags.
+    """
+    if shape == 'merges':
+        # each round is MERGE_EVERY main line commits, the last of which is a
+        # merge, plus a topic branch
+        per_round = MERGE_EVERY + TOPIC_LENGTH
+        main_commits = commits - (commits // per_round) * TOPIC_LENGTH
+    else:
+        main_commits = commits
+
+    stream = Stream(out, tags, main_commits)
+    stream.main_commit()
+    while stream.commits < commits:
+        if shape == 'merges' and stream.main_commits % MERGE_EVERY == 0 and \
+                stream.commits + TOPIC_LENGTH < commits:
+            topic = stream.main
+            for i in range(TOPIC_LENGTH):
+                topic = stream.commit('refs/heads/topic', topic)
+            stream.main_commit(merge=topic)
+        else:
+            stream.main_commit()
+
+
+def generate(path, shape, commits, tags):
+    """
+    Creates a repository of the specified shape at the specified path, unless
+    it exists already, and initializes gitver in it.
+    """
+    if os.path.exists(os.path.join(path, '.gitver')):
+        return path
+
+    if shape not in SHAPES:
+        raise ValueError("Unknown shape \"" + shape + "\", valid shapes "
+                         "are: " + ", ".join(SHAPES))
+
+    if os.path.exists(path):
+        shutil.rmtree(path)
+    os.makedirs(path)
+
+    git(path, 'init', '-q')
+    p = subprocess.Popen(['git', 'fast-import', '--quiet'], cwd=path,
+                         stdin=subprocess.PIPE)
+    write_history(p.stdin, shape, commits, tags)
+    p.stdin.close()
+    if p.wait() != 0:
+        raise RuntimeError("git fast-import failed")
+
+    if shape == 'merges':
+        git(path, 'update-ref', '-d', 'refs/heads/topic')
+    git(path, 'pack-refs', '--all')
+    git(path, 'reset', '-q', '--hard', 'master')
+    init_gitver(path)
+    return path
+
+
+def init_gitver(path):
+    gitver(path, 'init')
+    with open(os.path.join(path, '.gitver', 'templates', 'version'),
+              'w') as f:
+        f.write(TEMPLATE)
+    out = os.path.join(path, 'out')
+    if not os.path.exists(out):
+        os.mkdir(out)
+
+
+def shallow_clone(source, path, depth):
+    """
+    Clones the specified repository at the specified depth, unless the clone
+    exists already: the version anchor of the source HEAD is stored in the
+    clone's git directory, see anchor().
+    """
+    if os.path.exists(os.path.join(path, '.gitver')):
+        return path
+
+    if os.path.exists(path):
+        shutil.rmtree(path)
+
+    git(os.path.dirname(path) or '.', 'clone', '-q', '--depth=' + str(depth),
+        'file://' + os.path.abspath(source), path)
+    init_gitver(path)
+
+    text = gitver(source, 'anchor', '--print').strip()
+    with open(os.path.join(path, '.git', ANCHOR_FILE), 'w') as f:
+        f.write(text)
+    return path
+
+
+def anchor(path):
+    """
+    Returns the version anchor for the specified shallow clone, or None.
+    """
+    try:
+        with open(os.path.join(path, '.git', ANCHOR_FILE), 'r') as f:
+            return f.read()
+    except IOError:
+        return None
+
+
+def main():
+    if len(sys.argv) != 5:
+        print __doc__.strip()
+        sys.exit(1)
+
+    path, shape, commits, tags = sys.argv[1:]
+    generate(path, shape, int(commits), int(tags))
+    print json.dumps({'path': os.path.abspath(path), 'shape': shape,
+                      'commits': int(commits), 'tags': int(tags)})
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,99 @@
+#!/usr/bin/env python2
+# coding=utf-8
+
+"""
+Version anchors, for shallow clones
+
+An anchor records the repository information of a commit as computed from the
+full history: the most recent tag, the commit count since it and the minimum
+hash string length. Shallow clones including the anchored commit can then
+compute their version by extending it, rather than fetching the whole history.
+
+Anchors are read from the GITVER_ANCHOR environment variable, if set, else
+from the .gitver-anchor file committed in the project's root directory.
+"""
+
+import os
+import json
+from gitver.defines import anchor_file
+
+ANCHOR_ENV = 'GITVER_ANCHOR'
+
+# anchor entries and their types
+ANCHOR_KEYS = [('commit', basestring), ('tag', basestring), ('count', int),
+               ('hashlen', int)]
+
+
+class AnchorError(Exception):
+    """
+    Raised whenever the version anchor can't be parsed or is not valid
+    """
+    pass
+
+
+def anchor_source():
+    """
+    Returns a description of where the anchor is read from.
+    """
+    if os.environ.get(ANCHOR_ENV):
+        return "the " + ANCHOR_ENV + " environment variable"
+    return "\"" + anchor_file() + "\""
+
+
+def anchor_text():
+    """
+    Returns the anchor definition, as is, or None if there's none.
+    """
+    text = os.environ.get(ANCHOR_ENV)
+    if text:
+        return text
+
+    try:
+        with open(anchor_file(), 'r') as f:
+            return f.read()
+    except IOError:
+        return None
+
+
+def read_anchor():
+    """
+    Returns the anchor as a dictionary, or None if there's none.
+    """
+    text = anchor_text()
+    if text is None:
+        return None
+
+    try:
+        data = json.loads(text)
+    except ValueError as e:
+        raise AnchorError("Invalid version anchor in " + anchor_source() +
+                          ": " + str(e))
+
+    if not isinstance(data, dict) or \
+            not all(isinstance(data.get(k), t) for k, t in ANCHOR_KEYS):
+        raise AnchorError("Invalid version anchor in " + anchor_source() +
+                          ", expected the " +
+                          ", ".join('"' + k + '"' for k, t in ANCHOR_KEYS) +
+                          " entries")
+
+    return {k: str(data[k]) if t is basestring else data[k]
+            for k, t in ANCHOR_KEYS}
+
+
+def make_anchor(repo_info, hashlen):
+    """
+    Returns the anchor for the specified repository information.
+    """
+    return {'commit': repo_info['full-build-id'],
+            'tag': repo_info['last-tag'],
+            'count': repo_info['count'],
+            'hashlen': hashlen}
+
+
+def format_anchor(anchor):
+    return json.dumps(anchor, sort_keys=True)
+
+
+def write_anchor(anchor):
+    with open(anchor_file(), 'w') as f:
+        f.write(format_anchor(anchor) + '\n')
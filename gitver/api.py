@@ -0,0 +1,232 @@
+#!/usr/bin/env python2
+# coding=utf-8
+
+"""
+In-process API, for build tools embedding gitver
+
+    from gitver.api import Repository
+
+    with Repository('/path/to/project') as repo:
+        print repo.version()
+        output, text = repo.render_template('version')
+
+Nothing is ever printed and the process is never terminated: failures raise a
+GitverError subclass instead. Repositories are accessed without changing the
+current working directory, so any number of them can be queried by the same
+process, and each Repository memoizes its results for as long as HEAD and the
+tags don't change.
+"""
+
+from contextlib import contextmanager
+
+from gitver import defines
+from gitver.backends import create_backend, GitError
+
+
+class GitverError(Exception):
+    """
+    Base class for every error raised by the API
+    """
+    pass
+
+
+class RepositoryError(GitverError):
+    """
+    Raised whenever the repository can't be found or git fails
+    """
+    pass
+
+
+class ConfigError(GitverError):
+    """
+    Raised whenever the repository's gitver configuration is not valid
+    """
+    pass
+
+
+class VersionError(GitverError):
+    """
+    Raised whenever the version information can't be computed, i.e. no valid
+    tag is reachable or the NEXT version string is not valid
+    """
+    pass
+
+
+class TemplateError(GitverError):
+    """
+    Raised whenever a template can't be loaded or rendered
+    """
+    pass
+
+
+class Repository(object):
+    """
+    A git repository, identified by any path inside its working tree.
+    """
+    def __init__(self, path='.', backend=None):
+        self.path = path
+        try:
+            self.__backend = create_backend(backend, cwd=path)
+        except GitError as e:
+            raise RepositoryError(str(e))
+        self.__key = None
+        self.__memo = dict()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        """
+        Releases the git processes held by this repository.
+        """
+        self.__backend.close()
+
+    def refresh(self):
+        """
+        Forgets any memoized result.
+        """
+        self.__key = None
+        self.__memo.clear()
+
+    @contextmanager
+    def __using(self):
+        """
+        Makes this repository the one gitver operates on, translating any
+        failure into the API exceptions.
+        """
+        from gitver.git import RepoInfoError, git_dir
+        from gitver.config import ConfigError as CfgError
+        from gitver.templates import TemplateError as TplError
+        from gitver.cache import repo_cache
+
+        with defines.repository(self.path, self.__backend):
+            try:
+                if len(defines.prj_root()) == 0:
+                    raise RepositoryError("\"" + self.path + "\" is not a git "
+                                          "repository")
+
+                # memoized results are valid as long as HEAD and the tags
+                # don't change
+                key = repo_cache.key(git_dir())
+                if key is None or key != self.__key:
+                    self.__memo.clear()
+                    self.__key = key
+
+                yield
+
+            except GitError as e:
+                raise RepositoryError(str(e))
+            except RepoInfoError as e:
+                raise VersionError(str(e))
+            except CfgError as e:
+                raise ConfigError(str(e))
+            except TplError as e:
+                raise TemplateError(str(e))
+            except (IOError, OSError) as e:
+                raise RepositoryError(str(e))
+
+    def __memoized(self, name, compute):
+        if name not in self.__memo:
+            self.__memo[name] = compute()
+        return self.__memo[name]
+
+    def __config(self):
+        from gitver.config import read_user_config
+        return self.__memoized('config', read_user_config)
+
+    def __repo_info(self):
+        from gitver.git import compute_repo_info
+        return self.__memoized(
+            'repo_info',
+            lambda: compute_repo_info(None, self.__config()['tag_match']))
+
+    def __next_custom(self):
+        from gitver.commands import load_next_custom, parse_user_next_stable
+
+        def compute():
+            repo_info = self.__repo_info()
+            next_custom = load_next_custom(repo_info)
+
+            # same conditions build_format_args parses it on
+            in_use = repo_info['count'] > 0 and repo_info['pr'] is None
+            if in_use and next_custom and \
+                    not parse_user_next_stable(next_custom):
+                raise VersionError("Invalid custom NEXT version numbers "
+                                   "\"" + next_custom + "\"")
+            return next_custom
+        return self.__memoized('next', compute)
+
+    @property
+    def root(self):
+        """
+        The repository's working tree root directory.
+        """
+        with self.__using():
+            return defines.prj_root()
+
+    def config(self):
+        """
+        Returns the repository's gitver configuration.
+        """
+        with self.__using():
+            return dict(self.__config())
+
+    def repo_info(self):
+        """
+        Returns the raw repository information: the most recent tag, its
+        version numbers, the commit count and the build id.
+        """
+        with self.__using():
+            return dict(self.__repo_info())
+
+    def next_custom(self):
+        """
+        Returns the user-defined NEXT version string for the most recent tag,
+        or None.
+        """
+        with self.__using():
+            return self.__next_custom()
+
+    def version(self, promote=False):
+        """
+        Returns the current version string, or the promoted one.
+        """
+        from gitver.commands import build_version_string
+
+        with self.__using():
+            return self.__memoized(
+                ('version', promote),
+                lambda: build_version_string(self.__config(),
+                                             self.__repo_info(), promote,
+                                             self.__next_custom()))
+
+    def variables(self):
+        """
+        Returns every variable describing the current version, the same as
+        "gitver current --json" prints.
+        """
+        from gitver.commands import current_variables
+
+        with self.__using():
+            return dict(self.__memoized(
+                'variables',
+                lambda: current_variables(self.__config(), self.__repo_info(),
+                                          self.__next_custom())))
+
+    def render_template(self, name):
+        """
+        Renders the specified template, without writing it: returns an
+        (output path, rendered text) tuple.
+        """
+        from gitver.commands import build_keywords
+        from gitver.templates import render_template
+
+        with self.__using():
+            keywords = self.__memoized(
+                'keywords',
+                lambda: build_keywords(self.__config(), self.__repo_info(),
+                                       self.__next_custom()))
+            return render_template(name, keywords)
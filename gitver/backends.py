@@ -0,0 +1,277 @@
+#!/usr/bin/env python2
+# coding=utf-8
+
+"""
+Pluggable backends used to run git commands
+
+The backend in use can be selected via the GITVER_BACKEND environment
+variable, valid values are "cat-file" (default), "subprocess" and "sh".
+"""
+
+import os
+import atexit
+import threading
+
+DEFAULT_BACKEND = 'cat-file'
+
+
+class GitError(Exception):
+    """
+    Raised whenever git can't be found or returns an error, the exit status
+    is None if git couldn't be run at all
+    """
+    def __init__(self, message, status=None):
+        super(GitError, self).__init__(message)
+        self.status = status
+
+
+class GitBackend(object):
+    """
+    Base class of the git backends: each instance runs git from the specified
+    working directory or from the current one, if none has been specified.
+
+    Backends implement run(args, stdin=None), running git with the specified
+    arguments, optionally feeding it the specified stdin data, and returning
+    its whole stdout: failures raise a GitError. Everything else is built
+    on top of it, unless overridden.
+    """
+    def __init__(self, cwd=None):
+        self.cwd = cwd
+
+    def lines(self, args, stdin=None):
+        """
+        Runs git with the specified arguments, optionally feeding it the
+        specified stdin data, and yields its stdout line by line.
+        """
+        for line in self.run(args, stdin).splitlines(True):
+            yield line
+
+    def object_info(self, names):
+        """
+        Looks up the specified object names (any revision expression git
+        understands, i.e. "v1.0^{}") and returns a dictionary mapping each of
+        them to an (object name, type, size) tuple, or None if missing.
+        """
+        out = self.run(['cat-file', '--batch-check'],
+                       ''.join(n + '\n' for n in names))
+        return dict(zip(names, [_parse_info(l) for l in out.splitlines()]))
+
+    def close(self):
+        """
+        Releases any resource held by the backend.
+        """
+        pass
+
+
+class ShBackend(GitBackend):
+    """
+    Runs git via the sh package, one process per command.
+    """
+    def __sh(self):
+        try:
+            import sh
+        except ImportError:
+            raise GitError("A dependency is missing, please install the "
+                           "\"sh\" package or select another git backend.")
+        return sh
+
+    def run(self, args, stdin=None):
+        sh = self.__sh()
+        try:
+            return sh.git(*args, _in=stdin, _cwd=self.cwd).stdout
+        except sh.ErrorReturnCode as e:
+            raise GitError(str(e), e.exit_code)
+        except sh.CommandNotFound as e:
+            raise GitError(str(e))
+
+    def lines(self, args, stdin=None):
+        sh = self.__sh()
+        try:
+            # the exit status is reported here, not by sh's own thread
+            for line in sh.git(*args, _in=stdin, _cwd=self.cwd, _iter=True,
+                               _internal_bufsize=0, _bg_exc=False):
+                yield line
+        except sh.ErrorReturnCode as e:
+            raise GitError(str(e), e.exit_code)
+        except sh.CommandNotFound as e:
+            raise GitError(str(e))
+
+
+class SubprocessBackend(GitBackend):
+    """
+    Runs git via the subprocess module, one process per command: output can
+    be streamed without retaining it in memory.
+    """
+    def _spawn(self, args, stdin=None, stderr=None):
+        """
+        Starts git, its stderr goes to the specified file or to a pipe.
+        """
+        # imported on first use, it isn't needed as long as caches are warm
+        import subprocess
+        try:
+            return subprocess.Popen(
+                ['git'] + list(args), cwd=self.cwd,
+                stdin=subprocess.PIPE if stdin is not None else None,
+                stdout=subprocess.PIPE, stderr=stderr or subprocess.PIPE)
+        except OSError as e:
+            raise GitError("Couldn't run git: " + str(e))
+
+    def run(self, args, stdin=None):
+        p = self._spawn(args, stdin)
+        out, err = p.communicate(stdin)
+        if p.returncode != 0:
+            raise GitError(err.strip(), p.returncode)
+        return out
+
+    def lines(self, args, stdin=None):
+        import tempfile
+
+        # stderr goes to a file rather than to a pipe, which git could fill
+        # and block on while its output is still being consumed
+        with tempfile.TemporaryFile() as err:
+            p = self._spawn(args, stdin, err)
+
+            if stdin is not None:
+                # feed stdin concurrently, so that a big input can't deadlock
+                # against a command which starts producing output early
+                def feed():
+                    try:
+                        p.stdin.write(stdin)
+                        p.stdin.close()
+                    except IOError:
+                        pass
+                feeder = threading.Thread(target=feed)
+                feeder.daemon = True
+                feeder.start()
+
+            try:
+                for line in iter(p.stdout.readline, ''):
+                    yield line
+            finally:
+                # the consumer may stop early, git mustn't be left blocked
+                # on a full pipe nor as a zombie
+                p.stdout.close()
+                if p.poll() is None:
+                    try:
+                        p.kill()
+                    except OSError:
+                        pass
+                p.wait()
+
+            if p.returncode != 0:
+                err.seek(0)
+                raise GitError(err.read().strip(), p.returncode)
+
+
+class CatFileBackend(SubprocessBackend):
+    """
+    Same as the subprocess backend, but object lookups are answered by a
+    long-lived "git cat-file --batch-check" co-process, started on first use
+    and reused for every query.
+    """
+    def __init__(self, cwd=None):
+        super(CatFileBackend, self).__init__(cwd)
+        self.__proc = None
+        self.__lock = threading.Lock()
+
+    def __coprocess(self):
+        import subprocess
+
+        p = self.__proc
+        if p is None or p.poll() is not None:
+            try:
+                p = subprocess.Popen(['git', 'cat-file', '--batch-check'],
+                                     cwd=self.cwd, stdin=subprocess.PIPE,
+                                     stdout=subprocess.PIPE)
+            except OSError as e:
+                raise GitError("Couldn't run git: " + str(e))
+            self.__proc = p
+        return p
+
+    def __query(self, name):
+        if '\n' in name:
+            raise GitError("Invalid object name \"" + name + "\"")
+
+        p = self.__coprocess()
+        try:
+            p.stdin.write(name + '\n')
+            p.stdin.flush()
+            header = p.stdout.readline()
+        except IOError as e:
+            raise GitError("git cat-file went away: " + str(e))
+
+        if len(header) == 0:
+            raise GitError("git cat-file went away")
+
+        return _parse_info(header)
+
+    def object_info(self, names):
+        with self.__lock:
+            return {n: self.__query(n) for n in names}
+
+    def close(self):
+        with self.__lock:
+            if self.__proc is not None:
+                try:
+                    self.__proc.stdin.close()
+                    self.__proc.wait()
+                except (IOError, OSError):
+                    pass
+            self.__proc = None
+
+
+def _parse_info(line):
+    """
+    Parses a "<object name> <type> <size>" line as output by git cat-file,
+    returns None for missing or ambiguous objects.
+    """
+    fields = line.split()
+    if len(fields) != 3 or fields[1] in ['missing', 'ambiguous']:
+        return None
+    return fields[0], fields[1], int(fields[2])
+
+
+backends = {
+    'sh': ShBackend,
+    'subprocess': SubprocessBackend,
+    'cat-file': CatFileBackend
+}
+
+__backend = None
+
+
+def create_backend(name=None, cwd=None):
+    """
+    Creates a new backend instance of the specified type, or of the type
+    selected by the GITVER_BACKEND environment variable.
+    """
+    if name is None:
+        name = os.environ.get('GITVER_BACKEND', DEFAULT_BACKEND)
+
+    if name not in backends:
+        raise GitError("Unknown git backend \"" + name + "\", valid values "
+                       "are: " + ", ".join(sorted(backends.keys())))
+
+    return backends[name](cwd)
+
+
+def get_backend():
+    """
+    Returns the backend shared by the whole process, creating it on first use.
+    """
+    global __backend
+    if __backend is None:
+        __backend = create_backend()
+        atexit.register(__backend.close)
+    return __backend
+
+
+def set_backend(backend):
+    """
+    Replaces the backend shared by the whole process, returning the previous
+    one.
+    """
+    global __backend
+    previous = __backend
+    __backend = backend
+    return previous
@@ -0,0 +1,111 @@
+#!/usr/bin/env python2
+# coding=utf-8
+
+"""
+Persistent cache for the repository information
+"""
+
+from gitver import refs
+from gitver.storage import KVStore
+from gitver.defines import repo_cache_file, hashlen_state_file
+from gitver.trace import tracer
+
+
+class RepoInfoCache(object):
+    """
+    Stores the last computed repository information, keyed by the HEAD object
+    name, a fingerprint of the tag refs and the minimum hash string length,
+    so that it can be served again as long as nothing relevant has changed in
+    the repository.
+    """
+    def __init__(self):
+        self.__enabled = True
+
+    def enable(self, enabled):
+        self.__enabled = enabled
+
+    def is_enabled(self):
+        return self.__enabled
+
+    def __store(self):
+        return KVStore(repo_cache_file())
+
+    def key(self, git_dir, head=None):
+        """
+        Computes the cache key for the current state of the repository, or
+        None if the refs database can't be read directly: HEAD's object name
+        is only read if not specified.
+        """
+        if git_dir is None:
+            return None
+
+        head = head or refs.head_sha(git_dir)
+        if head is None:
+            return None
+
+        # the abbreviated build id grows along with the persisted length
+        hashlen = KVStore(hashlen_state_file()).get('length') or None
+        return head, refs.fingerprint(git_dir), hashlen
+
+    def get(self, key):
+        """
+        Returns the cached repository information for the specified key, or
+        None on a cache miss.
+
+        Lookups never write to the cache, hits and misses are only counted by
+        the tracer: misses are persisted by put() instead.
+        """
+        if not self.__enabled or key is None:
+            return None
+
+        store = self.__store()
+        hit = store.get('key') == key
+        tracer.count('repo cache ' + ('hits' if hit else 'misses'))
+
+        return dict(store.get('info')) if hit else None
+
+    def put(self, key, info):
+        """
+        Replaces the cached repository information, counting the miss which
+        required computing it.
+        """
+        if not self.__enabled or key is None:
+            return
+
+        store = self.__store()
+        store.set('key', key).set('info', dict(info))
+        store.set('misses', (store.get('misses') or 0) + 1).save()
+
+    def previous(self):
+        """
+        Returns the cached (key, repository information) tuple, whatever the
+        current state of the repository is, or None if there's none.
+        """
+        if not self.__enabled:
+            return None
+
+        store = self.__store()
+        key = store.get('key')
+        return (key, dict(store.get('info'))) if key else None
+
+    def stats(self):
+        """
+        Returns a dictionary describing the current cache contents and its
+        miss counter.
+        """
+        store = self.__store()
+        return {'misses': store.get('misses') or 0,
+                'key': store.get('key') or None,
+                'info': store.get('info') or None}
+
+    def clear(self):
+        """
+        Drops the cached repository information and resets the counters.
+        """
+        store = self.__store()
+        for k in ['key', 'info', 'misses']:
+            store.rm(k)
+        store.save()
+
+
+repo_cache = RepoInfoCache()
@@ -8,19 +8,28 @@ Defines gitver commands
 import re
 import os
 import sys
-from string import Template
 
+# the feature modules (templates, tags, anchors, dependency files...) are
+# imported by the commands using them, so that the others start quickly
 from termcolors import term, bold
-from git import get_repo_info
+from git import get_repo_info, min_hash_length, make_repo_info, \
+    walk_history, describe_revisions, shallow_boundary, resolve_git_dir, \
+    set_head_hint, head_hint, hooks_dir
+from gitver import refs
 from gitver.storage import KVStore
+from gitver.backends import GitError
+from gitver.cache import repo_cache
+from gitver.trace import traced
 from sanity import check_gitignore
-from defines import CFGDIR, PRJ_ROOT, CFGDIRNAME
+from defines import cfg_dir, cfg_file, prj_root, anchor_file, \
+    hashlen_state_file, serve_socket_file, CFGDIRNAME
 from version import gitver_version, gitver_buildid
 
 
-# file where to store NEXT strings <=> TAG user-defined mappings
-NEXT_STORE_FILE = os.path.join(CFGDIR, ".next_store")
-TPLDIR = os.path.join(CFGDIR, 'templates')
+# maximum number of templates rendered concurrently
+RENDER_THREADS = 8
+
+custom_format_matcher = r"([A-Za-z_][A-Za-z0-9_]*)=(.*)$"
 
 user_version_matcher = r"v{0,1}(?P<maj>\d+)\.(?P<min>\d+)\.(?P<patch>\d+)" \
                        r"(?:\.(?P<revision>\d+))?$"
@@ -30,96 +39,335 @@ user_version_matcher = r"v{0,1}(?P<maj>\d+)\.(?P<min>\d+)\.(?P<patch>\d+)" \
 # helpers
 #
 
-def template_path(name):
+def next_store_file():
+    """
+    Returns the path of the file where to store NEXT strings <=> TAG
+    user-defined mappings.
+    """
+    return os.path.join(cfg_dir(), ".next_store")
+
+
+def build_keywords(cfg, repo, next_custom):
+    """
+    Builds the placeholder variables available to templates.
+    """
+    vstring = build_version_string(cfg, repo, False, next_custom)
+    args = build_format_args(cfg, repo, next_custom)
+    return {
+        'CURRENT_VERSION': vstring,
+        'MAJOR': args['maj'],
+        'MINOR': args['min'],
+        'PATCH': args['patch'],
+        'REV': args['rev'],
+        'REV_PREFIX': args['rev_prefix'],
+        'BUILD_ID': args['build_id'],
+        'FULL_BUILD_ID': args['build_id_full'],
+        'COMMIT_COUNT': args['commit_count'],
+        'COMMIT_COUNT_STR':
+        str(args['commit_count']) if args['commit_count'] > 0 else '',
+
+        'COMMIT_COUNT_PREFIX': args['commit_count_prefix'],
+        'META_PR': args['meta_pr'],
+        'META_PR_PREFIX': args['meta_pr_prefix']
+    }
+
+
+def __temp_output(output):
+    """
+    Creates a temporary file next to the specified output file, returns an
+    (open file object, path) tuple.
+    """
+    import tempfile
+
+    outdir, name = os.path.split(output)
+    fd, tmp = tempfile.mkstemp(prefix='.' + name + '.', dir=outdir)
+    return os.fdopen(fd, 'wb'), tmp
+
+
+def __install_output(tmp, output):
+    """
+    Atomically replaces the output file with the specified temporary file.
+    """
+    try:
+        # mkstemp creates private files, preserve the current permissions or
+        # apply the ones a plain open() would have
+        try:
+            mode = os.stat(output).st_mode & 0o7777
+        except OSError:
+            umask = os.umask(0)
+            os.umask(umask)
+            mode = 0o666 & ~umask
+        os.chmod(tmp, mode)
+
+        os.rename(tmp, output)
+    except (IOError, OSError):
+        if os.path.exists(tmp):
+            os.unlink(tmp)
+        raise
+
+
+def write_output(output, data):
+    """
+    Writes the specified data to the output file, unless it already has the
+    very same contents, so that its modification time is preserved.
+
+    The file is replaced atomically by renaming a temporary file written in
+    the same directory, so concurrent readers never see a partial file.
+    Returns True if the file has been written, False if it was up to date.
+    """
+    try:
+        if os.path.getsize(output) == len(data):
+            with open(output, 'rb') as fp:
+                if fp.read() == data:
+                    return False
+    except (IOError, OSError):
+        pass
+
+    fp, tmp = __temp_output(output)
+    try:
+        with fp:
+            fp.write(data)
+    except (IOError, OSError):
+        os.unlink(tmp)
+        raise
+
+    __install_output(tmp, output)
+    return True
+
+
+def move_output(tmp, output):
+    """
+    Same as write_output, but the data has already been written to the
+    specified temporary file, which is either renamed or removed.
+    """
+    import filecmp
+
+    try:
+        same = filecmp.cmp(tmp, output, shallow=False)
+    except (IOError, OSError):
+        same = False
+
+    if same:
+        os.unlink(tmp)
+        return False
+
+    __install_output(tmp, output)
+    return True
+
+
+class StreamedOutput(object):
     """
-    Constructs and returns the absolute path for the specified template file
-    name.
+    A big template's rendered output, held in a temporary file rather than in
+    memory: size is the number of bytes written.
     """
-    return os.path.join(TPLDIR, name)
+    def __init__(self, path, size):
+        self.path = path
+        self.size = size
+
+    def discard(self):
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+
+
+def __render_job(job):
+    """
+    Loads and renders a single template, returns a (name, output path,
+    rendered output, error message) tuple: this runs on a worker thread.
+
+    Big templates are streamed to a temporary file next to their output, or
+    just compiled when previewing, since they are streamed to the stdout
+    later on: the rendered output is then a StreamedOutput or None.
+    """
+    from gitver.templates import TemplateError, is_large_template, \
+        render_template, output_path, stream_template
+
+    name, keywords, index, preview = job
+    try:
+        if not is_large_template(name):
+            output, res = render_template(name, keywords, index)
+        else:
+            output, res = output_path(index.get(name)), None
 
+        outdir = os.path.dirname(output)
+        if not preview and not os.path.exists(outdir):
+            raise TemplateError("The template output directory \"" + outdir +
+                                "\" doesn't exists.")
 
+        if res is None and not preview:
+            fp, tmp = __temp_output(output)
+            try:
+                with fp:
+                    size = stream_template(name, keywords, fp, index)[1]
+            except:
+                os.unlink(tmp)
+                raise
+            res = StreamedOutput(tmp, size)
+
+        return name, output, res, None
+    except (TemplateError, IOError, OSError) as e:
+        return name, None, None, str(e)
+
+
+def __render_all(jobs):
+    """
+    Runs the specified render jobs and returns their results, in the same
+    order: a single job is run right away, more are shared among plain worker
+    threads, which are just joined (a ThreadPool would take its handler
+    thread's 0.1 s poll to shut down).
+    """
+    if len(jobs) == 1:
+        return [__render_job(jobs[0])]
+
+    import threading
+
+    results = [None] * len(jobs)
+    failures = []
+    count = min(len(jobs), RENDER_THREADS)
+
+    def worker(first):
+        try:
+            for i in range(first, len(jobs), count):
+                results[i] = __render_job(jobs[i])
+        except:
+            failures.append(sys.exc_info())
+
+    threads = [threading.Thread(target=worker, args=(i,))
+               for i in range(count)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    if len(failures) > 0:
+        raise failures[0][0], failures[0][1], failures[0][2]
+    return results
+
+
+@traced('parse_templates')
 def parse_templates(cfg, templates, repo, next_custom, preview):
     """
     Parse one or more templates, substitute placeholder variables with
     real values and write the result to the file specified in the template.
 
+    Placeholder variables are computed once, then templates are read and
+    rendered concurrently: if any of them fails, every error is reported and
+    no output is written at all.
+
     If preview is True, then the output will be written to the stdout while
     informative messages will be output to the stderr.
     """
-    for t in templates.split(' '):
-        tpath = template_path(t)
-        if os.path.exists(tpath):
-            with open(tpath, 'r') as fp:
-                lines = fp.readlines()
-
-            if len(lines) < 2:
-                term.err("The template \"" + t + "\" is not valid, aborting.")
-                return
-
-            if not lines[0].startswith('#'):
-                term.err("The template \"" + t + "\" doesn't define any valid "
-                                                 "output, aborting.")
-                return
-
-            output = str(lines[0]).strip(' #\n')
-
-            # resolve relative paths to the project's root
-            if not os.path.isabs(output):
-                output = os.path.join(PRJ_ROOT, output)
-
-            outdir = os.path.dirname(output)
-
-            if not os.path.exists(outdir):
-                term.err("The template output directory \"" + outdir +
-                         "\" doesn't exists.")
-
-            term.info("Processing template \"" + bold(t) + "\" for " + output +
-                      "...")
-
-            lines = lines[1:]
-            xformed = Template("".join(lines))
-            vstring = build_version_string(cfg, repo, False, next_custom)
-            args = build_format_args(cfg, repo, next_custom)
-            keywords = {
-                'CURRENT_VERSION': vstring,
-                'MAJOR': args['maj'],
-                'MINOR': args['min'],
-                'PATCH': args['patch'],
-                'REV': args['rev'],
-                'REV_PREFIX': args['rev_prefix'],
-                'BUILD_ID': args['build_id'],
-                'FULL_BUILD_ID': args['build_id_full'],
-                'COMMIT_COUNT': args['commit_count'],
-                'COMMIT_COUNT_STR':
-                str(args['commit_count']) if args['commit_count'] > 0 else '',
-
-                'COMMIT_COUNT_PREFIX': args['commit_count_prefix'],
-                'META_PR': args['meta_pr'],
-                'META_PR_PREFIX': args['meta_pr_prefix']
-            }
+    from gitver.templates import TemplateError, TemplateIndex, stream_template
 
-            try:
-                res = xformed.substitute(keywords)
-            except KeyError as e:
-                term.err("Unknown key \"" + e.message + "\" found, aborting.")
-                sys.exit(1)
+    if len(templates) == 0:
+        term.err("No templates specified.")
+        sys.exit(1)
+
+    keywords = build_keywords(cfg, repo, next_custom)
+    index = TemplateIndex()
+    jobs = [(t, keywords, index, preview) for t in templates]
+
+    try:
+        results = __render_all(jobs)
+    finally:
+        index.save()
+
+    errors = [(t, e) for t, output, res, e in results if e is not None]
+    if len(errors) > 0:
+        for t, output, res, e in results:
+            if isinstance(res, StreamedOutput):
+                res.discard()
+        for t, e in errors:
+            term.err("Template \"" + t + "\": " + e)
+        term.err(str(len(errors)) + " of " + str(len(results)) +
+                 " template(s) failed, no output has been written.")
+        sys.exit(1)
+
+    failed = False
+    written = 0
+    for t, output, res, _ in results:
+        term.info("Processing template \"" + bold(t) + "\" for " + output +
+                  "...")
 
-            if not preview:
+        if preview:
+            if res is not None:
+                term.out(res)
+                size = len(res)
+            elif not term.is_quiet:
                 try:
-                    fp = open(output, 'w')
-                    fp.write(res)
-                    fp.close()
-                except IOError:
-                    term.err("Couldn't write file \"" + output + "\"")
-                    sys.exit(1)
+                    size = stream_template(t, keywords, sys.stdout, index)[1]
+                except TemplateError as e:
+                    term.err("Template \"" + t + "\": " + str(e))
+                    failed = True
+                    continue
+                sys.stdout.write(os.linesep)
             else:
-                term.out(res)
-
-            wrote_bytes = len(res) if preview else os.stat(output).st_size
-            term.info("Done, " + str(wrote_bytes) + " bytes written.")
+                size = 0
+            term.info("Done, " + str(size) + " bytes written.")
+            continue
+
+        try:
+            if isinstance(res, StreamedOutput):
+                changed = move_output(res.path, output)
+                size = res.size
+            else:
+                changed = write_output(output, res)
+                size = len(res)
+        except (IOError, OSError):
+            term.err("Couldn't write file \"" + output + "\"")
+            failed = True
+            continue
+
+        if changed:
+            written += 1
+            term.info("Done, " + str(size) + " bytes written.")
         else:
-            term.err("Couldn't find the \"" + t + "\" template")
-            sys.exit(1)
+            term.info("Done, output is up to date.")
+
+    if not preview:
+        term.info(str(written) + " output(s) written, " +
+                  str(len(results) - written) + " unchanged.")
+
+    if failed:
+        sys.exit(1)
+
+
+def load_repo_info(cfg, needs_build_id=None):
+    """
+    Returns the repository information, as computed by the resident daemon if
+    one is running, else computes it in-process: see get_repo_info.
+
+    The daemon is told HEAD's object name, if known in advance, and always
+    computes the abbreviated build id, so needs_build_id only matters to the
+    in-process computation.
+    """
+    # the daemon module is only loaded if one may be listening
+    if repo_cache.is_enabled() and os.path.exists(serve_socket_file()):
+        from gitver.daemon import query_repo_info
+        repo_info = query_repo_info(head_hint())
+        if repo_info is not None:
+            return repo_info
+
+    return get_repo_info(needs_build_id, cfg['tag_match'])
+
+
+def format_needs_build_id(cfg):
+    """
+    Returns a function telling whether the version string format in use for
+    the specified commit count references the abbreviated build id.
+    """
+    def needs_build_id(count):
+        key = 'format_next' if count > 0 else 'format'
+        return 'build_id' in cfg['format_variables'][key]
+    return needs_build_id
+
+
+def load_next_custom(repo_info):
+    """
+    Returns the user-defined NEXT string for the most recent tag, if any.
+    """
+    next_store = KVStore(next_store_file())
+    last_tag = repo_info['last-tag']
+    return next_store.get(last_tag) if next_store.has(last_tag) else None
 
 
 def parse_user_next_stable(user):
@@ -136,6 +384,18 @@ def parse_user_next_stable(user):
     return data
 
 
+class FormatNumber(str):
+    """
+    A version number as parsed from a tag: "%s" formats it as is, while
+    numeric conversions such as "%d" format its value.
+    """
+    def __int__(self):
+        return int(str(self), 10)
+
+    def __float__(self):
+        return float(str(self))
+
+
 def build_format_args(cfg, repo_info, next_custom=None):
     """
     Builds the formatting arguments by processing the specified repository
@@ -175,10 +435,10 @@ def build_format_args(cfg, repo_info, next_custom=None):
         cfg['default_meta_pr_in_next_no_next'] if in_next else ''
 
     args = {
-        'maj': vmaj,
-        'min': vmin,
-        'patch': vpatch,
-        'rev': vrev if has_rev else '',
+        'maj': FormatNumber(vmaj),
+        'min': FormatNumber(vmin),
+        'patch': FormatNumber(vpatch),
+        'rev': FormatNumber(vrev) if has_rev else '',
         'rev_prefix': '.' if has_rev else '',
         'meta_pr': meta_pr,
         'meta_pr_prefix': cfg['meta_pr_prefix'] if len(meta_pr) > 0 else '',
@@ -240,15 +500,16 @@ def cmd_init(cfg, args):
     configuration file whenever it's not found.
     """
     from config import create_default_configuration_file
+    from gitver.templates import template_dir
     i = 0
 
-    if not os.path.exists(CFGDIR):
+    if not os.path.exists(cfg_dir()):
         i += 1
-        os.makedirs(CFGDIR)
+        os.makedirs(cfg_dir())
 
-    if not os.path.exists(TPLDIR):
+    if not os.path.exists(template_dir()):
         i += 1
-        os.makedirs(TPLDIR)
+        os.makedirs(template_dir())
 
     # try create the default configuration file
     wrote_cfg = create_default_configuration_file()
@@ -260,17 +521,73 @@ def cmd_init(cfg, args):
                   "does it already exist?")
 
 
+def parse_custom_formats(formats):
+    """
+    Parses and validates the specified custom format strings, each optionally
+    named by a leading "NAME=": returns the list of (name, format) tuples,
+    unnamed formats being named after their position.
+    """
+    from gitver.config import format_variables, FormatError
+
+    parsed = []
+    for i, spec in enumerate(formats):
+        m = re.match(custom_format_matcher, spec)
+        name, fmt = m.groups() if m else ('format_' + str(i + 1), spec)
+        try:
+            format_variables(fmt)
+        except FormatError as e:
+            term.err("Invalid format string \"" + fmt + "\": " + str(e))
+            sys.exit(1)
+        parsed.append((name, fmt))
+    return parsed
+
+
+def current_variables(cfg, repo_info, next_custom):
+    """
+    Returns every variable describing the current version: the format
+    arguments, the current and promoted version strings and the most recent
+    tag.
+    """
+    variables = build_format_args(cfg, repo_info, next_custom)
+    variables['version'] = build_version_string(cfg, repo_info, False,
+                                                next_custom)
+    variables['promoted'] = build_version_string(cfg, repo_info, True,
+                                                 next_custom)
+    variables['last_tag'] = repo_info['last-tag']
+    variables['next'] = next_custom
+    return variables
+
+
 def cmd_current(cfg, args):
     """
     Generates the current version string, depending on the state of the
     repository and prints it to the stdout.
+
+    Custom format strings can be rendered in the same pass, and every version
+    variable can be emitted at once in a machine-readable format instead.
     """
-    next_store = KVStore(NEXT_STORE_FILE)
-    repo_info = get_repo_info()
-    last_tag = repo_info['last-tag']
-    has_next_custom = next_store.has(last_tag)
-    next_custom = next_store.get(last_tag) if has_next_custom else None
-    term.out(build_version_string(cfg, repo_info, False, next_custom))
+    formats = parse_custom_formats(args.formats)
+
+    if args.emit is None and len(formats) == 0:
+        repo_info = load_repo_info(cfg, format_needs_build_id(cfg))
+        next_custom = load_next_custom(repo_info)
+        term.out(build_version_string(cfg, repo_info, False, next_custom))
+        return
+
+    repo_info = load_repo_info(cfg)
+    next_custom = load_next_custom(repo_info)
+
+    format_args = build_format_args(cfg, repo_info, next_custom)
+    rendered = [(name, fmt % format_args) for name, fmt in formats]
+
+    if args.emit is None:
+        for name, value in rendered:
+            term.out(value)
+        return
+
+    from gitver.emitters import emitters
+    term.out(emitters[args.emit](
+        current_variables(cfg, repo_info, next_custom), rendered))
 
 
 def cmd_info(cfg, args):
@@ -278,12 +595,11 @@ def cmd_info(cfg, args):
     Generates version string and repository information and prints it to the
     stdout.
     """
-    next_store = KVStore(NEXT_STORE_FILE)
-    repo_info = get_repo_info()
+    repo_info = load_repo_info(cfg)
     last_tag = repo_info['last-tag']
 
-    has_next_custom = next_store.has(last_tag)
-    next_custom = next_store.get(last_tag) if has_next_custom else None
+    next_custom = load_next_custom(repo_info)
+    has_next_custom = next_custom is not None
 
     if has_next_custom:
         nvn = term.next(next_custom)
@@ -318,13 +634,53 @@ def cmd_list_templates(cfg, args):
     Generates a list of available templates by inspecting the gitver's template
     directory and prints it to the stdout.
     """
-    tpls = [f for f in os.listdir(TPLDIR) if os.path.isfile(template_path(f))]
+    from gitver.templates import TemplateError, TemplateIndex, \
+        list_templates, template_dir, template_path, output_path
+
+    tpls = list_templates()
     if len(tpls) > 0:
+        index = TemplateIndex()
         term.out("Available templates:")
         for t in tpls:
             term.out("    " + bold(t) + " (" + template_path(t) + ")")
+            try:
+                compiled = index.get(t)
+            except TemplateError as e:
+                term.out("        " + str(e))
+                continue
+            term.out("        => " + output_path(compiled))
+            if len(compiled['variables']) > 0:
+                term.out("        uses " +
+                         ", ".join(sorted(compiled['variables'])))
+        index.save()
     else:
-        term.out("No templates available in " + TPLDIR)
+        term.out("No templates available in " + template_dir())
+
+
+def cmd_list_tags(cfg, args):
+    """
+    Prints the version tags, selected by the configured patterns, one per
+    line, the most recent version first.
+    """
+    from gitver.tags import TagIndex, SeriesError
+
+    index = TagIndex(cfg['tag_match'])
+    try:
+        if args.latest:
+            tags = [index.latest(args.series)]
+            if tags[0] is None:
+                term.err("No reachable tag in this series")
+                sys.exit(1)
+        elif args.reachable:
+            tags = index.reachable(args.series)
+        else:
+            tags = index.tags(args.series)
+    except (SeriesError, GitError) as e:
+        term.err(str(e))
+        sys.exit(1)
+
+    for tag in tags:
+        term.out(tag)
 
 
 def __cmd_build_template(cfg, args, preview=False):
@@ -334,12 +690,47 @@ def __cmd_build_template(cfg, args, preview=False):
 
     See cmd_build_template and cmd_preview_template for the full docs.
     """
-    next_store = KVStore(NEXT_STORE_FILE)
-    repo_info = get_repo_info()
-    last_tag = repo_info['last-tag']
-    has_next_custom = next_store.has(last_tag)
-    next_custom = next_store.get(last_tag) if has_next_custom else None
-    parse_templates(cfg, args.templates, repo_info, next_custom, preview)
+    from gitver.templates import TemplateError, resolve_templates
+
+    try:
+        templates = resolve_templates(args.templates, args.all_templates)
+    except TemplateError as e:
+        term.err(str(e))
+        sys.exit(1)
+
+    repo_info = load_repo_info(cfg)
+    next_custom = load_next_custom(repo_info)
+    parse_templates(cfg, templates, repo_info, next_custom, preview)
+    return templates
+
+
+def depfile_dependencies(templates):
+    """
+    Returns the files the output of the specified templates depends on: the
+    git state files (see refs.state_files), the configuration, the NEXT
+    strings store, the minimum hash length state, the version anchor and the
+    templates themselves.
+    """
+    from gitver.templates import template_dir, template_path
+
+    gdir = resolve_git_dir()
+    deps = refs.state_files(gdir) if gdir is not None else []
+    # the hash length grows with commits the state files may not reflect,
+    # i.e. fetched branches, as soon as any gitver run notices them
+    deps.extend(p for p in [cfg_file(), next_store_file(),
+                            hashlen_state_file(), anchor_file()]
+                if os.path.exists(p))
+    # templates being added or removed change the directory
+    deps.append(template_dir())
+    deps.extend(template_path(t) for t in templates)
+    return [os.path.abspath(p) for p in deps]
+
+
+def __mtime(path):
+    try:
+        return os.path.getmtime(path)
+    except OSError:
+        return None
 
 
 def cmd_build_template(cfg, args):
@@ -347,8 +738,56 @@ def cmd_build_template(cfg, args):
     Performs placeholder variables substitution on the templates specified by
     the @param args parameter and write the result to each respective output
     file specified by the template itself.
+
+    If requested, a Make/Ninja dependency file listing the files the outputs
+    depend on is written and a stamp file, its target, is touched afterwards.
     """
-    __cmd_build_template(cfg, args)
+    import time
+    from gitver.depfile import format_depfile, touch_stamp
+
+    if args.depfile is not None and args.stamp is None:
+        # outputs whose contents don't change aren't written, so they would
+        # stay older than their dependencies and gitver would run every time
+        term.err("A dependency file requires a stamp file, use --stamp.")
+        sys.exit(1)
+
+    # the stamp is dated back to the start, so that any change happening
+    # while running is still newer than it
+    started = time.time()
+    hashlen_mtime = __mtime(hashlen_state_file())
+
+    if args.head is not None:
+        if re.match(refs.sha_matcher, args.head) is None:
+            term.err("Invalid HEAD object name \"" + args.head + "\", a full "
+                     "hash string is expected")
+            sys.exit(1)
+        set_head_hint(args.head)
+
+    templates = __cmd_build_template(cfg, args)
+
+    if args.depfile is not None:
+        # the target is named as specified, the way the build system does
+        text = format_depfile([args.stamp], depfile_dependencies(templates))
+        try:
+            write_output(args.depfile, text)
+        except (IOError, OSError) as e:
+            term.err("Couldn't write the dependency file \"" + args.depfile +
+                     "\": " + str(e))
+            sys.exit(1)
+
+    if args.stamp is not None:
+        # but the hash length state this run may have updated is not a change
+        # to run again for: utime truncates to the microsecond at best, and
+        # floats are barely that precise, hence the margin
+        mtime = __mtime(hashlen_state_file())
+        if mtime is not None and mtime != hashlen_mtime:
+            started = max(started, mtime + 0.001)
+        try:
+            touch_stamp(args.stamp, started)
+        except (IOError, OSError) as e:
+            term.err("Couldn't write the stamp file \"" + args.stamp +
+                     "\": " + str(e))
+            sys.exit(1)
 
 
 def cmd_preview_template(cfg, args):
@@ -369,8 +808,8 @@ def cmd_next(cfg, args):
 
     All values are expected to be decimal numbers without leading zeros.
     """
-    next_store = KVStore(NEXT_STORE_FILE)
-    repo_info = get_repo_info()
+    next_store = KVStore(next_store_file())
+    repo_info = load_repo_info(cfg)
 
     last_tag = repo_info['last-tag']
 
@@ -392,16 +831,51 @@ def cmd_next(cfg, args):
              " for the current tag " + term.tag(last_tag))
 
 
+def cmd_anchor(cfg, args):
+    """
+    Records the repository information for HEAD, as computed from the full
+    history, as the version anchor shallow clones will extend.
+    """
+    from gitver.anchor import make_anchor, format_anchor, write_anchor
+
+    if len(shallow_boundary()) > 0:
+        term.err("This is a shallow clone: anchors can only be created from "
+                 "the full history.")
+        sys.exit(1)
+
+    repo_info = load_repo_info(cfg)
+    hashlen = min_hash_length()
+    if not hashlen:
+        term.err("Couldn't compute the minimum hash string length")
+        sys.exit(1)
+
+    anchor = make_anchor(repo_info, hashlen)
+    if args.print_anchor:
+        term.out(format_anchor(anchor))
+        return
+
+    try:
+        write_anchor(anchor)
+    except IOError as e:
+        term.err("Couldn't write the version anchor: " + str(e))
+        sys.exit(1)
+
+    term.out("Anchored " + term.tag(anchor['commit']) + " at " +
+              term.tag(anchor['tag']) + " + " + str(anchor['count']) +
+              " commit(s), commit " + bold(os.path.basename(anchor_file())) +
+              " to let shallow clones use it.")
+
+
 def cmd_clean(cfg, args):
     """
     Removes the user-defined next stable version for the most recent and
     reachable tag or for the tag specified by the @param args parameter.
     """
-    next_store = KVStore(NEXT_STORE_FILE)
+    next_store = KVStore(next_store_file())
     if len(args.tag) > 0:
         tag = args.tag
     else:
-        repo_info = get_repo_info()
+        repo_info = load_repo_info(cfg)
         tag = repo_info['last-tag']
 
     has_custom = next_store.has(tag)
@@ -419,8 +893,9 @@ def cmd_cleanall(cfg, args):
     """
     Removes ALL user-defined next stable versions.
     """
-    if os.path.exists(NEXT_STORE_FILE):
-        os.unlink(NEXT_STORE_FILE)
+    next_store = KVStore(next_store_file())
+    if not next_store.empty():
+        next_store.clear()
         term.out("All previously set custom strings have been removed.")
     else:
         term.out("No NEXT custom strings found.")
@@ -431,8 +906,8 @@ def cmd_list_next(cfg, args):
     Generates a list of all user-defined next stable versions and prints them
     to the stdout.
     """
-    next_store = KVStore(NEXT_STORE_FILE)
-    repo_info = get_repo_info()
+    next_store = KVStore(next_store_file())
+    repo_info = load_repo_info(cfg)
     last_tag = repo_info['last-tag']
     has_next_custom = next_store.has(last_tag)
     if not next_store.empty():
@@ -452,6 +927,107 @@ def cmd_list_next(cfg, args):
         term.out("No NEXT custom strings set.")
 
 
+def history_entry(cfg, sha, described, hashlen, next_store):
+    """
+    Builds the version information for the specified commit, described by a
+    (tag, count) tuple, as printed by the history command.
+    """
+    entry = {'commit': sha, 'version': None, 'tag': None, 'count': None}
+    if sha is None:
+        entry['error'] = "Unknown revision"
+        return entry
+
+    if described is None:
+        entry['error'] = "No reachable tag"
+        return entry
+
+    tag, count = described
+    entry['tag'], entry['count'] = tag, count
+
+    repo_info = make_repo_info(tag, count, sha, sha[:hashlen])
+    if repo_info is None:
+        entry['error'] = "Tag \"" + tag + "\" has no version information"
+        return entry
+
+    next_custom = next_store.get(tag) if next_store.has(tag) else None
+    entry['version'] = build_version_string(cfg, repo_info, False,
+                                            next_custom)
+    return entry
+
+
+def cmd_history(cfg, args):
+    """
+    Prints the version string of every commit in the specified range, oldest
+    first, or of every revision read from the stdin in batch mode: history is
+    walked once, no matter how many commits are processed.
+    """
+    import json
+
+    hashlen = min_hash_length()
+    if not hashlen:
+        term.err("Couldn't compute the minimum hash string length")
+        sys.exit(1)
+
+    try:
+        if args.batch:
+            names = [l.strip() for l in sys.stdin if len(l.strip()) > 0]
+            described = describe_revisions(names, cfg['tag_match'])
+        else:
+            described = ((sha, sha, d) for sha, d in
+                         walk_history(args.revisions or ['HEAD'],
+                                      patterns=cfg['tag_match']))
+
+        next_store = KVStore(next_store_file())
+        for name, sha, d in described:
+            entry = history_entry(cfg, sha, d, hashlen, next_store)
+            if args.json:
+                if args.batch:
+                    entry['revision'] = name
+                term.out(json.dumps(entry, sort_keys=True))
+            else:
+                version = entry['version']
+                term.out(name + ' ' + (version if version else 'n/a'))
+
+    except GitError as e:
+        term.err("Couldn't walk the history: " + str(e))
+        sys.exit(1)
+
+
+def cmd_multi(cfg, args):
+    """
+    Computes the version information of every specified repository in
+    parallel and prints a JSON object per line for each of them, as soon as
+    it's available.
+    """
+    import json
+    from gitver.workspace import repo_versions
+
+    paths = list(args.dirs)
+    if args.from_file is not None:
+        try:
+            fp = sys.stdin if args.from_file == '-' else open(args.from_file)
+            paths.extend(l.strip() for l in fp if len(l.strip()) > 0)
+        except IOError as e:
+            term.err("Couldn't read the repositories list: " + str(e))
+            sys.exit(1)
+
+    if len(paths) == 0:
+        term.err("No repositories specified.")
+        sys.exit(1)
+
+    failed = 0
+    for result in repo_versions(paths, args.jobs):
+        if not result['ok']:
+            failed += 1
+        term.out(json.dumps(result, sort_keys=True))
+        sys.stdout.flush()
+
+    term.info(str(len(paths)) + " repositories processed, " + str(failed) +
+              " failed.")
+    if failed > 0:
+        sys.exit(1)
+
+
 def cmd_check_gitignore(cfg, args):
     """
     Provides a way to ensure that at least one line in the .gitignore file for
@@ -469,3 +1045,151 @@ def cmd_check_gitignore(cfg, args):
                  "exclude it from\nthe repository, unless you know what you "
                  "are doing. If you are not\nsure, add this line to your "
                  ".gitignore file:\n\n    " + CFGDIRNAME + "\n")
+
+
+def cmd_hooks(cfg, args):
+    """
+    Installs or removes the managed git hooks: "wait" is run by the hooks
+    themselves, it waits for the operation in progress to complete, then
+    updates the specified templates.
+    """
+    from gitver.hooks import install_hooks, uninstall_hooks, release_waiter, \
+        HooksError
+    from gitver.watch import wait_operation
+    from gitver.templates import TemplateError, resolve_templates
+
+    if args.action == 'wait':
+        gdir = resolve_git_dir()
+        if gdir is None:
+            term.err("Couldn't determine the git directory.")
+            sys.exit(1)
+        try:
+            # gives up on operations left in progress (i.e. a bisect): the
+            # hook fired as they end starts a new waiter
+            if wait_operation(gdir, timeout=args.timeout):
+                __cmd_build_template(cfg, args)
+        finally:
+            release_waiter(gdir)
+        return
+
+    hdir = hooks_dir()
+    if hdir is None:
+        term.err("Couldn't determine the git hooks directory.")
+        sys.exit(1)
+
+    try:
+        if args.action == 'install':
+            if args.all_templates:
+                templates = ['--all']
+            elif len(resolve_templates(args.templates)) > 0:
+                templates = args.templates
+            else:
+                term.err("No templates specified.")
+                sys.exit(1)
+            command = [sys.executable, os.path.abspath(sys.argv[0])]
+            for p in install_hooks(hdir, command, templates, args.force):
+                term.info("Installed " + p)
+        else:
+            removed = uninstall_hooks(hdir)
+            for p in removed:
+                term.info("Removed " + p)
+            if len(removed) == 0:
+                term.info("No hooks installed by gitver found.")
+    except TemplateError as e:
+        term.err(str(e))
+        sys.exit(1)
+    except (HooksError, IOError, OSError) as e:
+        term.err(str(e))
+        sys.exit(1)
+
+
+def cmd_cache_info(cfg, args):
+    """
+    Prints the repository information cache contents and its miss counter
+    to the stdout: hits are only counted by --timings, so that lookups stay
+    read-only.
+    """
+    stats = repo_cache.stats()
+    term.out("Cache misses: " + str(stats['misses']))
+
+    if stats['key'] is not None:
+        head, tags_fingerprint, hashlen = stats['key'][:3]
+        term.out("Cached HEAD: " + term.tag(head))
+        term.out("Cached tags fingerprint: " + tags_fingerprint)
+        if hashlen is not None:
+            term.out("Cached for hash length: " + str(hashlen))
+        if len(stats['key']) > 3:
+            term.out("Cached tag patterns: " + ", ".join(stats['key'][3]))
+        term.out("Cached most recent tag: " +
+                 term.tag(stats['info']['last-tag']))
+    else:
+        term.out("No repository information cached.")
+
+    if not repo_cache.is_enabled():
+        term.out("(cache is currently disabled by the --no-cache flag)")
+
+
+def cmd_cache_clear(cfg, args):
+    """
+    Removes the cached repository information and resets its counters.
+    """
+    repo_cache.clear()
+    term.out("The repository information cache has been cleared.")
+
+
+def cmd_serve(cfg, args):
+    """
+    Runs a resident daemon which keeps the repository information in memory
+    and answers version queries over a Unix domain socket in the gitver's
+    configuration directory: other gitver invocations will transparently use
+    it while it's running.
+    """
+    import socket
+    from gitver.daemon import serve, socket_path
+
+    term.info("Serving version queries on " + socket_path() +
+              ", press CTRL+C to stop.")
+    try:
+        serve()
+    except socket.error as e:
+        term.err("Couldn't start the daemon: " + str(e))
+        sys.exit(1)
+    except KeyboardInterrupt:
+        term.info("Daemon stopped.")
+
+
+def cmd_watch(cfg, args):
+    """
+    Watches the repository HEAD and refs and updates the specified templates
+    whenever they change, coalescing bursts of changes into a single update.
+    """
+    from gitver.git import resolve_git_dir
+    from gitver.watch import watch
+    from gitver.templates import TemplateError, resolve_templates
+
+    gdir = resolve_git_dir()
+    if gdir is None:
+        term.err("Couldn't determine the git directory.")
+        sys.exit(1)
+
+    try:
+        templates = resolve_templates(args.templates, args.all_templates)
+    except TemplateError as e:
+        term.err(str(e))
+        sys.exit(1)
+
+    def update():
+        try:
+            repo_info = get_repo_info(None, cfg['tag_match'])
+            next_custom = load_next_custom(repo_info)
+            parse_templates(cfg, templates, repo_info, next_custom, False)
+        except SystemExit:
+            # errors have been reported already, keep watching
+            pass
+
+    update()
+    term.info("Watching for changes, press CTRL+C to stop.")
+    try:
+        watch(gdir, update, args.settle, args.poll)
+    except KeyboardInterrupt:
+        term.info("Stopped watching.")
@@ -3,15 +3,44 @@
 
 """
 The default per-repository configuration
+
+The configuration file is compiled once, merged with the defaults and with its
+format strings validated, then cached in gitver's configuration directory
+until the file changes.
 """
 
+import os
+import re
 import sys
-import json
 import string
 from os.path import exists, dirname
-from gitver.defines import CFGFILE
+from gitver.storage import KVStore
+from gitver.defines import cfg_file, config_cache_file
+from gitver.trace import tracer, traced
 from termcolors import term, bold
 
+# variable names available to the format strings, see build_format_args
+FORMAT_VARIABLES = ['maj', 'min', 'patch', 'rev', 'rev_prefix',
+                    'meta_pr_prefix', 'meta_pr', 'commit_count_prefix',
+                    'commit_count', 'build_id', 'build_id_full']
+
+# variables which are always numbers, so numeric conversions such as "%d"
+# apply to them: the commit count only is in "format_next", being 0, thus an
+# empty string, otherwise
+NUMERIC_VARIABLES = ['maj', 'min', 'patch']
+COUNTED_NUMERIC_VARIABLES = NUMERIC_VARIABLES + ['commit_count']
+
+# the configuration keys holding format strings
+FORMAT_KEYS = ['format', 'format_next']
+
+# bumped whenever the compiled configuration changes, so that configurations
+# cached by older versions are compiled again
+COMPILED_VERSION = 4
+
+# a single conversion specifier, as understood by the % operator
+format_spec = re.compile(r'%(?:\(([^)]*)\))?[#0 +-]*(\*|\d+)?'
+                         r'(?:\.(\*|\d*))?[hlL]?(.?)')
+
 default_config_text = """{
     # automatically generated configuration file
     #
@@ -39,6 +68,11 @@ default_config_text = """{
     # default commit count prefix
     "commit_count_prefix": ".",
 
+    # glob patterns selecting the version tags: tags not matching any of them,
+    # i.e. release names, dates or deployment markers, are ignored when looking
+    # for the most recent tag
+    "tag_match": ["v[0-9]*.[0-9]*.[0-9]*", "[0-9]*.[0-9]*.[0-9]*"],
+
     # Python-based format string variable names are:
     #     maj, min, patch, rev, rev_prefix, meta_pr_prefix, meta_pr,
     #     commit_count_prefix, commit_count, build_id, build_id_full
@@ -70,7 +104,97 @@ def remove_comments(text):
     return ret
 
 
-default_config = json.loads(remove_comments(default_config_text))
+__default_config = None
+
+
+def default_config():
+    """
+    Returns the default configuration, parsed on first use.
+    """
+    global __default_config
+    if __default_config is None:
+        import json
+        __default_config = json.loads(remove_comments(default_config_text))
+    return __default_config
+
+
+class FormatError(Exception):
+    """
+    Raised whenever a format string is not valid
+    """
+    pass
+
+
+def format_variables(fmt, counted=False):
+    """
+    Validates the specified format string and returns the set of variable
+    names it references: if counted is True, the format string is only used
+    when the commit count is greater than 0.
+    """
+    numeric = COUNTED_NUMERIC_VARIABLES if counted else NUMERIC_VARIABLES
+    variables = set()
+    for m in format_spec.finditer(fmt):
+        name, width, precision, conversion = m.groups()
+        if m.group(0) == '%%':
+            continue
+
+        if conversion == '' or conversion not in 'diouxXeEfFgGcrs':
+            raise FormatError("incomplete or invalid conversion \"" +
+                              m.group(0) + "\"")
+
+        if name is None or width == '*' or precision == '*':
+            raise FormatError("\"" + m.group(0) + "\" doesn't specify a "
+                              "variable name, use \"%(name)s\"")
+
+        if name not in FORMAT_VARIABLES:
+            raise FormatError("unknown variable \"" + name + "\", valid "
+                              "names are: " + ", ".join(FORMAT_VARIABLES))
+
+        # other variables may be empty strings, i.e. the revision of tags
+        # not specifying one, so numeric conversions would fail
+        if conversion not in 'rs' and name not in numeric:
+            raise FormatError("\"" + m.group(0) + "\" is a numeric "
+                              "conversion, but \"" + name + "\" may be an "
+                              "empty string: use \"%(" + name + ")s\"")
+
+        if conversion == 'c':
+            raise FormatError("\"" + m.group(0) + "\" is a character "
+                              "conversion, use \"%(" + name + ")s\"")
+
+        variables.add(name)
+
+    return variables
+
+
+def compile_config(user):
+    """
+    Merges the specified user configuration with the default one, validates
+    its format strings and tag patterns, then records the variables each
+    format string references, mapped by format key, in the "format_variables"
+    entry.
+    """
+    cfg = dict(default_config(), **user)
+
+    variables = dict()
+    for key in FORMAT_KEYS:
+        try:
+            variables[key] = format_variables(cfg[key],
+                                              key == 'format_next')
+        except FormatError as e:
+            raise ValueError("invalid \"" + key + "\" format string, " +
+                             str(e))
+    cfg['format_variables'] = variables
+
+    patterns = cfg['tag_match']
+    if isinstance(patterns, basestring):
+        patterns = [patterns]
+    if not isinstance(patterns, list) or len(patterns) == 0 or \
+            not all(isinstance(p, basestring) and p for p in patterns):
+        raise ValueError("\"tag_match\" must be a non-empty list of glob "
+                         "patterns")
+    cfg['tag_match'] = [str(p) for p in patterns]
+
+    return cfg
 
 
 def create_default_configuration_file():
@@ -79,39 +203,73 @@ def create_default_configuration_file():
     configuration text string in the predefined gitver's configuration
     directory.
     """
-    if not exists(CFGFILE):
-        if exists(dirname(CFGFILE)):
-            with open(CFGFILE, 'w') as f:
+    if not exists(cfg_file()):
+        if exists(dirname(cfg_file())):
+            with open(cfg_file(), 'w') as f:
                 f.writelines(default_config_text)
                 return True
     return False
 
 
-def load_user_config():
+class ConfigError(Exception):
     """
-    Returns the gitver's configuration: tries to read the stored configuration
-    file and merges it with the default one, ensuring a valid configuration is
-    always returned.
+    Raised whenever the configuration file can't be parsed or is not valid
+    """
+    pass
+
+
+@traced('load_user_config')
+def read_user_config():
     """
+    Same as load_user_config, but an invalid configuration raises a
+    ConfigError rather than being reported.
+    """
+    cache = None
     try:
 
-        with open(CFGFILE, 'r') as f:
-            data = ''
-            for line in f:
-                l = line.strip()
-                if not l.startswith('#'):
-                    data += l
-            user = json.loads(data)
+        with open(cfg_file(), 'r') as f:
+            st = os.fstat(f.fileno())
+            stamp = (COMPILED_VERSION, st.st_size, st.st_mtime, st.st_ino)
+
+            cache = KVStore(config_cache_file())
+            cached = cache.get('config')
+            if cached and cached[0] == stamp:
+                tracer.count('config cache hits')
+                return cached[1]
+            tracer.count('config cache misses')
+
+            import json
+            user = json.loads(''.join(l for l in f
+                                      if not l.strip().startswith('#')))
+
+        cfg = compile_config(user)
 
     except IOError:
-        user = dict()
+        cfg = compile_config(dict())
+
+    except (ValueError, TypeError) as v:
+        raise ConfigError(str(v))
+
+    if cache is not None:
+        cache.set('config', (stamp, cfg)).save()
+
+    return cfg
+
+
+def load_user_config():
+    """
+    Returns the gitver's configuration: tries to read the stored configuration
+    file and merges it with the default one, ensuring a valid configuration is
+    always returned.
 
-    except (ValueError, KeyError) as v:
+    The compiled configuration is cached until the file changes, so that most
+    runs don't need to parse it at all.
+    """
+    try:
+        return read_user_config()
+    except ConfigError as e:
         term.err("An error occured parsing the configuration file \"" +
-                 CFGFILE + "\": " + v.message +
+                 cfg_file() + "\": " + str(e) +
                  "\nPlease check its syntax or rename it and generate the "
                  "default one with the " + bold("gitver init") + " command.")
         sys.exit(1)
-
-    # merge user with defaults
-    return dict(default_config, **user)
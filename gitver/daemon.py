@@ -0,0 +1,234 @@
+#!/usr/bin/env python2
+# coding=utf-8
+
+"""
+Resident daemon answering version queries over a Unix domain socket
+
+The protocol is line-based: each request is a single JSON object terminated
+by a newline, answered by a single JSON object terminated by a newline.
+
+    {"cmd": "repo_info", "head": "sha"}     => {"ok": true, "repo_info": {..}}
+    {"cmd": "current"}                      => {"ok": true, "out": "1.2.3"}
+    {"cmd": "info"}                         => {"ok": true, "info": {..}}
+    {"cmd": "render", "template": "name"}   => {"ok": true, "out": ".."}
+
+Failed requests are answered with {"ok": false, "error": "message"}. Every
+request may specify HEAD's object name, if known in advance, as "head".
+"""
+
+import os
+import re
+import sys
+import json
+import signal
+import socket
+import threading
+import SocketServer
+
+from gitver.defines import serve_socket_file
+from gitver.cache import repo_cache
+from gitver.refs import sha_matcher
+
+# seconds to wait for the daemon before falling back to in-process computation
+CLIENT_TIMEOUT = 2.0
+
+
+def socket_path():
+    return serve_socket_file()
+
+
+def utf8(value):
+    """
+    Turns the unicode strings json decodes into plain, UTF-8 encoded, ones.
+    """
+    return value.encode('utf-8') if isinstance(value, unicode) else value
+
+
+class RepoState(object):
+    """
+    Keeps the repository information in memory, recomputing it only when HEAD
+    or the tag refs have changed.
+    """
+    def __init__(self):
+        self.__lock = threading.Lock()
+        self.__key = None
+        self.__info = None
+
+    def repo_info(self, patterns, head=None):
+        from gitver.git import compute_repo_info, git_dir, set_head_hint
+
+        with self.__lock:
+            key = repo_cache.key(git_dir(), head)
+            if key is not None:
+                key += (tuple(patterns),)
+            if self.__info is None or key is None or key != self.__key:
+                # the hint only applies to this computation, the lock
+                # serializes them
+                set_head_hint(head)
+                try:
+                    self.__info = compute_repo_info(None, patterns)
+                finally:
+                    set_head_hint(None)
+                self.__key = key
+            return dict(self.__info)
+
+
+class RequestHandler(SocketServer.StreamRequestHandler):
+    """
+    Answers the requests coming from a single client connection.
+    """
+    def handle(self):
+        for line in iter(self.rfile.readline, ''):
+            try:
+                response = self.server.answer(json.loads(line))
+            except ValueError:
+                response = {'ok': False, 'error': "Malformed request"}
+            self.wfile.write(json.dumps(response) + '\n')
+            self.wfile.flush()
+
+
+class Server(SocketServer.ThreadingMixIn, SocketServer.UnixStreamServer):
+    """
+    Serves concurrent version queries for the current repository.
+    """
+    daemon_threads = True
+
+    def __init__(self, path):
+        self.state = RepoState()
+        SocketServer.UnixStreamServer.__init__(self, path, RequestHandler)
+
+    def answer(self, request):
+        from gitver.config import read_user_config, ConfigError
+        from gitver.git import RepoInfoError
+        from gitver.backends import GitError
+        from gitver.commands import load_next_custom, build_version_string, \
+            build_keywords, parse_user_next_stable
+        from gitver.templates import render_template, TemplateError
+
+        if not isinstance(request, dict):
+            request = dict()
+        cmd = utf8(request.get('cmd'))
+        if cmd == 'ping':
+            return {'ok': True}
+        if cmd not in ['repo_info', 'current', 'info', 'render']:
+            return {'ok': False, 'error': "Unknown command \"" + str(cmd) +
+                                          "\""}
+
+        head = utf8(request.get('head'))
+        if head is not None and (not isinstance(head, str) or
+                                 re.match(sha_matcher, head) is None):
+            return {'ok': False, 'error': "Invalid HEAD object name"}
+
+        try:
+            cfg = read_user_config()
+            repo_info = self.state.repo_info(cfg['tag_match'], head)
+            if cmd == 'repo_info':
+                return {'ok': True, 'repo_info': repo_info}
+
+            next_custom = load_next_custom(repo_info)
+
+            # same conditions build_format_args parses it on
+            in_use = repo_info['count'] > 0 and repo_info['pr'] is None
+            if in_use and next_custom and \
+                    not parse_user_next_stable(next_custom):
+                return {'ok': False, 'error': "Invalid custom NEXT version "
+                                              "numbers \"" + next_custom +
+                                              "\""}
+
+            if cmd == 'current':
+                return {'ok': True, 'out': build_version_string(
+                    cfg, repo_info, False, next_custom)}
+
+            if cmd == 'info':
+                return {'ok': True, 'info': {
+                    'repo_info': repo_info,
+                    'next': next_custom,
+                    'version': build_version_string(
+                        cfg, repo_info, False, next_custom),
+                    'promoted': build_version_string(
+                        cfg, repo_info, True, next_custom)}}
+
+            # render
+            keywords = build_keywords(cfg, repo_info, next_custom)
+            output, res = render_template(str(utf8(request.get('template'))),
+                                          keywords)
+            return {'ok': True, 'output': output, 'out': res}
+
+        except (ConfigError, RepoInfoError, GitError, TemplateError) as e:
+            return {'ok': False, 'error': str(e)}
+
+
+def is_running(path=None):
+    """
+    Checks whether a daemon is listening on the specified socket.
+    """
+    return query({'cmd': 'ping'}, path) is not None
+
+
+def query(request, path=None):
+    """
+    Sends the specified request to the daemon and returns its response, or
+    None if no daemon could be reached.
+    """
+    path = path or socket_path()
+    if not os.path.exists(path):
+        return None
+
+    s = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    s.settimeout(CLIENT_TIMEOUT)
+    try:
+        s.connect(path)
+        s.sendall(json.dumps(request) + '\n')
+        fp = s.makefile('r')
+        line = fp.readline()
+        fp.close()
+        return json.loads(line) if len(line) > 0 else None
+    except (socket.error, ValueError):
+        return None
+    finally:
+        s.close()
+
+
+def query_repo_info(head=None):
+    """
+    Asks the daemon for the repository information, HEAD being the specified
+    object name if any: returns None if it's not running or it couldn't
+    answer for that HEAD.
+    """
+    request = {'cmd': 'repo_info'}
+    if head is not None:
+        request['head'] = head
+
+    response = query(request)
+    if response is None or not response.get('ok'):
+        return None
+
+    # json turns strings into unicode ones, keep them plain
+    info = {utf8(k): utf8(v) for k, v in response['repo_info'].items()}
+    if head is not None and info.get('full-build-id') != head:
+        return None
+    return info
+
+
+def serve():
+    """
+    Runs the daemon until interrupted, the socket is removed on exit.
+    """
+    path = socket_path()
+    if is_running(path):
+        raise socket.error("A daemon is already listening on " + path)
+
+    if os.path.exists(path):
+        # stale socket left by a daemon that didn't exit cleanly
+        os.unlink(path)
+
+    # let a plain kill stop the daemon cleanly as well
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+
+    server = Server(path)
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+        if os.path.exists(path):
+            os.unlink(path)
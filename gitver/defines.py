@@ -3,14 +3,104 @@
 
 """
 Project definitions
+
+Paths are computed lazily on first use, so that importing any gitver module
+never spawns git.
 """
 
 import os
-from gitver.git import project_root
-
-PRJ_ROOT = project_root()
+import threading
+from contextlib import contextmanager
 
 CFGDIRNAME = ".gitver"
-CFGDIR = os.path.join(PRJ_ROOT, CFGDIRNAME)
-CFGFILE = os.path.join(CFGDIR, "config")
-GITIGNOREFILE = os.path.join(PRJ_ROOT, ".gitignore")
+
+__prj_root = None
+__work_dir = None
+__lock = threading.RLock()
+
+
+def work_dir():
+    """
+    Returns the directory the repository is looked up from, the current
+    working directory unless a different repository is in use.
+    """
+    return __work_dir or os.getcwd()
+
+
+def prj_root():
+    """
+    Returns the project's root directory, or an empty string if it can't be
+    determined.
+    """
+    global __prj_root
+    if __prj_root is None:
+        from gitver.git import project_root
+        __prj_root = project_root()
+    return __prj_root
+
+
+def set_work_dir(path):
+    """
+    Switches to the specified working directory, the project's root directory
+    will be determined again on next use.
+    """
+    global __prj_root
+    os.chdir(path)
+    __prj_root = None
+
+
+@contextmanager
+def repository(path, backend):
+    """
+    Uses the repository at the specified path and the specified git backend,
+    bound to it, for the duration of the context, without changing the
+    current working directory: contexts are serialized across threads.
+    """
+    global __prj_root, __work_dir
+    from gitver.backends import set_backend
+
+    with __lock:
+        saved = __prj_root, __work_dir
+        __prj_root, __work_dir = None, os.path.abspath(path)
+        previous = set_backend(backend)
+        try:
+            yield
+        finally:
+            set_backend(previous)
+            __prj_root, __work_dir = saved
+
+
+def cfg_dir():
+    return os.path.join(prj_root(), CFGDIRNAME)
+
+
+def cfg_file():
+    return os.path.join(cfg_dir(), "config")
+
+
+def gitignore_file():
+    return os.path.join(prj_root(), ".gitignore")
+
+
+def hashlen_state_file():
+    return os.path.join(cfg_dir(), ".hashlen_state")
+
+
+def repo_cache_file():
+    return os.path.join(cfg_dir(), ".repo_cache")
+
+
+def config_cache_file():
+    return os.path.join(cfg_dir(), ".config_cache")
+
+
+def tag_index_file():
+    return os.path.join(cfg_dir(), ".tag_index")
+
+
+def anchor_file():
+    return os.path.join(prj_root(), ".gitver-anchor")
+
+
+def serve_socket_file():
+    return os.path.join(cfg_dir(), ".serve.sock")
@@ -0,0 +1,46 @@
+#!/usr/bin/env python2
+# coding=utf-8
+
+"""
+Make/Ninja dependency files
+
+A dependency file lists the files the output of "gitver update" depends on,
+so that build systems only run it again when any of them changes.
+"""
+
+import os
+import time
+
+
+def escape(path):
+    """
+    Escapes the specified path for a Makefile rule, Ninja understands the
+    same syntax.
+    """
+    return path.replace('\\', '\\\\').replace(' ', '\\ ') \
+        .replace('#', '\\#').replace('$', '$$')
+
+
+def format_depfile(targets, dependencies):
+    """
+    Returns a rule making the specified targets depend on the specified
+    files, followed by an empty rule for each of them, so that make doesn't
+    fail when one is deleted (i.e. a loose ref being packed).
+    """
+    lines = [' '.join(escape(t) for t in targets) + ':' +
+             ''.join(' \\\n  ' + escape(d) for d in dependencies)]
+    for d in dependencies:
+        lines.append('')
+        lines.append(escape(d) + ':')
+    return '\n'.join(lines) + '\n'
+
+
+def touch_stamp(path, mtime=None):
+    """
+    Creates or updates the specified stamp file, setting its modification
+    time to the specified one, if any, else to the current time.
+    """
+    with open(path, 'a'):
+        pass
+    mtime = time.time() if mtime is None else mtime
+    os.utime(path, (mtime, mtime))
@@ -0,0 +1,58 @@
+#!/usr/bin/env python2
+# coding=utf-8
+
+"""
+Machine-readable emitters for the version variables
+
+Each emitter turns the variables, a dictionary, and the custom formats, a list
+of (name, rendered string) tuples, into text suitable for a specific consumer.
+"""
+
+import json
+import pipes
+
+# variable names prefix, for the emitters defining global names
+PREFIX = 'GITVER_'
+
+
+def __flatten(variables, formats):
+    """
+    Returns the sorted (name, value) tuples for the variables followed by the
+    custom formats, names being prefixed and uppercase.
+    """
+    items = [(PREFIX + k.upper(), v) for k, v in sorted(variables.items())]
+    items.extend((PREFIX + name.upper(), v) for name, v in formats)
+    return [(k, '' if v is None else str(v)) for k, v in items]
+
+
+def emit_json(variables, formats):
+    data = dict(variables)
+    data['formats'] = dict(formats)
+    return json.dumps(data, sort_keys=True)
+
+
+def emit_env(variables, formats):
+    return '\n'.join("%s=%s" % (k, pipes.quote(v))
+                     for k, v in __flatten(variables, formats))
+
+
+def emit_make(variables, formats):
+    def escape(v):
+        return v.replace('$', '$$').replace('#', '\\#')
+    return '\n'.join("%s := %s" % (k, escape(v))
+                     for k, v in __flatten(variables, formats))
+
+
+def emit_cmake(variables, formats):
+    def escape(v):
+        return v.replace('\\', '\\\\').replace('"', '\\"').replace('$', '\\$')
+    return '\n'.join("set(%s \"%s\")" % (k, escape(v))
+                     for k, v in __flatten(variables, formats))
+
+
+emitters = {
+    'json': emit_json,
+    'env': emit_env,
+    'make': emit_make,
+    'cmake': emit_cmake
+}
@@ -5,30 +5,106 @@
 git support library
 """
 
+import os
 import sys
 import re
+import time
+import fnmatch
 from gitver.termcolors import term
-
-# check for the sh package
-try:
-    import sh
-    from sh import ErrorReturnCode, CommandNotFound
-except ImportError:
-    term.err("A dependency is missing, please install the \"sh\" package and "
-             "run gitver again.")
-    sys.exit(1)
+from gitver import refs
+from gitver.cache import repo_cache
+from gitver.backends import get_backend, GitError
+from gitver.defines import work_dir
+from gitver.trace import tracer, traced
 
 hash_matcher = r".*-g([a-fA-F0-9]+)"
+describe_matcher = r"(?P<tag>.+)-(?P<count>\d+)-g(?P<sha>[a-fA-F0-9]{40})$"
+# commits described by a single git describe invocation
+DESCRIBE_BATCH = 256
+# longest history segment counted incrementally, git describe is run again
+# beyond it
+INCREMENTAL_LIMIT = 10000
+# shortest hash string length used, to avoid frequent length variations in
+# fast-growing projects
+MIN_HASH_LENGTH = 7
+
+# HEAD's object name, when known in advance (i.e. passed by a git hook)
+__head_hint = None
+
 tag_matcher = r"v{0,1}(?P<maj>\d+)\.(?P<min>\d+)\.(?P<patch>\d+)" \
               r"(?:\.(?P<revision>\d+))?[^-]*(?:-(?P<prmeta>[0-9A-Za-z-.]*))?"
 
 
-def __git_raw(*args):
+def __git_raw(*args, **kwargs):
+    """
+    Proxies the specified git command+args to the current git backend and
+    returns its stdout buffer, data can be fed to git via the "stdin" keyword
+    argument.
+    """
+    if not tracer.enabled:
+        return get_backend().run(args, kwargs.get('stdin'))
+
+    started = time.time()
+    out, status = '', 0
+    try:
+        out = get_backend().run(args, kwargs.get('stdin'))
+        return out
+    except GitError as e:
+        status = e.status
+        raise
+    finally:
+        tracer.git(args, time.time() - started, len(out), status)
+
+
+def __git_lines(*args, **kwargs):
+    """
+    Proxies the specified git command+args to the current git backend and
+    streams its stdout line by line, without retaining it in memory.
+    """
+    if not tracer.enabled:
+        return get_backend().lines(args, kwargs.get('stdin'))
+    return __traced_lines(args, kwargs.get('stdin'))
+
+
+def __traced_lines(args, stdin):
+    """
+    Same as __git_lines, recording the invocation: being streamed, its time
+    includes the time spent consuming the output.
+    """
+    started = time.time()
+    size, status = 0, 0
+    try:
+        for line in get_backend().lines(args, stdin):
+            size += len(line)
+            yield line
+    except GitError as e:
+        status = e.status
+        raise
+    finally:
+        tracer.git(args, time.time() - started, size, status)
+
+
+def __object_info(names):
     """
-    @return sh.RunningCommand
-    Proxies the specified git command+args and returns it
+    Proxies the specified object lookups to the current git backend.
     """
-    return sh.git(args)
+    if not tracer.enabled:
+        return get_backend().object_info(names)
+
+    started = time.time()
+    info, status = dict(), 0
+    try:
+        info = get_backend().object_info(names)
+        return info
+    except GitError as e:
+        status = e.status
+        raise
+    finally:
+        # the same amount git cat-file --batch-check outputs
+        size = sum(len(n) + 9 if i is None else len("%s %s %d\n" % i)
+                   for n, i in info.items())
+        tracer.git(['cat-file', '--batch-check'] + list(names),
+                   time.time() - started, size, status)
 
 
 def __git(*args):
@@ -36,21 +112,60 @@ def __git(*args):
     Proxies the specified git command+args and returns a cleaned up version
     of the stdout buffer.
     """
-    return __git_raw(*args).stdout.replace('\n', '')
+    return __git_raw(*args).replace('\n', '')
 
 
 def git_version():
     try:
         ver = __git('--version')
-    except (CommandNotFound, ErrorReturnCode):
+    except GitError:
         return ''
     return ver
 
 
+def git_dir():
+    """
+    Returns the git directory for the repository containing the current
+    working directory, as found by the ref reader, or None.
+    """
+    return refs.find_git_dir(work_dir())[1]
+
+
+def resolve_git_dir():
+    """
+    Returns the git directory for the current repository, asking git when the
+    ref reader can't find it, or None.
+    """
+    gdir = git_dir()
+    if gdir is not None:
+        return gdir
+
+    try:
+        return __git('rev-parse', '--absolute-git-dir')
+    except GitError:
+        return None
+
+
+def hooks_dir():
+    """
+    Returns the directory git runs the hooks from, honoring core.hooksPath,
+    or None.
+    """
+    try:
+        path = __git('rev-parse', '--git-path', 'hooks')
+    except GitError:
+        return None
+    return os.path.join(work_dir(), path)
+
+
 def project_root():
+    root = refs.find_git_dir(work_dir())[0]
+    if root is not None:
+        return root
+
     try:
         root = __git('rev-parse', '--show-toplevel')
-    except ErrorReturnCode:
+    except GitError:
         return ''
     return root
 
@@ -59,27 +174,391 @@ def count_tag_to_head(tag):
     try:
         c = __git('rev-list', tag + "..HEAD", '--count')
         return int(c)
-    except ErrorReturnCode:
+    except GitError:
         return False
 
 
+def set_head_hint(sha):
+    """
+    Uses the specified object name as HEAD's one rather than resolving it,
+    None resolves it again.
+    """
+    global __head_hint
+    __head_hint = sha
+
+
+def head_hint():
+    """
+    Returns the object name set by set_head_hint, if any.
+    """
+    return __head_hint
+
+
 def get_build_id():
+    if __head_hint is not None:
+        return __head_hint
+
+    gdir = git_dir()
+    if gdir is not None:
+        full_build_id = refs.head_sha(gdir)
+        if full_build_id is not None:
+            return full_build_id
+
     try:
         full_build_id = str(__git('rev-parse', 'HEAD'))
-    except ErrorReturnCode:
+    except GitError:
         return False
     return full_build_id
 
 
-def last_tag():
+def match_args(patterns):
+    """
+    Returns the git describe arguments restricting the candidate tags to the
+    ones matching any of the specified glob patterns, if any.
+    """
+    args = []
+    for p in patterns or []:
+        args.extend(['--match', p])
+    return args
+
+
+def tag_matches(name, patterns):
+    """
+    Checks whether the specified tag name matches any of the specified glob
+    patterns, the same way git describe does: no patterns match every tag.
+    """
+    return patterns is None or any(fnmatch.fnmatchcase(name, p)
+                                   for p in patterns)
+
+
+def last_tag(patterns=None):
     try:
-        tag = __git('describe', '--abbrev=0')
-    except ErrorReturnCode:
+        tag = __git('describe', '--abbrev=0', *match_args(patterns))
+    except GitError:
         return False
 
     return tag
 
 
+def read_peeled_tags(gdir):
+    """
+    Returns the tags as read by the ref reader, peeling the ones it couldn't
+    peel by itself via the git backend: this is a single batch of object
+    lookups, answered by the same process when using the cat-file backend.
+    """
+    tags = refs.read_tags(gdir)
+    unknown = [name for name, (sha, peeled) in tags.items() if peeled is None]
+    if len(unknown) == 0:
+        return tags
+
+    try:
+        info = __object_info([tags[n][0] + '^{}' for n in unknown])
+    except GitError:
+        return None
+
+    for name in unknown:
+        peeled = info[tags[name][0] + '^{}']
+        if peeled is None:
+            return None
+        tags[name] = (tags[name][0], peeled[0])
+
+    return tags
+
+
+def describe_exact_head(patterns=None):
+    """
+    Resolves HEAD by only reading the refs database, this succeeds whenever
+    HEAD is exactly at a single annotated tag matching the specified patterns.
+
+    Returns the same tuple as describe_head or None.
+    """
+    gdir = git_dir()
+    if gdir is None:
+        return None
+
+    head = __head_hint or refs.head_sha(gdir)
+    if head is None:
+        return None
+
+    tags = read_peeled_tags(gdir)
+    if tags is None:
+        return None
+
+    # multiple tags at HEAD are disambiguated by git describe
+    names = refs.tags_at(tags, head)
+    if names is not None:
+        names = [n for n in names if tag_matches(n, patterns)]
+    if names is None or len(names) != 1:
+        return None
+
+    return names[0], 0, head
+
+
+def describe_head(patterns=None):
+    """
+    Resolves the most recent reachable tag, the number of commits from it to
+    HEAD and the full HEAD hash string with a single git invocation: only
+    tags matching the specified glob patterns, if any, are considered.
+
+    Returns a (tag, count, full build id) tuple or None if HEAD can't be
+    described.
+    """
+    exact = describe_exact_head(patterns)
+    if exact is not None:
+        return exact
+
+    try:
+        out = __git('describe', '--long', '--abbrev=40',
+                    *match_args(patterns))
+    except GitError:
+        return None
+
+    m = re.match(describe_matcher, out)
+    if m is None:
+        return None
+
+    return m.group('tag'), int(m.group('count')), m.group('sha')
+
+
+def tagged_commits(patterns=None):
+    """
+    Returns the set of commits pointed to by the annotated tags matching the
+    specified patterns, by reading the refs database if possible.
+    """
+    gdir = git_dir()
+    tags = refs.read_tags(gdir) if gdir is not None else dict()
+    if all(peeled is not None for sha, peeled in tags.values()):
+        return {peeled for name, (sha, peeled) in tags.items()
+                if peeled != sha and tag_matches(name, patterns)}
+
+    return {commit for name, commit in list_tags()
+            if tag_matches(name, patterns)}
+
+
+def __segment(head, base, limit=None):
+    """
+    Returns the commits reachable from head but not from base, each one as a
+    list holding its name followed by its parents, or None if git fails.
+    """
+    args = ['rev-list', '--parents']
+    if limit is not None:
+        args.append('--max-count=' + str(limit))
+    try:
+        out = __git_raw(*(args + [head, '^' + base]))
+    except GitError:
+        return None
+
+    return [line.split() for line in out.split('\n') if len(line) > 0]
+
+
+def describe_since(base, tag, count, head, patterns=None):
+    """
+    Extends the description of the base commit, being count commits from the
+    specified tag, to the specified head by only walking the commits in
+    between: as long as they are a linear, untagged, segment git describe
+    would walk them first, then go on exactly as it did from base, so the
+    most recent tag doesn't change and the count grows by their number.
+
+    Returns the same tuple as describe_head or None if the description can't
+    be extended, i.e. head doesn't descend from base anymore, the segment is
+    too long or it holds merges, whose description depends on the order git
+    describe happens to walk their parents in.
+    """
+    segment = __segment(head, base, INCREMENTAL_LIMIT + 1)
+    if segment is None or len(segment) == 0 or \
+            len(segment) > INCREMENTAL_LIMIT:
+        return None
+
+    if any(len(commit) != 2 for commit in segment):
+        return None
+
+    # base is an ancestor of head only if it's a parent of the segment
+    if not any(commit[1] == base for commit in segment):
+        return None
+
+    tagged = tagged_commits(patterns)
+    if any(commit[0] in tagged for commit in segment):
+        return None
+
+    return tag, count + len(segment), head
+
+
+def shallow_boundary():
+    """
+    Returns the set of commits the history is truncated at, an empty one
+    unless this is a shallow clone.
+    """
+    gdir = resolve_git_dir()
+    return refs.shallow_commits(gdir) if gdir is not None else set()
+
+
+def __read_anchor():
+    # anchors are only used by shallow clones
+    from gitver.anchor import read_anchor, AnchorError
+
+    try:
+        return read_anchor()
+    except AnchorError as e:
+        raise RepoInfoError(str(e))
+
+
+def describe_shallow(boundary, patterns=None):
+    """
+    Resolves HEAD in a shallow clone, whose history is truncated at the
+    specified boundary commits: the tag git describe finds is trusted as long
+    as the commits since it are all available, and they are counted, else the
+    version anchor, if any, is extended to HEAD.
+
+    Returns the same tuple as describe_head, failures raise a RepoInfoError.
+    """
+    described = describe_head(patterns)
+    if described is not None:
+        tag, count, head = described
+        segment = __segment(head, 'refs/tags/' + tag)
+        if segment is not None and \
+                not any(commit[0] in boundary for commit in segment):
+            return tag, len(segment), head
+
+    head = get_build_id()
+    if not head:
+        return None
+
+    anchor = __read_anchor()
+    if anchor is None:
+        raise RepoInfoError("This is a shallow clone and the commits since "
+                            "the most recent tag aren't all available: fetch "
+                            "the missing history (\"git fetch --unshallow\") "
+                            "or provide a version anchor, see \"gitver "
+                            "anchor\"")
+
+    if head == anchor['commit']:
+        return anchor['tag'], anchor['count'], head
+
+    segment = __segment(head, anchor['commit'])
+    if segment is None or \
+            not any(anchor['commit'] in commit[1:] for commit in segment):
+        raise RepoInfoError("The anchored commit " + anchor['commit'] +
+                            " isn't part of the history of HEAD available in "
+                            "this shallow clone: deepen the clone or update "
+                            "the anchor")
+
+    if any(commit[0] in boundary for commit in segment):
+        raise RepoInfoError("The commits since the anchored commit " +
+                            anchor['commit'] + " aren't all available in "
+                            "this shallow clone: deepen the clone or update "
+                            "the anchor")
+
+    tagged = tagged_commits(patterns)
+    if any(commit[0] in tagged for commit in segment):
+        raise RepoInfoError("A tag more recent than the anchored one is "
+                            "reachable from HEAD, but the commits since it "
+                            "aren't all available in this shallow clone: "
+                            "deepen the clone or update the anchor")
+
+    return anchor['tag'], anchor['count'] + len(segment), head
+
+
+def describe_commits(shas, patterns=None):
+    """
+    Describes the specified commits with as few git invocations as possible,
+    returns a dictionary mapping each of them to a (tag, count) tuple, or to
+    None if no tag, matching the specified patterns, is reachable from it.
+    """
+    shas = list(shas)
+    described = dict()
+    for i in range(0, len(shas), DESCRIBE_BATCH):
+        chunk = shas[i:i + DESCRIBE_BATCH]
+        # --always keeps git from failing on commits with no tags to describe
+        # consumed as a whole, so that git failing halfway is reported
+        lines = list(__git_lines('describe', '--long', '--abbrev=40',
+                                 '--always', *(match_args(patterns) + chunk)))
+        for sha, line in zip(chunk, lines):
+            m = re.match(describe_matcher, line.strip())
+            described[sha] = (m.group('tag'), int(m.group('count'))) \
+                if m is not None else None
+    return described
+
+
+def walk_history(revs, stdin=None, patterns=None):
+    """
+    Walks the history selected by the specified git log arguments just once,
+    parents first, and yields a (commit, described) tuple for each commit,
+    described being the same as in describe_commits.
+
+    Only merges, tagged commits and commits whose parents are outside the
+    walked history are actually described by git, in a few batches: any other
+    commit is just one commit farther from the tag of its parent.
+    """
+    commits = []
+    for line in __git_lines('log', '--reverse', '--topo-order', '--no-color',
+                            '--no-show-signature', '--format=%H%x09%P%x09%D',
+                            *revs, stdin=stdin):
+        sha, parents, decorations = line.rstrip('\n').split('\t')
+        commits.append((sha, parents.split(), 'tag: ' in decorations))
+
+    walked = set(sha for sha, parents, tagged in commits)
+    described = describe_commits(
+        [sha for sha, parents, tagged in commits
+         if tagged or len(parents) != 1 or parents[0] not in walked],
+        patterns)
+
+    for sha, parents, tagged in commits:
+        if sha not in described:
+            parent = described[parents[0]]
+            described[sha] = (parent[0], parent[1] + 1) \
+                if parent is not None else None
+        yield sha, described[sha]
+
+
+def describe_revisions(names, patterns=None):
+    """
+    Describes every specified revision name with a single history walk, and
+    yields a (name, commit, described) tuple for each of them, in order:
+    commit is None if the name doesn't resolve to a commit, described is the
+    same as in describe_commits.
+    """
+    names = list(names)
+    info = __object_info([n + '^{commit}' for n in names])
+    commits = [(n, info[n + '^{commit}'][0]
+                if info[n + '^{commit}'] is not None else None)
+               for n in names]
+
+    # anything reachable from a tag is left out of the walk and described by
+    # git directly, so the walk is bounded by the distance from the tags
+    shas = sorted(set(sha for name, sha in commits if sha is not None))
+    described = dict()
+    if len(shas) > 0:
+        described.update(walk_history(['--not', '--tags', '--stdin'],
+                                      ''.join(sha + '\n' for sha in shas),
+                                      patterns))
+    described.update(describe_commits([sha for sha in shas
+                                       if sha not in described], patterns))
+
+    for name, sha in commits:
+        yield name, sha, described.get(sha)
+
+
+def make_repo_info(tag, count, full_build_id, build_id):
+    """
+    Builds the repository information for a commit, given its most recent
+    reachable tag, returns None if the tag doesn't carry version information.
+    """
+    data = data_from_tag(tag)
+    if data is None:
+        return None
+
+    return {'maj': data['maj'],
+            'min': data['min'],
+            'patch': data['patch'],
+            'rev': data['revision'],
+            'pr': data['prmeta'],
+            'count': count,
+            'full-build-id': full_build_id,
+            'build-id': build_id,
+            'last-tag': tag
+    }
+
+
 def data_from_tag(tag):
     try:
         data = re.match(tag_matcher, tag).groupdict()
@@ -90,68 +569,241 @@ def data_from_tag(tag):
     return data
 
 
+def list_tags(merged=None):
+    """
+    Yields a (name, commit) tuple for each annotated tag pointing to a commit,
+    restricted to the tags reachable from the specified revision, if any,
+    with a single git invocation.
+    """
+    args = ['for-each-ref', '--format=%(refname)%09%(objecttype)%09'
+            '%(*objecttype)%09%(*objectname)']
+    if merged is not None:
+        args.append('--merged=' + merged)
+    args.append('refs/tags')
+
+    for line in __git_lines(*args):
+        fields = line.rstrip('\n').split('\t')
+        if len(fields) != 4:
+            continue
+        ref, objtype, peeled_type, commit = fields
+        # lightweight tags are ignored by git describe as well
+        if objtype == 'tag' and peeled_type == 'commit':
+            yield ref[len('refs/tags/'):], commit
+
+
+def ref_tips():
+    """
+    Returns the set of object names pointed to by every ref in this
+    repository, HEAD included.
+    """
+    try:
+        out = __git_raw('rev-parse', '--all', 'HEAD')
+    except GitError:
+        return None
+
+    return {sha for sha in out.split('\n') if len(sha) > 0}
+
+
+def is_history_rewritten(tips):
+    """
+    Checks whether any of the specified tips is no longer part of the
+    history reachable from the current refs, or doesn't exist anymore.
+    """
+    if len(tips) == 0:
+        return False
+
+    try:
+        out = __git_raw('rev-list', '--stdin', '--max-count=1', '--not',
+                        '--all', stdin='\n'.join(tips) + '\n')
+    except GitError:
+        return True
+
+    return len(out.strip()) > 0
+
+
+def __abbrev_lengths(excluded):
+    """
+    Streams the length of the unique abbreviated hash string of every commit
+    reachable from the current refs, except the ones reachable from the
+    specified excluded tips.
+    """
+    # always feed at least an empty line, the sh backend would otherwise
+    # treat an empty input as no input at all
+    stdin = ''.join('^' + sha + '\n' for sha in excluded) + '\n'
+    for line in __git_lines('rev-list', '--all', '--abbrev=0',
+                            '--abbrev-commit', '--stdin', stdin=stdin):
+        yield len(line.strip())
+
+
+@traced('min_hash_length')
 def min_hash_length():
     """
     Determines the minimum length of an hash string for this repository
     to uniquely describe a commit.
     gitver's minimum length is 7 characters, to avoid frequent hash string
     length variations in fast-growing projects.
+
+    The result is persisted along with the ref tips it has been computed for,
+    so that subsequent runs only need to examine the newly added commits: a
+    full rescan is performed only when history has been rewritten.
     """
-    try:
-        out = __git_raw('rev-list', '--all', '--abbrev=0',
-                        '--abbrev-commit').stdout
-    except ErrorReturnCode:
+    from gitver.storage import KVStore
+    from gitver.defines import hashlen_state_file
+
+    min_accepted = MIN_HASH_LENGTH
+
+    tips = ref_tips()
+    if tips is None:
         return 0
 
-    min_accepted = 7
+    state = KVStore(hashlen_state_file())
+    known_tips = state.get('tips') or set()
+    length = state.get('length') or min_accepted
 
-    # build a set of commit hash lengths
-    commits = {
-        len(commit) for commit in out.split('\n') if len(commit) >= min_accepted
-    }
+    if tips == known_tips:
+        tracer.count('hashlen state hits')
+        return length
+    tracer.count('hashlen state misses')
 
-    if len(commits) > 0:
-        # pick the max
-        return max(commits)
+    if is_history_rewritten(known_tips - tips):
+        known_tips = set()
+        length = min_accepted
 
-    return min_accepted
+    try:
+        for commit_len in __abbrev_lengths(known_tips):
+            length = max(length, commit_len)
+    except GitError:
+        return 0
 
+    state.set('tips', tips).set('length', length).save()
+    return length
 
-def get_repo_info():
+
+class RepoInfoError(Exception):
     """
-    Retrieves raw repository information and returns it for further processing
+    Raised whenever the repository information can't be computed
+    """
+    pass
+
+
+def abbrev_build_id(full_build_id):
+    """
+    Abbreviates the specified build id to the minimum hash string length.
     """
     hashlen = min_hash_length()
     if not hashlen:
-        term.err("Couldn't compute the minimum hash string length")
-        sys.exit(1)
+        raise RepoInfoError("Couldn't compute the minimum hash string length")
 
-    full_build_id = get_build_id()
-    if not full_build_id:
-        term.err("Couldn't retrieve build id information")
-        sys.exit(1)
+    if len(shallow_boundary()) > 0:
+        # only part of the history is available, the anchor has seen it all
+        anchor = __read_anchor()
+        if anchor is not None:
+            hashlen = max(hashlen, anchor['hashlen'])
 
-    tag = last_tag()
-    if not tag:
-        term.err("Couldn't retrieve the latest tag")
-        sys.exit(1)
+    return full_build_id[:hashlen]
 
-    data = data_from_tag(tag)
-    if data is None:
-        term.err("Couldn't retrieve version information from tag \"" + tag +
-                 "\".\ngitver expects tags to be in the format "
-                 "[v]X.Y.Z[.REVISION][-PRE-RELEASE-METADATA]")
-        sys.exit(1)
 
-    vcount = count_tag_to_head(tag)
+def __cache_key(head, patterns, boundary):
+    """
+    Returns the repository information cache key for the specified HEAD, or
+    the current one if None, given the tag patterns and the shallow boundary.
+    """
+    key = repo_cache.key(git_dir(), head)
+    if key is not None:
+        # the most recent tag depends on the tags being considered
+        key += (tuple(patterns or []),)
+        if len(boundary) > 0:
+            # and on the anchor, in a shallow clone
+            from gitver.anchor import anchor_text
+            key += (anchor_text(),)
+    return key
+
+
+@traced('get_repo_info')
+def compute_repo_info(needs_build_id=None, patterns=None):
+    """
+    Same as get_repo_info, but failures raise a RepoInfoError rather than
+    being reported.
+    """
+    if needs_build_id is None:
+        needs_build_id = lambda count: True
+
+    boundary = shallow_boundary()
+    cache_key = __cache_key(__head_hint, patterns, boundary)
+    info = repo_cache.get(cache_key)
+    if info is not None:
+        if info['build-id'] is None and needs_build_id(info['count']):
+            info['build-id'] = abbrev_build_id(info['full-build-id'])
+            repo_cache.put(__cache_key(cache_key[0], patterns, boundary),
+                           info)
+        return info
+
+    described = None
+    previous = repo_cache.previous()
+    if previous is not None and cache_key is not None and \
+            previous[0][1:] == cache_key[1:]:
+        # the tags didn't change: count just the commits added since the
+        # cached HEAD rather than every commit since the tag again
+        prev = previous[1]
+        described = describe_since(prev['full-build-id'], prev['last-tag'],
+                                   prev['count'], cache_key[0], patterns)
+
+    if described is None and len(boundary) > 0:
+        described = describe_shallow(boundary, patterns)
+
+    if described is None:
+        described = describe_head(patterns)
+    if described is not None:
+        tag, vcount, full_build_id = described
+    else:
+        # fall back to the per-field queries, they are slower but will
+        # point out what's really missing
+        full_build_id = get_build_id()
+        if not full_build_id:
+            raise RepoInfoError("Couldn't retrieve build id information")
+
+        tag = last_tag(patterns)
+        if not tag:
+            raise RepoInfoError("Couldn't retrieve the latest tag")
+
+        vcount = None
+
+    if data_from_tag(tag) is None:
+        raise RepoInfoError("Couldn't retrieve version information from tag "
+                            "\"" + tag + "\".\ngitver expects tags to be in "
+                            "the format "
+                            "[v]X.Y.Z[.REVISION][-PRE-RELEASE-METADATA]")
+
+    if vcount is None:
+        vcount = count_tag_to_head(tag)
+
+    info = make_repo_info(tag, vcount, full_build_id, None)
+
+    if needs_build_id(vcount):
+        info['build-id'] = abbrev_build_id(full_build_id)
+
+    if cache_key is not None:
+        # the minimum hash string length may have grown meanwhile
+        cache_key = __cache_key(cache_key[0], patterns, boundary)
+    repo_cache.put(cache_key, info)
+    return info
+
+
+def get_repo_info(needs_build_id=None, patterns=None):
+    """
+    Retrieves raw repository information and returns it for further processing
 
-    return {'maj': data['maj'],
-            'min': data['min'],
-            'patch': data['patch'],
-            'rev': data['revision'],
-            'pr': data['prmeta'],
-            'count': vcount,
-            'full-build-id': full_build_id,
-            'build-id': full_build_id[:hashlen],
-            'last-tag': tag
-    }
+    The result is served from the repository information cache whenever HEAD
+    and the tag refs didn't change since it has been computed.
+
+    If specified, needs_build_id is called with the commit count and tells
+    whether the abbreviated build id is needed at all: if it isn't, its
+    minimum length isn't computed and the "build-id" entry is None.
+
+    Only tags matching the specified glob patterns, if any, are considered.
+    """
+    try:
+        return compute_repo_info(needs_build_id, patterns)
+    except RepoInfoError as e:
+        term.err(str(e))
+        sys.exit(1)
@@ -0,0 +1,168 @@
+#!/usr/bin/env python2
+# coding=utf-8
+
+"""
+Managed git hooks
+
+The post-commit, post-checkout, post-merge and post-rewrite hooks keep the
+templates updated as HEAD moves. Hooks fired while a rebase, cherry-pick,
+revert or bisect is in progress don't run gitver at all: the first one starts
+a single background process waiting for the operation to complete, which then
+updates the templates once, unless the operation ends with a post-rewrite
+hook (i.e. a rebase) updating them right away. The waiter gives up after a
+while, i.e. if a bisect is left running: the hook fired by its end starts a
+new one.
+
+Every hook passes the new HEAD to "gitver update --head", so that it's not
+resolved again.
+"""
+
+import os
+import stat
+import pipes
+from gitver.watch import IN_PROGRESS
+
+MANAGED_HOOKS = ['post-commit', 'post-checkout', 'post-merge', 'post-rewrite']
+
+# identifies the hooks installed by gitver
+MANAGED_MARKER = '# managed by gitver'
+
+# holds the process id of the process waiting for an operation to complete,
+# in the git directory
+WAITER_FILE = 'gitver-hooks.pid'
+
+HOOK_SCRIPT = """#!/bin/sh
+%(marker)s, see "gitver hooks"
+
+git_dir=$(git rev-parse --git-dir) || exit 0
+waiter="$git_dir/%(waiter)s"
+
+in_progress() {
+    for f in %(in_progress)s; do
+        [ -e "$git_dir/$f" ] && return 0
+    done
+    return 1
+}
+
+head=
+case "${0##*/}" in
+post-checkout)
+    # file checkouts don't move HEAD
+    [ "$3" = 1 ] || exit 0
+    head=$2
+    ;;
+post-rewrite)
+    # the last rewritten commit isn't necessarily HEAD, i.e. "exec" may have
+    # committed after it
+    cat > /dev/null
+    # post-commit took care of amended commits already
+    [ "$1" = rebase ] || exit 0
+    ;;
+esac
+
+if [ "${0##*/}" != post-rewrite ] && in_progress; then
+    if ! { [ -f "$waiter" ] && kill -0 "$(cat "$waiter")" 2> /dev/null; }
+    then
+        %(gitver)s hooks wait %(templates)s \
+            < /dev/null > /dev/null 2>&1 &
+        echo $! > "$waiter"
+    fi
+    exit 0
+fi
+
+if [ -f "$waiter" ]; then
+    kill "$(cat "$waiter")" 2> /dev/null
+    rm -f "$waiter"
+fi
+
+[ -n "$head" ] || head=$(git rev-parse -q --verify HEAD)
+exec %(gitver)s update ${head:+--head "$head"} %(templates)s
+"""
+
+
+class HooksError(Exception):
+    """
+    Raised whenever the hooks can't be installed or removed
+    """
+    pass
+
+
+def hook_script(command, templates):
+    """
+    Returns the hook script running the specified gitver command, as a list
+    of arguments, on the specified templates arguments.
+    """
+    return HOOK_SCRIPT % {
+        'marker': MANAGED_MARKER,
+        'gitver': ' '.join(pipes.quote(c) for c in command),
+        'waiter': WAITER_FILE,
+        'in_progress': ' '.join(IN_PROGRESS),
+        'templates': ' '.join(pipes.quote(t) for t in templates)
+    }
+
+
+def is_managed(path):
+    """
+    Checks whether the specified hook has been installed by gitver.
+    """
+    try:
+        with open(path, 'r') as f:
+            return MANAGED_MARKER in f.read(512)
+    except IOError:
+        return False
+
+
+def install_hooks(hooks_dir, command, templates, force=False):
+    """
+    Installs the managed hooks in the specified directory, replacing any
+    previous version of them: other hooks are only replaced if forced to.
+    """
+    paths = [os.path.join(hooks_dir, h) for h in MANAGED_HOOKS]
+    foreign = [p for p in paths if os.path.lexists(p) and not is_managed(p)]
+    if len(foreign) > 0 and not force:
+        raise HooksError("The following hooks exist already and haven't "
+                         "been installed by gitver, use --force to replace "
+                         "them: " + ", ".join(foreign))
+
+    if not os.path.isdir(hooks_dir):
+        os.makedirs(hooks_dir)
+
+    script = hook_script(command, templates)
+    for p in paths:
+        # don't write through symbolic links to hooks tracked elsewhere
+        if os.path.lexists(p):
+            os.unlink(p)
+        with open(p, 'w') as f:
+            f.write(script)
+        os.chmod(p, os.stat(p).st_mode | stat.S_IXUSR | stat.S_IXGRP |
+                 stat.S_IXOTH)
+
+    return paths
+
+
+def uninstall_hooks(hooks_dir):
+    """
+    Removes the managed hooks from the specified directory, returns the
+    paths of the removed ones.
+    """
+    removed = []
+    for h in MANAGED_HOOKS:
+        p = os.path.join(hooks_dir, h)
+        if is_managed(p):
+            os.unlink(p)
+            removed.append(p)
+    return removed
+
+
+def release_waiter(git_dir):
+    """
+    Removes the waiter file, as long as it refers to this process.
+    """
+    path = os.path.join(git_dir, WAITER_FILE)
+    try:
+        with open(path, 'r') as f:
+            if f.read().strip() != str(os.getpid()):
+                return
+        os.unlink(path)
+    except (IOError, OSError):
+        pass
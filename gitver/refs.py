@@ -0,0 +1,329 @@
+#!/usr/bin/env python2
+# coding=utf-8
+
+"""
+Pure-Python, read-only access to the git refs database
+
+These functions never spawn any git process: whenever the repository layout
+can't be understood with certainty (i.e. GIT_DIR is overridden, reftable
+storage, missing objects) None is returned and the caller is expected to fall
+back to the git command.
+"""
+
+import os
+import re
+import hashlib
+
+sha_matcher = r"^[a-fA-F0-9]{40}$"
+
+# refs which are private to each worktree, they live in the worktree's own
+# git directory instead of the common one
+per_worktree_prefixes = ('refs/worktree/', 'refs/bisect/', 'refs/rewritten/')
+
+# maximum depth when following symbolic refs
+max_symref_depth = 5
+
+
+def __read_line(path):
+    """
+    Returns the first line of the specified file, stripped, or None if it
+    can't be read.
+    """
+    try:
+        with open(path, 'r') as fp:
+            return fp.readline().strip()
+    except IOError:
+        return None
+
+
+def __is_sha(text):
+    return text is not None and re.match(sha_matcher, text) is not None
+
+
+def find_git_dir(path):
+    """
+    Walks up from the specified path looking for a git repository and returns
+    a (worktree root, git directory) tuple, or (None, None) if none can be
+    found or the environment overrides git's own discovery.
+    """
+    if 'GIT_DIR' in os.environ or 'GIT_WORK_TREE' in os.environ:
+        return None, None
+
+    path = os.path.realpath(path)
+    while True:
+        candidate = os.path.join(path, '.git')
+        git_dir = None
+
+        if os.path.isdir(candidate):
+            git_dir = candidate
+        elif os.path.isfile(candidate):
+            # worktrees and submodules use a "gitdir: <path>" file
+            line = __read_line(candidate)
+            if line is not None and line.startswith('gitdir:'):
+                git_dir = os.path.join(path, line[len('gitdir:'):].strip())
+
+        if git_dir is not None:
+            if not os.path.isfile(os.path.join(git_dir, 'HEAD')) or \
+                    os.path.isdir(os.path.join(git_dir, 'reftable')):
+                return None, None
+            return path, os.path.normpath(git_dir)
+
+        parent = os.path.dirname(path)
+        if parent == path:
+            return None, None
+        path = parent
+
+
+def common_dir(git_dir):
+    """
+    Returns the directory shared by all the worktrees of the repository the
+    specified git directory belongs to.
+    """
+    line = __read_line(os.path.join(git_dir, 'commondir'))
+    if line:
+        return os.path.normpath(os.path.join(git_dir, line))
+    return git_dir
+
+
+def read_packed_refs(git_dir):
+    """
+    Parses the packed-refs file and returns a dictionary mapping each ref name
+    to a (object name, peeled object name) tuple.
+
+    The peeled object name is the same as the object name for refs not
+    pointing to annotated tags and it's None whenever it can't be determined.
+    """
+    refs = dict()
+    try:
+        fp = open(os.path.join(common_dir(git_dir), 'packed-refs'), 'r')
+    except IOError:
+        return refs
+
+    with fp:
+        traits = []
+        last = None
+        for line in fp:
+            line = line.rstrip('\n')
+            if line.startswith('# pack-refs with:'):
+                traits = line[len('# pack-refs with:'):].split()
+            elif line.startswith('^'):
+                # peeled value for the preceding annotated tag
+                if last is not None:
+                    refs[last] = (refs[last][0], line[1:])
+            elif len(line) > 41:
+                sha, name = line[:40], line[41:]
+                fully_peeled = 'fully-peeled' in traits or \
+                    ('peeled' in traits and name.startswith('refs/tags/'))
+                refs[name] = (sha, sha if fully_peeled else None)
+                last = name
+
+    return refs
+
+
+def read_ref(git_dir, name, depth=0):
+    """
+    Resolves the specified ref name, following symbolic refs, and returns the
+    object name it points to or None.
+    """
+    if depth > max_symref_depth:
+        return None
+
+    if '/' not in name or name.startswith(per_worktree_prefixes):
+        base = git_dir
+    else:
+        base = common_dir(git_dir)
+
+    line = __read_line(os.path.join(base, name))
+    if line is not None:
+        if line.startswith('ref:'):
+            return read_ref(git_dir, line[len('ref:'):].strip(), depth + 1)
+        return line if __is_sha(line) else None
+
+    packed = read_packed_refs(git_dir)
+    if name in packed:
+        return packed[name][0]
+
+    return None
+
+
+def head_ref(git_dir):
+    """
+    Returns the name of the ref HEAD is pointing to, or None if HEAD is
+    detached.
+    """
+    line = __read_line(os.path.join(git_dir, 'HEAD'))
+    if line is not None and line.startswith('ref:'):
+        return line[len('ref:'):].strip()
+    return None
+
+
+def head_sha(git_dir):
+    """
+    Returns the object name HEAD resolves to, or None.
+    """
+    return read_ref(git_dir, 'HEAD')
+
+
+def read_loose_object(git_dir, sha):
+    """
+    Reads a loose object and returns a (type, body) tuple or None if the object
+    isn't stored as a loose one (i.e. it's packed).
+    """
+    import zlib
+
+    path = os.path.join(common_dir(git_dir), 'objects', sha[:2], sha[2:])
+    try:
+        with open(path, 'rb') as fp:
+            raw = zlib.decompress(fp.read())
+    except (IOError, zlib.error):
+        return None
+
+    header, _, body = raw.partition('\0')
+    return header.split(' ')[0], body
+
+
+def peel(git_dir, sha, depth=0):
+    """
+    Peels the specified object name down to a non-tag object by reading loose
+    objects, returns None if that's not possible.
+    """
+    if depth > max_symref_depth:
+        return None
+
+    obj = read_loose_object(git_dir, sha)
+    if obj is None:
+        return None
+
+    otype, body = obj
+    if otype != 'tag':
+        return sha
+
+    for line in body.split('\n'):
+        if line.startswith('object '):
+            return peel(git_dir, line[len('object '):].strip(), depth + 1)
+        if len(line) == 0:
+            break
+
+    return None
+
+
+def read_tags(git_dir):
+    """
+    Returns a dictionary mapping every tag name to a (object name, peeled
+    object name) tuple, the same way read_packed_refs does.
+    """
+    common = common_dir(git_dir)
+    tags = dict()
+
+    for name, value in read_packed_refs(git_dir).items():
+        if name.startswith('refs/tags/'):
+            tags[name[len('refs/tags/'):]] = value
+
+    # loose refs have precedence over packed ones
+    tags_dir = os.path.join(common, 'refs', 'tags')
+    for root, dirs, files in os.walk(tags_dir):
+        for f in files:
+            path = os.path.join(root, f)
+            sha = __read_line(path)
+            if __is_sha(sha):
+                name = os.path.relpath(path, tags_dir).replace(os.sep, '/')
+                tags[name] = (sha, peel(git_dir, sha))
+
+    return tags
+
+
+def tags_at(tags, sha):
+    """
+    Returns the names of the annotated tags pointing to the specified commit
+    from the specified tags dictionary, as returned by read_tags, or None if
+    some tag isn't peeled and the answer would be uncertain.
+    """
+    names = []
+    for name, (tag_sha, peeled) in tags.items():
+        if peeled is None:
+            return None
+        if peeled == sha and tag_sha != sha:
+            names.append(name)
+    return names
+
+
+def shallow_commits(git_dir):
+    """
+    Returns the set of commits the history of a shallow clone is truncated
+    at, an empty one if the repository isn't shallow.
+    """
+    try:
+        with open(os.path.join(common_dir(git_dir), 'shallow'), 'r') as fp:
+            return {line.strip() for line in fp if __is_sha(line.strip())}
+    except IOError:
+        return set()
+
+
+def fingerprint(git_dir):
+    """
+    Returns a cheap fingerprint of the tag refs, computed by only inspecting
+    the file system metadata of the loose tags and the packed-refs file: it
+    changes whenever a tag is added, moved or deleted, or a shallow clone is
+    deepened.
+    """
+    common = common_dir(git_dir)
+    h = hashlib.sha1()
+
+    def add_stat(path):
+        try:
+            st = os.stat(path)
+        except OSError:
+            h.update(path + ':-\n')
+            return
+        h.update("%s:%r:%d:%d\n" % (path, st.st_mtime, st.st_size, st.st_ino))
+
+    add_stat(os.path.join(common, 'packed-refs'))
+    add_stat(os.path.join(common, 'shallow'))
+
+    tags_dir = os.path.join(common, 'refs', 'tags')
+    for root, dirs, files in os.walk(tags_dir):
+        dirs.sort()
+        for f in sorted(files):
+            add_stat(os.path.join(root, f))
+
+    return h.hexdigest()
+
+
+def state_files(git_dir):
+    """
+    Returns the existing files and directories whose changes may change the
+    version information: HEAD, the ref it points to, the packed-refs file, the
+    tag refs directories and the shallow file.
+
+    Refs are always written to a new file which is then renamed, so adding,
+    moving or deleting a loose ref changes the modification time of the
+    directory it lives in: a loose ref which doesn't exist (yet) is then
+    represented by the nearest directory which does.
+    """
+    common = common_dir(git_dir)
+    paths = [os.path.join(git_dir, 'HEAD')]
+
+    if os.path.isdir(os.path.join(common, 'reftable')):
+        # every ref update rewrites the list of tables
+        paths.append(os.path.join(common, 'reftable', 'tables.list'))
+    else:
+        name = head_ref(git_dir)
+        if name is not None:
+            if '/' not in name or name.startswith(per_worktree_prefixes):
+                base = git_dir
+            else:
+                base = common
+            path = os.path.join(base, *name.split('/'))
+            while not os.path.exists(path) and path != base:
+                path = os.path.dirname(path)
+            paths.append(path)
+
+        paths.append(os.path.join(common, 'packed-refs'))
+
+        tags_dir = os.path.join(common, 'refs', 'tags')
+        for root, dirs, files in os.walk(tags_dir):
+            dirs.sort()
+            paths.append(root)
+
+    paths.append(os.path.join(common, 'shallow'))
+    return [p for p in paths if os.path.exists(p)]
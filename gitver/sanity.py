@@ -8,12 +8,19 @@ Implements various sanity checks
 import os
 import sys
 from gitver.termcolors import term, bold
-from gitver.defines import PRJ_ROOT, CFGDIR, CFGDIRNAME, GITIGNOREFILE
+from gitver.defines import prj_root, cfg_dir, gitignore_file, CFGDIRNAME
 
 
 def check_project_root():
     # tries to determine the project's root directory
-    if len(PRJ_ROOT) == 0:
+    if len(prj_root()) == 0:
+        # only bother looking for git when something went wrong
+        from gitver.git import git_version
+        if not 'git version' in git_version():
+            term.err("This program requires \"git\" to be installed and "
+                     "configured.")
+            sys.exit(1)
+
         term.err("Couldn't determine your project's root directory, is this "
                  "a valid git repository?")
         sys.exit(1)
@@ -21,7 +28,7 @@ def check_project_root():
 
 def check_config_dir():
     # checks if configuration directory exists
-    if not os.path.exists(CFGDIR):
+    if not os.path.exists(cfg_dir()):
         term.err("Please run " + bold("gitver init") + " first.")
         sys.exit(1)
 
@@ -29,7 +36,7 @@ def check_config_dir():
 def check_gitignore():
     # checks .gitignore for .gitver inclusion
     try:
-        gifile = os.path.join(GITIGNOREFILE)
+        gifile = os.path.join(gitignore_file())
         with open(gifile, 'r') as f:
             if CFGDIRNAME in f.read():
                 return True
@@ -3,60 +3,231 @@
 
 """
 Represents one of the simplest form of key-value storage to file
+
+Entries are kept in a sqlite database, one row per key, so that reading or
+writing a key doesn't need to load or rewrite the whole store and concurrent
+writers, i.e. parallel CI jobs sharing a checkout, don't lose each other's
+updates. Stores written by older gitver versions as a single pickled dict are
+migrated on first use.
 """
 
-import pickle
+import os
+import fcntl
+import sqlite3
+import cPickle as pickle
+
+# seconds to wait for another process to release its write lock
+LOCK_TIMEOUT = 10.0
+
+SQLITE_HEADER = 'SQLite format 3\0'
+
+# marks a pending removal
+_DELETED = object()
 
 
 class KVStore(object):
+    """
+    Maps string keys to any picklable value: changes are buffered until
+    save() is called.
+    """
     def __init__(self, storage_file):
         self.__file = storage_file
-        self.__data = dict()
+        self.__db = None
+        self.__pending = dict()
         self.load()
 
-    def load(self):
+    def __connect(self, create=False):
+        """
+        Opens the database, unless there's nothing to read from it and create
+        is False: reads don't create the file, only writes do.
+        """
+        if self.__db is None:
+            if not create and not os.path.exists(self.__file):
+                return None
+            try:
+                migrate(self.__file)
+                db = sqlite3.connect(self.__file, timeout=LOCK_TIMEOUT,
+                                     isolation_level=None,
+                                     check_same_thread=False)
+                db.text_factory = str
+            except (sqlite3.Error, IOError, OSError):
+                # i.e. the configuration directory doesn't exist yet
+                return None
+            self.__db = db
+        return self.__db
+
+    def __query(self, sql, *args):
+        db = self.__connect()
+        if db is None:
+            return []
         try:
-            fp = open(self.__file, 'r')
-            self.__data = pickle.load(fp)
-            fp.close()
-        except IOError:
-            pass
+            return db.execute(sql, args).fetchall()
+        except sqlite3.OperationalError:
+            # the file has been created, but nothing has been written yet
+            return []
 
-    def save(self):
-        if self.__data is not None:
+    def __write(self, statements):
+        """
+        Runs the specified (sql, arguments) statements in a single
+        transaction, creating the database if needed: returns True on
+        success.
+        """
+        db = self.__connect(create=True)
+        if db is None:
+            return False
+
+        try:
+            db.execute("BEGIN IMMEDIATE")
             try:
-                fp = open(self.__file, 'w')
-                pickle.dump(self.__data, fp)
-                fp.close()
-            except IOError:
-                return False
+                db.execute("CREATE TABLE IF NOT EXISTS kv "
+                           "(key TEXT PRIMARY KEY, value BLOB NOT NULL)")
+                for sql, args in statements:
+                    db.execute(sql, args)
+                db.execute("COMMIT")
+            except:
+                db.execute("ROLLBACK")
+                raise
+        except sqlite3.Error:
+            return False
+        return True
+
+    def load(self):
+        """
+        Discards any pending change: entries are read on demand.
+        """
+        self.__pending.clear()
 
+    def save(self):
+        """
+        Writes the pending changes in a single transaction, returns True on
+        success.
+        """
+        if len(self.__pending) == 0:
             return True
 
-        return False
+        statements = []
+        for key, value in self.__pending.items():
+            if value is _DELETED:
+                statements.append(("DELETE FROM kv WHERE key = ?", (key,)))
+            else:
+                statements.append(("INSERT OR REPLACE INTO kv VALUES (?, ?)",
+                                   (key, encode(value))))
+        if not self.__write(statements):
+            return False
+
+        self.__pending.clear()
+        return True
+
+    def clear(self):
+        """
+        Removes every entry right away, discarding any pending change: the
+        database is emptied in a transaction rather than deleted, since other
+        processes may have it open. Returns True on success.
+        """
+        self.__pending.clear()
+        if not os.path.exists(self.__file):
+            return True
+        return self.__write([("DELETE FROM kv", ())])
 
     def items(self):
-        return self.__data.items()
+        data = dict((k, decode(v))
+                    for k, v in self.__query("SELECT key, value FROM kv"))
+        for key, value in self.__pending.items():
+            if value is _DELETED:
+                data.pop(key, None)
+            else:
+                data[key] = value
+        return data.items()
 
     def get(self, key):
-        if key in self.__data:
-            return self.__data[key]
+        if key in self.__pending:
+            value = self.__pending[key]
+            return False if value is _DELETED else value
+
+        rows = self.__query("SELECT value FROM kv WHERE key = ?", key)
+        if len(rows) > 0:
+            return decode(rows[0][0])
         return False
 
     def set(self, key, value):
-        self.__data[key] = value
+        self.__pending[key] = value
         return self
 
     def rm(self, key):
-        if key in self.__data:
-            del self.__data[key]
+        self.__pending[key] = _DELETED
         return self
 
     def has(self, key):
-        return key in self.__data
+        if key in self.__pending:
+            return self.__pending[key] is not _DELETED
+        return len(self.__query("SELECT 1 FROM kv WHERE key = ?", key)) > 0
 
     def empty(self):
         return self.count() == 0
 
     def count(self):
-        return len(self.__data)
+        return len(self.items())
+
+
+def encode(obj):
+    return sqlite3.Binary(pickle.dumps(obj, pickle.HIGHEST_PROTOCOL))
+
+
+def decode(blob):
+    return pickle.loads(str(blob))
+
+
+def migrate(storage_file):
+    """
+    Converts a store written by older gitver versions, a pickled dict, to the
+    current format: the conversion happens under an exclusive lock and the old
+    file is atomically replaced, so it's safe against concurrent processes.
+    """
+    try:
+        fp = open(storage_file, 'rb')
+    except IOError:
+        return
+
+    with fp:
+        if is_current(fp):
+            return
+
+        fcntl.flock(fp.fileno(), fcntl.LOCK_EX)
+
+        # someone else may have migrated it while waiting for the lock
+        try:
+            if os.stat(storage_file).st_ino != os.fstat(fp.fileno()).st_ino:
+                return
+        except OSError:
+            return
+
+        fp.seek(0)
+        try:
+            data = dict(pickle.load(fp))
+        except Exception:
+            # unreadable, there's nothing to preserve
+            data = dict()
+
+        tmp = storage_file + '.migrating.' + str(os.getpid())
+        if os.path.exists(tmp):
+            os.unlink(tmp)
+        db = sqlite3.connect(tmp)
+        try:
+            db.execute("CREATE TABLE kv "
+                       "(key TEXT PRIMARY KEY, value BLOB NOT NULL)")
+            db.executemany("INSERT INTO kv VALUES (?, ?)",
+                           [(k, encode(v)) for k, v in data.items()])
+            db.commit()
+        finally:
+            db.close()
+
+        os.rename(tmp, storage_file)
+
+
+def is_current(fp):
+    """
+    Checks whether the specified store file is either empty or a sqlite
+    database.
+    """
+    header = fp.read(len(SQLITE_HEADER))
+    return len(header) == 0 or header == SQLITE_HEADER
@@ -0,0 +1,126 @@
+#!/usr/bin/env python2
+# coding=utf-8
+
+"""
+Persistent index of the version tags
+
+Every annotated tag is listed with a single git invocation and parsed once,
+the result being stored in gitver's configuration directory until the tag
+refs change: queries such as "the most recent 1.x release" are then answered
+without parsing or sorting the tags again.
+"""
+
+import re
+from gitver import refs
+from gitver.storage import KVStore
+from gitver.defines import tag_index_file
+from gitver.cache import repo_cache
+from gitver.trace import tracer
+from gitver.git import git_dir, list_tags, data_from_tag, tag_matches
+
+# a release series, i.e. "1", "1.x" or "v1.2"
+series_matcher = r"v?(\d+(?:\.\d+)*)(?:\.[xX*])?$"
+
+
+class SeriesError(Exception):
+    """
+    Raised whenever a release series is not valid
+    """
+    pass
+
+
+def sort_key(data):
+    """
+    Returns the key ordering the version numbers parsed by data_from_tag:
+    pre-releases come before the release they precede.
+    """
+    rev = data['revision']
+    pr = data['prmeta']
+    return (int(data['maj']), int(data['min']), int(data['patch']),
+            -1 if rev is None else int(rev), 1 if pr is None else 0,
+            pr or '')
+
+
+def parse_series(series):
+    """
+    Returns the version numbers prefix selected by the specified release
+    series, as a tuple of integers.
+    """
+    m = re.match(series_matcher, series.strip())
+    if m is None:
+        raise SeriesError("Invalid release series \"" + series + "\", use "
+                          "i.e. \"1\", \"1.x\" or \"1.2\"")
+    return tuple(int(n) for n in m.group(1).split('.'))
+
+
+class TagIndex(object):
+    """
+    The version tags matching the specified glob patterns, sorted from the
+    most recent version to the oldest one.
+    """
+    def __init__(self, patterns=None):
+        self.__patterns = patterns
+        self.__entries = None
+
+    def __build(self):
+        """
+        Lists and parses every annotated tag, returns a list of (sort key,
+        name, commit) tuples sorted by descending version.
+        """
+        entries = []
+        for name, commit in list_tags():
+            data = data_from_tag(name)
+            if data is not None:
+                entries.append((sort_key(data), name, commit))
+        entries.sort(reverse=True)
+        return entries
+
+    def __load(self):
+        if self.__entries is not None:
+            return self.__entries
+
+        gdir = git_dir()
+        stamp = refs.fingerprint(gdir) if gdir is not None else None
+        if stamp is None or not repo_cache.is_enabled():
+            self.__entries = self.__build()
+            return self.__entries
+
+        store = KVStore(tag_index_file())
+        stored = store.get('index')
+        if stored and stored[0] == stamp:
+            tracer.count('tag index hits')
+            self.__entries = stored[1]
+        else:
+            tracer.count('tag index misses')
+            self.__entries = self.__build()
+            store.set('index', (stamp, self.__entries)).save()
+        return self.__entries
+
+    def __selected(self, series):
+        prefix = parse_series(series) if series else ()
+        return [(key, name, commit) for key, name, commit in self.__load()
+                if key[:len(prefix)] == prefix and
+                tag_matches(name, self.__patterns)]
+
+    def tags(self, series=None):
+        """
+        Returns the names of the version tags belonging to the specified
+        release series, if any, most recent version first.
+        """
+        return [name for key, name, commit in self.__selected(series)]
+
+    def reachable(self, series=None, rev='HEAD'):
+        """
+        Same as tags, but only the tags reachable from the specified revision
+        are returned.
+        """
+        merged = set(name for name, commit in list_tags(rev))
+        return [name for name in self.tags(series) if name in merged]
+
+    def latest(self, series=None, rev='HEAD'):
+        """
+        Returns the name of the most recent version tag of the specified
+        release series reachable from the specified revision, or None.
+        """
+        tags = self.reachable(series, rev)
+        return tags[0] if len(tags) > 0 else None
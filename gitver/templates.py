@@ -0,0 +1,366 @@
+#!/usr/bin/env python2
+# coding=utf-8
+
+"""
+Template loading, compilation and rendering
+
+Templates are compiled once into an index stored in gitver's configuration
+directory: the compiled form holds the output path, the placeholders
+positions and the set of referenced variables, keyed by the template's size,
+modification time and inode, so rendering is a simple splice. Big templates
+are never loaded as a whole, they are copied in chunks to their destination.
+"""
+
+import os
+import fnmatch
+import itertools
+import threading
+from string import Template
+from cStringIO import StringIO
+
+from gitver.storage import KVStore
+from gitver.defines import cfg_dir, prj_root
+from gitver.trace import tracer
+
+# placeholder variables available to templates, see build_keywords
+KEYWORDS = ['CURRENT_VERSION', 'MAJOR', 'MINOR', 'PATCH', 'REV', 'REV_PREFIX',
+            'BUILD_ID', 'FULL_BUILD_ID', 'COMMIT_COUNT', 'COMMIT_COUNT_STR',
+            'COMMIT_COUNT_PREFIX', 'META_PR', 'META_PR_PREFIX']
+
+# templates are read, scanned and copied in chunks of this size
+CHUNK_SIZE = 64 * 1024
+
+# longest placeholder that may straddle two chunks, anything longer would
+# be an unknown key anyway
+MAX_PLACEHOLDER = 256
+
+# templates bigger than this are rendered straight to their destination
+# instead of in memory
+STREAM_THRESHOLD = 4 * 1024 * 1024
+
+
+class TemplateError(Exception):
+    """
+    Raised whenever a template can't be loaded or rendered
+    """
+    pass
+
+
+def template_dir():
+    """
+    Returns the path of the templates directory.
+    """
+    return os.path.join(cfg_dir(), 'templates')
+
+
+def template_path(name):
+    """
+    Constructs and returns the absolute path for the specified template file
+    name.
+    """
+    return os.path.join(template_dir(), name)
+
+
+def template_cache_file():
+    return os.path.join(cfg_dir(), ".template_cache")
+
+
+def list_templates():
+    """
+    Returns the sorted names of the available templates.
+    """
+    if not os.path.isdir(template_dir()):
+        return []
+    return sorted(f for f in os.listdir(template_dir())
+                  if os.path.isfile(template_path(f)))
+
+
+def resolve_templates(names, all_templates=False):
+    """
+    Expands the specified template names, which may contain shell-style
+    wildcards or be space-separated lists of names, into the list of template
+    names to process, in order and without duplicates.
+    """
+    if all_templates:
+        return list_templates()
+
+    resolved = []
+    for name in ' '.join(names).split():
+        if any(c in name for c in '*?['):
+            matches = fnmatch.filter(list_templates(), name)
+            if len(matches) == 0:
+                raise TemplateError("No templates matching \"" + name +
+                                    "\" found")
+        else:
+            matches = [name]
+
+        resolved.extend(m for m in matches if m not in resolved)
+
+    return resolved
+
+
+def output_path(compiled):
+    """
+    Returns the absolute output path of the specified compiled template,
+    relative paths are resolved to the project's root.
+    """
+    output = compiled['output']
+    if not os.path.isabs(output):
+        output = os.path.join(prj_root(), output)
+    return output
+
+
+def scan_placeholders(chunks):
+    """
+    Scans a template body, supplied as an iterable of chunks, and yields a
+    (start, end, variable) tuple for each placeholder found, positions being
+    relative to the beginning of the body.
+
+    Only the unprocessed tail of the previous chunk is retained, so that a
+    placeholder straddling two chunks is still recognized.
+    """
+    carry = ''
+    base = 0
+    lines = 0
+    chunks = iter(chunks)
+    eof = False
+    while not eof:
+        chunk = next(chunks, '')
+        eof = len(chunk) == 0
+        buf = carry + chunk
+
+        # stop before a trailing run of '$' which may start a placeholder
+        # continuing in the next chunk
+        cut = len(buf)
+        if not eof:
+            k = buf.rfind('$', max(0, cut - MAX_PLACEHOLDER))
+            if k >= 0:
+                while k > 0 and buf[k - 1] == '$':
+                    k -= 1
+                cut = k
+
+        for m in Template.pattern.finditer(buf, 0, cut):
+            if m.group('invalid') is not None:
+                raise TemplateError("Invalid placeholder found at line " +
+                                    str(lines + buf.count('\n', 0, m.start())
+                                        + 2) + ", aborting.")
+
+            var = m.group('named') or m.group('braced')
+            if var is not None and var not in KEYWORDS:
+                raise TemplateError("Unknown key \"" + var + "\" found, "
+                                    "aborting.")
+
+            # escaped placeholders ($$) have no variable and render as '$'
+            yield base + m.start(), base + m.end(), var
+
+        lines += buf.count('\n', 0, cut)
+        base += cut
+        carry = buf[cut:]
+
+
+def compile_template(name, fp):
+    """
+    Compiles the template read from the specified file object, in chunks:
+    the first line is the output path, placeholder positions are relative to
+    the beginning of the body.
+    """
+    header = fp.readline()
+    first = fp.read(CHUNK_SIZE)
+    if not header.endswith('\n') or len(first) == 0:
+        raise TemplateError("The template \"" + name + "\" is not valid, "
+                            "aborting.")
+
+    if not header.startswith('#'):
+        raise TemplateError("The template \"" + name + "\" doesn't define "
+                            "any valid output, aborting.")
+
+    chunks = itertools.chain([first], iter(lambda: fp.read(CHUNK_SIZE), ''))
+    placeholders = list(scan_placeholders(chunks))
+
+    return {'output': header[:-1].strip(' #'),
+            'offset': len(header),
+            'placeholders': placeholders,
+            'variables': set(v for s, e, v in placeholders if v is not None)}
+
+
+def splice(body, placeholders, keywords):
+    """
+    Substitutes the placeholders found at the specified positions in body.
+    """
+    parts = []
+    pos = 0
+    for start, end, var in placeholders:
+        parts.append(body[pos:start])
+        parts.append('$' if var is None else '%s' % (keywords[var],))
+        pos = end
+    parts.append(body[pos:])
+    return ''.join(parts)
+
+
+def splice_stream(src, out, placeholders, keywords):
+    """
+    Same as splice, but the body is copied from the src file object, which
+    must be positioned at the beginning of the body, to the out one in
+    bounded-size chunks. Returns the number of bytes written.
+    """
+    def copy(size):
+        while size > 0:
+            chunk = src.read(min(size, CHUNK_SIZE))
+            if len(chunk) == 0:
+                raise TemplateError("The template changed while rendering")
+            out.write(chunk)
+            size -= len(chunk)
+
+    written = 0
+    pos = 0
+    for start, end, var in placeholders:
+        copy(start - pos)
+        src.read(end - start)
+        value = '$' if var is None else '%s' % (keywords[var],)
+        out.write(value)
+        written += start - pos + len(value)
+        pos = end
+
+    for chunk in iter(lambda: src.read(CHUNK_SIZE), ''):
+        out.write(chunk)
+        written += len(chunk)
+
+    return written
+
+
+class TemplateIndex(object):
+    """
+    Persistent index of compiled templates, it can be shared by multiple
+    threads: call save() to persist any newly compiled template.
+    """
+    def __init__(self):
+        self.__store = KVStore(template_cache_file())
+        self.__lock = threading.Lock()
+        self.__dirty = False
+
+    def __lookup(self, name, st, fp=None):
+        stamp = (st.st_size, st.st_mtime, st.st_ino)
+        with self.__lock:
+            cached = self.__store.get(name)
+        if cached and cached['stamp'] == stamp:
+            tracer.count('template cache hits')
+            return cached
+        tracer.count('template cache misses')
+
+        if fp is None:
+            with open(template_path(name), 'rb') as fp:
+                compiled = compile_template(name, fp)
+        else:
+            compiled = compile_template(name, fp)
+
+        compiled['stamp'] = stamp
+        with self.__lock:
+            self.__store.set(name, compiled)
+            self.__dirty = True
+        return compiled
+
+    def get(self, name):
+        """
+        Returns the compiled form of the specified template, reading the
+        template only if it changed since it was last compiled.
+        """
+        try:
+            return self.__lookup(name, os.stat(template_path(name)))
+        except (IOError, OSError):
+            raise TemplateError("Couldn't find the \"" + name + "\" template")
+
+    def load(self, name):
+        """
+        Reads the specified template and returns a (compiled form, contents)
+        tuple.
+        """
+        try:
+            with open(template_path(name), 'rb') as fp:
+                data = fp.read()
+                st = os.fstat(fp.fileno())
+        except (IOError, OSError):
+            raise TemplateError("Couldn't find the \"" + name + "\" template")
+
+        return self.__lookup(name, st, StringIO(data)), data
+
+    def open(self, name):
+        """
+        Opens the specified template and returns a (compiled form, file
+        object) tuple, the file being positioned at the beginning of the body.
+        """
+        try:
+            fp = open(template_path(name), 'rb')
+        except (IOError, OSError):
+            raise TemplateError("Couldn't find the \"" + name + "\" template")
+
+        try:
+            compiled = self.__lookup(name, os.fstat(fp.fileno()), fp)
+            fp.seek(compiled['offset'])
+        except:
+            fp.close()
+            raise
+        return compiled, fp
+
+    def save(self):
+        """
+        Persists the index, if anything changed.
+        """
+        with self.__lock:
+            if self.__dirty:
+                # drop templates which don't exist anymore
+                available = set(list_templates())
+                for name, _ in self.__store.items():
+                    if name not in available:
+                        self.__store.rm(name)
+                self.__store.save()
+                self.__dirty = False
+
+
+def render_template(name, keywords, index=None):
+    """
+    Renders the specified template with the specified placeholder variables
+    and returns an (output path, rendered text) tuple.
+    """
+    own_index = index is None
+    if own_index:
+        index = TemplateIndex()
+
+    compiled, data = index.load(name)
+
+    if own_index:
+        index.save()
+
+    body = data[compiled['offset']:]
+    return output_path(compiled), splice(body, compiled['placeholders'],
+                                         keywords)
+
+
+def is_large_template(name):
+    """
+    Checks whether the specified template should be rendered by streaming.
+    """
+    try:
+        return os.path.getsize(template_path(name)) > STREAM_THRESHOLD
+    except OSError:
+        return False
+
+
+def stream_template(name, keywords, out, index=None):
+    """
+    Renders the specified template to the out file object, reading and
+    writing in chunks so that memory usage doesn't depend on the template
+    size. Returns an (output path, bytes written) tuple.
+    """
+    own_index = index is None
+    if own_index:
+        index = TemplateIndex()
+
+    compiled, fp = index.open(name)
+    try:
+        if own_index:
+            index.save()
+        written = splice_stream(fp, out, compiled['placeholders'], keywords)
+    finally:
+        fp.close()
+
+    return output_path(compiled), written
@@ -0,0 +1,181 @@
+#!/usr/bin/env python2
+# coding=utf-8
+
+"""
+Timings and git invocations instrumentation
+
+When enabled, every git invocation is recorded along with its wall time, the
+bytes it output and its exit status, as well as the time spent in the main
+phases of a run, the cache hit/miss counters and the peak memory usage. The
+report is printed to the stderr as a table ("--timings" flag) and/or appended
+as a single JSON line to the file specified by the GITVER_TRACE environment
+variable, so that reports from many machines can be aggregated.
+
+Instrumentation costs nothing but a flag check while disabled.
+"""
+
+import os
+import sys
+import time
+import atexit
+import threading
+from functools import wraps
+from contextlib import contextmanager
+
+TRACE_ENV = 'GITVER_TRACE'
+
+
+class Tracer(object):
+    """
+    Collects the measurements of a single gitver run.
+    """
+    def __init__(self):
+        self.enabled = False
+        self.__lock = threading.Lock()
+        self.__started = None
+        self.__depth = threading.local()
+        self.__git = []
+        self.__phases = []
+        self.__counters = dict()
+
+    def enable(self, table=False, trace_file=None):
+        """
+        Starts recording: the report is written on exit, as a table to the
+        stderr and/or as JSON to the specified file.
+        """
+        if self.enabled:
+            return
+        self.enabled = True
+        self.__started = time.time()
+        atexit.register(self.__write, table, trace_file)
+
+    def git(self, args, elapsed, size, status):
+        """
+        Records a git invocation.
+        """
+        with self.__lock:
+            self.__git.append({'args': list(args), 'elapsed': elapsed,
+                               'bytes': size, 'status': status})
+
+    def count(self, counter):
+        """
+        Increments the specified counter, i.e. a cache hit or miss.
+        """
+        if self.enabled:
+            with self.__lock:
+                self.__counters[counter] = \
+                    self.__counters.get(counter, 0) + 1
+
+    @contextmanager
+    def phase(self, name):
+        """
+        Measures the wall time of the enclosed block, nested phases are
+        reported as such.
+        """
+        if not self.enabled:
+            yield
+            return
+
+        depth = getattr(self.__depth, 'value', 0)
+        self.__depth.value = depth + 1
+        started = time.time()
+        try:
+            yield
+        finally:
+            self.__depth.value = depth
+            with self.__lock:
+                self.__phases.append({'name': name, 'depth': depth,
+                                      'started': started - self.__started,
+                                      'elapsed': time.time() - started})
+
+    def report(self):
+        """
+        Returns the measurements collected so far as a dictionary.
+        """
+        with self.__lock:
+            return {
+                'argv': sys.argv[1:],
+                'cwd': os.getcwd(),
+                'started': self.__started,
+                'elapsed': time.time() - self.__started,
+                'git': list(self.__git),
+                'phases': sorted(self.__phases, key=lambda p: p['started']),
+                'counters': dict(self.__counters),
+                'peak_rss_kib': peak_rss()
+            }
+
+    def __write(self, table, trace_file):
+        report = self.report()
+
+        if table:
+            sys.stderr.write(format_report(report))
+
+        if trace_file:
+            import json
+            try:
+                with open(trace_file, 'a') as f:
+                    f.write(json.dumps(report, sort_keys=True) + '\n')
+            except IOError as e:
+                sys.stderr.write("WARNING: Couldn't write the trace to \"" +
+                                 trace_file + "\": " + str(e) + '\n')
+
+
+def peak_rss():
+    """
+    Returns the peak resident set size of this process, in KiB.
+    """
+    import resource
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def __ms(seconds):
+    return "%9.1f ms" % (seconds * 1000.0)
+
+
+def format_report(report):
+    """
+    Formats the specified report as a human-readable table.
+    """
+    git_time = sum(g['elapsed'] for g in report['git'])
+    lines = ["gitver timings: " + __ms(report['elapsed']).strip() +
+             " total, peak RSS " + str(report['peak_rss_kib']) + " KiB",
+             "",
+             "  phases:"]
+    for p in report['phases']:
+        lines.append("    " + __ms(p['elapsed']) + "  " + "  " * p['depth'] +
+                     p['name'])
+
+    lines.extend(["",
+                  "  git invocations: " + str(len(report['git'])) + ", " +
+                  __ms(git_time).strip(),
+                  "    %12s %10s %6s  %s" % ("time", "bytes", "status",
+                                             "arguments")])
+    for g in report['git']:
+        status = '-' if g['status'] is None else str(g['status'])
+        lines.append("    " + __ms(g['elapsed']) + " %10d %6s  %s" %
+                     (g['bytes'], status, ' '.join(g['args'])))
+
+    if len(report['counters']) > 0:
+        lines.extend(["", "  counters:"])
+        for name, value in sorted(report['counters'].items()):
+            lines.append("    %-28s %d" % (name, value))
+
+    return '\n'.join(lines) + '\n'
+
+
+tracer = Tracer()
+
+
+def traced(name):
+    """
+    Decorates a function so that each of its calls is measured as a phase.
+    """
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            if not tracer.enabled:
+                return func(*args, **kwargs)
+            with tracer.phase(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
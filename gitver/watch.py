@@ -0,0 +1,257 @@
+#!/usr/bin/env python2
+# coding=utf-8
+
+"""
+Watches the repository HEAD and refs for changes
+
+Changes are detected via inotify where available (Linux), by polling the file
+system metadata otherwise.
+"""
+
+import os
+import time
+import errno
+import struct
+import select
+import ctypes
+import ctypes.util
+
+from gitver import refs
+
+# inotify event masks, from <sys/inotify.h>
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+
+WATCH_MASK = IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | \
+    IN_MOVED_TO | IN_CREATE | IN_DELETE | IN_DELETE_SELF
+
+# struct inotify_event header: wd, mask, cookie, len
+EVENT_HEADER = 'iIII'
+EVENT_HEADER_SIZE = struct.calcsize(EVENT_HEADER)
+
+# files in the git directories whose changes are relevant, anything else
+# (i.e. the index) is ignored
+WATCHED_FILES = ['HEAD', 'packed-refs']
+
+# files and directories denoting a multi-step operation in progress
+IN_PROGRESS = ['rebase-merge', 'rebase-apply', 'sequencer', 'CHERRY_PICK_HEAD',
+               'REVERT_HEAD', 'MERGE_HEAD', 'BISECT_LOG']
+
+
+def operation_in_progress(git_dir):
+    """
+    Checks whether a rebase, cherry-pick, revert, merge or bisect operation is
+    currently in progress.
+    """
+    return any(os.path.exists(os.path.join(git_dir, p)) for p in IN_PROGRESS)
+
+
+def wait_operation(git_dir, interval=0.5, timeout=None):
+    """
+    Waits for the multi-step operation in progress, if any, to complete, for
+    at most the specified number of seconds: returns False if it's still in
+    progress.
+    """
+    deadline = time.time() + timeout if timeout is not None else None
+    while operation_in_progress(git_dir):
+        if deadline is not None and time.time() >= deadline:
+            return False
+        time.sleep(interval)
+    return True
+
+
+class PollingWatcher(object):
+    """
+    Detects changes by periodically comparing the file system metadata of
+    HEAD, packed-refs and every loose ref.
+    """
+    def __init__(self, git_dir, interval=1.0):
+        self.__git_dir = git_dir
+        self.__interval = interval
+        self.__last = self.__snapshot()
+
+    def __snapshot(self):
+        common = refs.common_dir(self.__git_dir)
+        paths = [os.path.join(self.__git_dir, 'HEAD'),
+                 os.path.join(common, 'packed-refs')]
+        for root, dirs, files in os.walk(os.path.join(common, 'refs')):
+            paths.extend(os.path.join(root, f) for f in files)
+
+        snapshot = dict()
+        for p in paths:
+            try:
+                st = os.stat(p)
+                snapshot[p] = (st.st_mtime, st.st_size, st.st_ino)
+            except OSError:
+                pass
+        return snapshot
+
+    def wait(self, timeout=None):
+        """
+        Waits for changes up to the specified number of seconds (forever if
+        None), returns True if anything changed.
+        """
+        deadline = None if timeout is None else time.time() + timeout
+        while True:
+            current = self.__snapshot()
+            if current != self.__last:
+                self.__last = current
+                return True
+
+            if deadline is not None and time.time() >= deadline:
+                return False
+
+            delay = self.__interval
+            if deadline is not None:
+                delay = max(0, min(delay, deadline - time.time()))
+            time.sleep(delay)
+
+    def close(self):
+        pass
+
+
+class InotifyWatcher(object):
+    """
+    Detects changes via the Linux inotify API, accessed through ctypes.
+    """
+    def __init__(self, git_dir):
+        libc_name = ctypes.util.find_library('c')
+        if libc_name is None:
+            raise OSError(errno.ENOSYS, "libc not found")
+
+        self.__libc = ctypes.CDLL(libc_name, use_errno=True)
+        if not hasattr(self.__libc, 'inotify_init'):
+            raise OSError(errno.ENOSYS, "inotify is not available")
+
+        self.__fd = self.__libc.inotify_init()
+        if self.__fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init failed")
+
+        self.__git_dir = git_dir
+        self.__common = refs.common_dir(git_dir)
+        self.__refs_dirs = dict()
+        self.__top_dirs = dict()
+
+        for d in set([git_dir, self.__common]):
+            self.__top_dirs[self.__add_watch(d)] = d
+        self.__watch_refs()
+
+    def __add_watch(self, path):
+        wd = self.__libc.inotify_add_watch(self.__fd, path, WATCH_MASK)
+        if wd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_add_watch failed", path)
+        return wd
+
+    def __watch_refs(self, rescan=False):
+        """
+        Watches every directory in the refs hierarchy, directories created
+        later on are picked up whenever this is called again: when rescanning,
+        directories already watched are added again, since they may have been
+        replaced without notice (i.e. the event queue overflowed).
+        """
+        if rescan:
+            self.__refs_dirs.clear()
+        watched = set(self.__refs_dirs.values())
+        for root, dirs, files in os.walk(os.path.join(self.__common, 'refs')):
+            if root not in watched:
+                try:
+                    self.__refs_dirs[self.__add_watch(root)] = root
+                except OSError:
+                    # vanished in the meantime
+                    pass
+
+    def __read_events(self):
+        """
+        Reads the pending events and returns True if any of them is relevant.
+        """
+        data = os.read(self.__fd, 65536)
+        relevant = False
+        new_dirs = False
+        overflow = False
+        offset = 0
+        while offset + EVENT_HEADER_SIZE <= len(data):
+            wd, mask, cookie, length = struct.unpack_from(EVENT_HEADER, data,
+                                                          offset)
+            name = data[offset + EVENT_HEADER_SIZE:
+                        offset + EVENT_HEADER_SIZE + length].rstrip('\0')
+            offset += EVENT_HEADER_SIZE + length
+
+            if mask & IN_Q_OVERFLOW:
+                # events have been lost, anything may have changed
+                relevant = overflow = True
+            elif wd in self.__refs_dirs:
+                relevant = True
+                new_dirs = new_dirs or bool(mask & IN_ISDIR)
+                if mask & (IN_IGNORED | IN_DELETE_SELF):
+                    # deleted (i.e. pruned by git pack-refs), watched again
+                    # if it's created anew
+                    del self.__refs_dirs[wd]
+            elif wd in self.__top_dirs and name in WATCHED_FILES:
+                relevant = True
+
+        if overflow:
+            self.__watch_refs(rescan=True)
+        elif new_dirs:
+            self.__watch_refs()
+
+        return relevant
+
+    def wait(self, timeout=None):
+        """
+        Waits for changes up to the specified number of seconds (forever if
+        None), returns True if anything changed.
+        """
+        deadline = None if timeout is None else time.time() + timeout
+        while True:
+            remaining = None
+            if deadline is not None:
+                remaining = max(0, deadline - time.time())
+
+            ready, _, _ = select.select([self.__fd], [], [], remaining)
+            if len(ready) == 0:
+                return False
+
+            if self.__read_events():
+                return True
+
+    def close(self):
+        os.close(self.__fd)
+
+
+def create_watcher(git_dir, polling=False):
+    """
+    Creates an inotify-based watcher if possible, a polling one otherwise.
+    """
+    if not polling:
+        try:
+            return InotifyWatcher(git_dir)
+        except (OSError, AttributeError):
+            pass
+    return PollingWatcher(git_dir)
+
+
+def watch(git_dir, on_change, settle=0.5, polling=False):
+    """
+    Invokes on_change whenever HEAD or the refs change, coalescing bursts of
+    changes (i.e. a rebase rewriting many commits) into a single invocation:
+    on_change is called only once no change has been seen for the specified
+    number of seconds and no multi-step operation is in progress.
+    """
+    watcher = create_watcher(git_dir, polling)
+    try:
+        while True:
+            watcher.wait()
+            while watcher.wait(settle) or operation_in_progress(git_dir):
+                pass
+            on_change()
+    finally:
+        watcher.close()
@@ -0,0 +1,96 @@
+#!/usr/bin/env python2
+# coding=utf-8
+
+"""
+Computes the version information of many repositories at once
+
+Repositories are processed by a pool of worker processes: each worker moves
+to the repository it's been handed, so that its own configuration and NEXT
+store are used, and any failure only affects that repository.
+"""
+
+import os
+import sys
+import signal
+import multiprocessing
+from cStringIO import StringIO
+
+from gitver.backends import get_backend, GitError
+from gitver.defines import set_work_dir
+
+
+def __init_worker():
+    # interruptions are handled by the parent process only
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+
+def repo_version(path):
+    """
+    Computes the repository information and the version string of the
+    repository at the specified path, this runs in a worker process.
+
+    Returns a dictionary with "ok" set to False and an "error" message on
+    failure.
+    """
+    from gitver.sanity import check_project_root, check_config_dir
+    from gitver.config import load_user_config
+    from gitver.commands import load_repo_info, load_next_custom, \
+        build_version_string
+
+    result = {'path': path, 'ok': False}
+
+    # errors are reported via the stderr before exiting, collect them
+    stderr = sys.stderr
+    sys.stderr = captured = StringIO()
+    try:
+        set_work_dir(path)
+        check_project_root()
+        check_config_dir()
+
+        cfg = load_user_config()
+        repo_info = load_repo_info(cfg)
+        next_custom = load_next_custom(repo_info)
+
+        result['repo_info'] = repo_info
+        result['next'] = next_custom
+        result['version'] = build_version_string(cfg, repo_info, False,
+                                                 next_custom)
+        result['ok'] = True
+    except SystemExit:
+        result['error'] = captured.getvalue().replace("ERROR: ", "").strip()
+    except (GitError, IOError, OSError) as e:
+        result['error'] = str(e)
+    except Exception as e:
+        # i.e. a corrupted store: only this repository is affected
+        result['error'] = "Unexpected error processing \"" + path + \
+                          "\": " + (str(e) or type(e).__name__)
+    finally:
+        sys.stderr = stderr
+        # git co-processes are bound to the repository they've been started in
+        get_backend().close()
+
+    return result
+
+
+def repo_versions(paths, jobs=None):
+    """
+    Computes the version information of every repository at the specified
+    paths on a pool of the specified number of processes (one per CPU by
+    default), yielding each result as soon as it's available: the order is
+    unspecified.
+    """
+    paths = [os.path.abspath(p) for p in paths]
+    if len(paths) == 0:
+        return
+
+    jobs = jobs or multiprocessing.cpu_count()
+    pool = multiprocessing.Pool(min(jobs, len(paths)), __init_worker)
+    try:
+        for result in pool.imap_unordered(repo_version, paths):
+            yield result
+        pool.close()
+    except:
+        pool.terminate()
+        raise
+    finally:
+        pool.join()
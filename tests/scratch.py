@@ -0,0 +1,131 @@
+#!/usr/bin/env python2
+# coding=utf-8
+
+"""
+Scratch git repositories for the tests
+
+Each repository lives in its own temporary directory, commits are created
+with a fixed identity and an increasing date, so that tests don't depend on
+the user's git configuration.
+"""
+
+import os
+import sys
+import shutil
+import tempfile
+import subprocess
+
+GITVER = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'bin',
+                      'gitver')
+
+
+class ScratchRepo(object):
+    """
+    A throwaway git repository, remove it with close().
+    """
+    def __init__(self):
+        self.path = os.path.realpath(tempfile.mkdtemp(prefix='gitver-test-'))
+        self.git_dir = os.path.join(self.path, '.git')
+        self.__time = 1500000000
+        self.git('init', '-q')
+        self.git('symbolic-ref', 'HEAD', 'refs/heads/master')
+        self.git('config', 'commit.gpgsign', 'false')
+        self.git('config', 'tag.gpgsign', 'false')
+
+    def __env(self):
+        env = dict(os.environ)
+        for k in ['GIT_DIR', 'GIT_WORK_TREE', 'GIT_INDEX_FILE']:
+            env.pop(k, None)
+        date = str(self.__time) + ' +0000'
+        env.update({'GIT_AUTHOR_NAME': 'gitver',
+                    'GIT_COMMITTER_NAME': 'gitver',
+                    'GIT_AUTHOR_EMAIL': 'gitver@localhost',
+                    'GIT_COMMITTER_EMAIL': 'gitver@localhost',
+                    'GIT_AUTHOR_DATE': date, 'GIT_COMMITTER_DATE': date,
+                    'GIT_CONFIG_NOSYSTEM': '1'})
+        return env
+
+    def git(self, *args, **kwargs):
+        """
+        Runs git in the repository and returns its stripped output, data can
+        be fed to git via the "stdin" keyword argument.
+        """
+        stdin = kwargs.get('stdin')
+        p = subprocess.Popen(['git'] + list(args), cwd=self.path,
+                             env=self.__env(), stdout=subprocess.PIPE,
+                             stderr=subprocess.PIPE,
+                             stdin=subprocess.PIPE if stdin else None)
+        out, err = p.communicate(stdin)
+        if p.returncode != 0:
+            raise RuntimeError("git " + ' '.join(args) + " failed: " + err)
+        return out.strip()
+
+    def gitver(self, *args, **kwargs):
+        """
+        Runs gitver in the repository and returns its (exit status, stdout,
+        stderr) tuple, the "env" keyword argument adds environment variables.
+        """
+        env = self.__env()
+        env.update(kwargs.get('env', {}))
+        p = subprocess.Popen([sys.executable, GITVER] + list(args),
+                             cwd=self.path, env=env,
+                             stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        out, err = p.communicate()
+        return p.returncode, out, err
+
+    def commit(self, message='commit'):
+        """
+        Creates an empty commit and returns its object name.
+        """
+        self.__time += 60
+        self.git('commit', '-q', '--allow-empty', '-m', message)
+        return self.head()
+
+    def commits(self, count):
+        return [self.commit('commit ' + str(i)) for i in range(count)]
+
+    def import_commits(self, count):
+        """
+        Appends the specified number of empty commits to the current branch
+        with a single git fast-import run, far quicker than committing them
+        one at a time.
+        """
+        branch = self.git('symbolic-ref', 'HEAD')
+        stream = []
+        for i in range(count):
+            self.__time += 60
+            message = 'imported ' + str(i)
+            stream.append('commit ' + branch + '\n'
+                          'committer gitver <gitver@localhost> ' +
+                          str(self.__time) + ' +0000\n'
+                          'data ' + str(len(message)) + '\n' + message + '\n')
+            if i == 0:
+                stream.append('from ' + self.head() + '\n')
+        self.git('fast-import', '--quiet', stdin=''.join(stream))
+        self.git('reset', '-q', '--hard')
+        return self.head()
+
+    def tag(self, name, annotated=True, rev='HEAD'):
+        if annotated:
+            self.git('tag', '-a', '-m', name, name, rev)
+        else:
+            self.git('tag', name, rev)
+
+    def head(self):
+        return self.git('rev-parse', 'HEAD')
+
+    def rev_parse(self, rev):
+        return self.git('rev-parse', rev)
+
+    def describe(self, rev='HEAD', match=None):
+        """
+        Returns the (tag, count, object name) tuple git describe finds.
+        """
+        args = ['describe', '--long', '--abbrev=40', rev]
+        if match is not None:
+            args.extend(['--match', match])
+        tag, count, sha = self.git(*args).rsplit('-', 2)
+        return tag, int(count), sha[1:]
+
+    def close(self):
+        shutil.rmtree(self.path, ignore_errors=True)
@@ -0,0 +1,115 @@
+#!/usr/bin/env python2
+# coding=utf-8
+
+"""
+Tests for the in-process API and its errors
+"""
+
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+from cStringIO import StringIO
+
+from scratch import ScratchRepo
+from gitver.api import Repository, GitverError, RepositoryError, \
+    ConfigError, VersionError, TemplateError
+from gitver.storage import KVStore
+
+
+class RepositoryTest(unittest.TestCase):
+    def setUp(self):
+        self.repo = ScratchRepo()
+        self.repo.commit()
+        self.repo.tag('v1.2.3')
+        self.repo.commits(2)
+        self.repo.gitver('init')
+        self.cfg_dir = os.path.join(self.repo.path, '.gitver')
+
+        # nothing must be printed
+        self.saved = sys.stdout, sys.stderr
+        sys.stdout, sys.stderr = StringIO(), StringIO()
+
+    def tearDown(self):
+        printed = sys.stdout.getvalue() + sys.stderr.getvalue()
+        sys.stdout, sys.stderr = self.saved
+        self.repo.close()
+        self.assertEqual(printed, '')
+
+    def api(self, path=None):
+        repo = Repository(path or self.repo.path)
+        self.addCleanup(repo.close)
+        return repo
+
+    def write(self, name, text):
+        with open(os.path.join(self.cfg_dir, name), 'w') as f:
+            f.write(text)
+
+    def test_version(self):
+        cwd = os.getcwd()
+        repo = self.api(os.path.join(self.cfg_dir, 'templates'))
+        build_id = self.repo.head()[:7]
+        self.assertEqual(repo.root, self.repo.path)
+        self.assertEqual(repo.version(), '1.2.3-NEXT.2+' + build_id)
+        self.assertEqual(repo.version(promote=True), '')
+        self.assertEqual(repo.repo_info()['last-tag'], 'v1.2.3')
+        self.assertEqual(repo.variables()['build_id'], build_id)
+        self.assertEqual(os.getcwd(), cwd)
+
+        self.write('templates/version', '#version.txt\n$MAJOR.$MINOR\n')
+        self.assertEqual(repo.render_template('version'),
+                         (os.path.join(self.repo.path, 'version.txt'),
+                          '1.2\n'))
+
+    def test_refreshed(self):
+        repo = self.api()
+        self.assertEqual(repo.repo_info()['count'], 2)
+        self.repo.commit()
+        self.assertEqual(repo.repo_info()['count'], 3)
+        self.repo.tag('v1.3.0')
+        self.assertEqual(repo.version(), '1.3.0')
+
+    def test_not_a_repository(self):
+        path = tempfile.mkdtemp(prefix='gitver-test-')
+        try:
+            with self.assertRaises(RepositoryError) as e:
+                self.api(path).version()
+            self.assertIn(path, str(e.exception))
+        finally:
+            shutil.rmtree(path)
+
+        with self.assertRaises(RepositoryError):
+            Repository(self.repo.path, backend='unknown')
+
+    def test_no_tags(self):
+        self.repo.git('tag', '-d', 'v1.2.3')
+        self.assertRaises(VersionError, self.api().version)
+
+    def test_invalid_next(self):
+        KVStore(os.path.join(self.cfg_dir, '.next_store')) \
+            .set('v1.2.3', 'not a version').save()
+        with self.assertRaises(VersionError) as e:
+            self.api().version()
+        self.assertIn('not a version', str(e.exception))
+
+    def test_invalid_config(self):
+        self.write('config', '{"format": ')
+        self.assertRaises(ConfigError, self.api().version)
+        self.write('config', '{"tag_match": 5}')
+        self.assertRaises(ConfigError, self.api().config)
+
+    def test_template(self):
+        repo = self.api()
+        self.assertRaises(TemplateError, repo.render_template, 'missing')
+        self.write('templates/broken', '#missing/broken.txt\n${MAJOR\n')
+        self.assertRaises(TemplateError, repo.render_template, 'broken')
+
+    def test_hierarchy(self):
+        for error in [RepositoryError, ConfigError, VersionError,
+                      TemplateError]:
+            self.assertTrue(issubclass(error, GitverError))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,117 @@
+#!/usr/bin/env python2
+# coding=utf-8
+
+"""
+Tests for the git backends
+"""
+
+import os
+import unittest
+
+from scratch import ScratchRepo
+from gitver.backends import create_backend, backends, GitError, \
+    SubprocessBackend, CatFileBackend
+
+
+class RecordingBackend(SubprocessBackend):
+    """
+    Keeps track of the git processes it spawns.
+    """
+    def __init__(self, cwd=None):
+        super(RecordingBackend, self).__init__(cwd)
+        self.procs = []
+
+    def _spawn(self, *args, **kwargs):
+        p = super(RecordingBackend, self)._spawn(*args, **kwargs)
+        self.procs.append(p)
+        return p
+
+
+class BackendsTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.repo = ScratchRepo()
+        cls.commits = cls.repo.commits(3)
+        cls.repo.tag('v1.0.0')
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.repo.close()
+
+    def backend(self, name):
+        backend = create_backend(name, self.repo.path)
+        self.addCleanup(backend.close)
+        return backend
+
+    def test_selection(self):
+        self.assertIsInstance(create_backend('subprocess'), SubprocessBackend)
+        self.assertRaises(GitError, create_backend, 'unknown')
+
+        saved = os.environ.get('GITVER_BACKEND')
+        os.environ['GITVER_BACKEND'] = 'subprocess'
+        try:
+            self.assertIs(type(create_backend()), SubprocessBackend)
+        finally:
+            if saved is None:
+                del os.environ['GITVER_BACKEND']
+            else:
+                os.environ['GITVER_BACKEND'] = saved
+
+        self.assertIs(type(create_backend('cat-file')), CatFileBackend)
+
+    def test_same_results(self):
+        # every backend answers the same way
+        stdin = '^' + self.commits[0] + '\n'
+        head = (self.commits[-1], 'commit',
+                int(self.repo.git('cat-file', '-s', 'HEAD')))
+        for name in sorted(backends.keys()):
+            backend = self.backend(name)
+            self.assertEqual(backend.run(['rev-parse', 'HEAD']).strip(),
+                             self.commits[-1], name)
+            self.assertEqual(
+                list(backend.lines(['rev-list', '--stdin', 'HEAD'], stdin)),
+                [c + '\n' for c in reversed(self.commits[1:])], name)
+            self.assertEqual(
+                backend.object_info(['v1.0.0^{}', 'HEAD', 'missing']),
+                {'v1.0.0^{}': head, 'HEAD': head, 'missing': None}, name)
+
+    def test_errors(self):
+        for name in sorted(backends.keys()):
+            backend = self.backend(name)
+            with self.assertRaises(GitError) as run:
+                backend.run(['rev-parse', '--verify', 'nothing'])
+            self.assertEqual(run.exception.status, 128, name)
+
+            with self.assertRaises(GitError) as lines:
+                list(backend.lines(['log', 'nothing']))
+            self.assertEqual(lines.exception.status, 128, name)
+
+        with self.assertRaises(GitError) as lines:
+            list(self.backend('subprocess').lines(['log', 'nothing']))
+        self.assertIn('nothing', str(lines.exception))
+
+    def test_reaped(self):
+        # git is killed and waited for when the output isn't fully consumed
+        backend = RecordingBackend(self.repo.path)
+        lines = backend.lines(['log', '--format=%H', '--stdin'],
+                              'HEAD\n' * 20000)
+        self.assertEqual(next(lines), self.commits[-1] + '\n')
+        lines.close()
+        self.assertIsNotNone(backend.procs[0].returncode)
+
+    def test_big_stderr(self):
+        # a flood on the stderr doesn't block git
+        names = ''.join('nothing' + str(i) + '\n' for i in range(20000))
+        with self.assertRaises(GitError):
+            list(self.backend('subprocess').lines(['rev-list', '--stdin'],
+                                                  names))
+
+    def test_coprocess_restarted(self):
+        backend = self.backend('cat-file')
+        self.assertIsNotNone(backend.object_info(['HEAD'])['HEAD'])
+        backend.close()
+        self.assertIsNotNone(backend.object_info(['HEAD'])['HEAD'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,82 @@
+#!/usr/bin/env python2
+# coding=utf-8
+
+"""
+Tests for the persistent repository information cache
+"""
+
+import os
+import unittest
+
+from scratch import ScratchRepo
+from gitver import git
+from gitver.backends import create_backend
+from gitver.cache import repo_cache
+from gitver.defines import repository
+from gitver.storage import KVStore
+
+
+class RepoInfoCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.repo = ScratchRepo()
+        os.mkdir(os.path.join(self.repo.path, '.gitver'))
+        self.repo.commits(2)
+        self.repo.tag('v1.0.0')
+        self.repo.commits(3)
+
+    def tearDown(self):
+        self.repo.close()
+
+    def call(self, func, *args):
+        with repository(self.repo.path, create_backend(cwd=self.repo.path)):
+            return func(*args)
+
+    def store(self, name):
+        return KVStore(os.path.join(self.repo.path, '.gitver', name))
+
+    def misses(self):
+        return self.store('.repo_cache').get('misses') or 0
+
+    def test_hit(self):
+        info = self.call(git.compute_repo_info)
+        self.assertEqual((info['last-tag'], info['count']), ('v1.0.0', 3))
+        self.assertEqual(info['build-id'], self.repo.head()[:7])
+
+        self.assertEqual(self.call(git.compute_repo_info), info)
+        self.assertEqual(self.misses(), 1)
+
+    def test_head_moved(self):
+        self.call(git.compute_repo_info)
+        self.repo.commit()
+        info = self.call(git.compute_repo_info)
+        self.assertEqual(info['count'], 4)
+        self.assertEqual(info['full-build-id'], self.repo.head())
+        self.assertEqual(self.misses(), 2)
+
+    def test_tag_added(self):
+        self.call(git.compute_repo_info)
+        self.repo.tag('v1.1.0')
+        info = self.call(git.compute_repo_info)
+        self.assertEqual((info['last-tag'], info['count']), ('v1.1.0', 0))
+
+    def test_hash_length_grown(self):
+        # a build id cached before the minimum length grew isn't served
+        self.call(git.compute_repo_info)
+        self.store('.hashlen_state').set('length', 9).save()
+
+        info = self.call(git.compute_repo_info)
+        self.assertEqual(info['build-id'], self.repo.head()[:9])
+        self.assertEqual(self.call(git.compute_repo_info), info)
+        self.assertEqual(self.misses(), 2)
+
+    def test_disabled(self):
+        repo_cache.enable(False)
+        try:
+            self.call(git.compute_repo_info)
+        finally:
+            repo_cache.enable(True)
+        self.assertEqual(self.misses(), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
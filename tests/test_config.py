@@ -0,0 +1,47 @@
+#!/usr/bin/env python2
+# coding=utf-8
+
+"""
+Tests for the validation of the format strings
+"""
+
+import unittest
+
+from gitver.config import format_variables, FormatError
+
+
+class FormatVariablesTest(unittest.TestCase):
+    def test_variables(self):
+        self.assertEqual(
+            format_variables("%(maj)s.%(min)s.%(patch)s%(rev_prefix)s%(rev)s"
+                             "%(meta_pr_prefix)s%(meta_pr)s"),
+            {'maj', 'min', 'patch', 'rev_prefix', 'rev', 'meta_pr_prefix',
+             'meta_pr'})
+        self.assertEqual(format_variables("100%% %(build_id)s"),
+                         {'build_id'})
+        self.assertEqual(format_variables("static"), set())
+
+    def test_numeric(self):
+        self.assertEqual(format_variables("%(maj)d.%(min)02d.%(patch)x"),
+                         {'maj', 'min', 'patch'})
+        self.assertEqual(format_variables("%(maj)5.1f %(min)r"),
+                         {'maj', 'min'})
+
+    def test_numeric_empty(self):
+        for fmt in ["%(rev)d", "%(build_id)x", "%(commit_count)d"]:
+            self.assertRaises(FormatError, format_variables, fmt)
+
+    def test_numeric_counted(self):
+        self.assertEqual(format_variables("%(commit_count)04d", counted=True),
+                         {'commit_count'})
+        self.assertRaises(FormatError, format_variables, "%(rev)d",
+                          counted=True)
+
+    def test_invalid(self):
+        for fmt in ["%(maj)c", "%(maj)", "%(maj)q", "%d", "%s",
+                    "%(maj)*d", "%(unknown)s"]:
+            self.assertRaises(FormatError, format_variables, fmt)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,107 @@
+#!/usr/bin/env python2
+# coding=utf-8
+
+"""
+Tests for the resident daemon and its protocol
+"""
+
+import os
+import threading
+import unittest
+
+from scratch import ScratchRepo
+from gitver import daemon, defines, git
+from gitver.backends import create_backend
+
+
+class DaemonTest(unittest.TestCase):
+    def setUp(self):
+        self.repo = ScratchRepo()
+        os.mkdir(os.path.join(self.repo.path, '.gitver'))
+        self.first = self.repo.commit()
+        self.repo.tag('v1.0.0')
+        self.middle = self.repo.commits(2)[0]
+
+        # the daemon thread uses the repository as well
+        self.context = defines.repository(self.repo.path,
+                                          create_backend(cwd=self.repo.path))
+        self.context.__enter__()
+
+        self.server = daemon.Server(daemon.socket_path())
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.context.__exit__(None, None, None)
+        self.repo.close()
+
+    def write_config(self, text):
+        with open(os.path.join(self.repo.path, '.gitver', 'config'), 'w') as f:
+            f.write(text)
+
+    def test_repo_info(self):
+        self.assertTrue(daemon.is_running())
+        info = daemon.query_repo_info()
+        self.assertEqual(info, git.compute_repo_info())
+        self.assertEqual((info['last-tag'], info['count']), ('v1.0.0', 2))
+        self.assertTrue(all(type(v) is not unicode for v in info.values()))
+
+    def test_commands(self):
+        self.assertEqual(daemon.query({'cmd': 'current'}),
+                         {'ok': True,
+                          'out': '1.0.0-NEXT.2+' + self.repo.head()[:7]})
+
+        info = daemon.query({'cmd': 'info'})['info']
+        self.assertEqual(info['repo_info']['full-build-id'],
+                         self.repo.head())
+
+    def test_head(self):
+        head = self.repo.head()
+        self.assertEqual(daemon.query_repo_info(head)['full-build-id'], head)
+
+        self.assertEqual(daemon.query_repo_info(self.first)['count'], 0)
+        info = daemon.query_repo_info(self.middle)
+        self.assertEqual((info['full-build-id'], info['count']),
+                         (self.middle, 1))
+
+        # a HEAD the daemon can't answer for is computed in-process instead
+        side = self.repo.git('commit-tree', '-p', self.first, '-m', 'side',
+                             self.first + '^{tree}')
+        self.assertIsNone(daemon.query_repo_info(side))
+
+        self.assertFalse(daemon.query({'cmd': 'repo_info', 'head': 'x'})['ok'])
+
+    def test_non_ascii(self):
+        self.repo.tag('v1.1.0-\xc3\xa9t\xc3\xa9'.replace('-', ''))
+        info = daemon.query_repo_info()
+        self.assertEqual(info['last-tag'], 'v1.1.0\xc3\xa9t\xc3\xa9')
+        self.assertIs(type(info['last-tag']), str)
+
+        response = daemon.query({'cmd': 'render', 'template': u'caf\xe9'})
+        self.assertFalse(response['ok'])
+        self.assertIn('caf\xc3\xa9', daemon.utf8(response['error']))
+
+    def test_errors(self):
+        # failures are answered, the daemon keeps serving
+        self.write_config('{"format": ')
+        response = daemon.query({'cmd': 'current'})
+        self.assertFalse(response['ok'])
+        self.assertIsNone(daemon.query_repo_info())
+
+        self.write_config('{}')
+        self.repo.git('tag', '-d', 'v1.0.0')
+        response = daemon.query({'cmd': 'current'})
+        self.assertFalse(response['ok'])
+        self.assertIn('tag', response['error'])
+
+        self.assertEqual(daemon.query({'cmd': 'nothing'})['error'],
+                         'Unknown command "nothing"')
+        self.assertEqual(daemon.query(['not', 'a', 'request'])['ok'], False)
+        self.assertEqual(daemon.query({'cmd': 'ping'}), {'ok': True})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,104 @@
+#!/usr/bin/env python2
+# coding=utf-8
+
+"""
+Tests for the Make/Ninja dependency files
+"""
+
+import os
+import sys
+import unittest
+import subprocess
+
+from scratch import ScratchRepo, GITVER
+from gitver.depfile import escape, format_depfile
+
+MAKEFILE = """stamp:
+\t%s %s update version --depfile out.d --stamp stamp
+-include out.d
+"""
+
+
+class DepfileTest(unittest.TestCase):
+    def test_escape(self):
+        self.assertEqual(escape('/repo/.git/HEAD'), '/repo/.git/HEAD')
+        self.assertEqual(escape('my repo/a b'), 'my\\ repo/a\\ b')
+        self.assertEqual(escape('c#1'), 'c\\#1')
+        self.assertEqual(escape('$HOME'), '$$HOME')
+        self.assertEqual(escape('a\\ b'), 'a\\\\\\ b')
+
+    def test_format(self):
+        self.assertEqual(
+            format_depfile(['version stamp'], ['.git/HEAD', 'tpl #1']),
+            "version\\ stamp: \\\n"
+            "  .git/HEAD \\\n"
+            "  tpl\\ \\#1\n"
+            "\n"
+            ".git/HEAD:\n"
+            "\n"
+            "tpl\\ \\#1:\n")
+
+
+class DependenciesTest(unittest.TestCase):
+    def setUp(self):
+        self.repo = ScratchRepo()
+        self.repo.commit()
+        self.repo.tag('v1.0.0')
+        self.repo.commit()
+        self.repo.gitver('init')
+        self.write('.gitignore', '.gitver\n')
+        self.write('.gitver/templates/version',
+                   '#version.txt\n$COMMIT_COUNT\n')
+        self.write('Makefile', MAKEFILE % (sys.executable, GITVER))
+
+    def tearDown(self):
+        self.repo.close()
+
+    def write(self, name, text):
+        with open(os.path.join(self.repo.path, name), 'w') as f:
+            f.write(text)
+
+    def make(self, *args):
+        try:
+            with open(os.devnull, 'w') as null:
+                return subprocess.call(['make', '-s'] + list(args),
+                                       cwd=self.repo.path, stdout=null,
+                                       stderr=null)
+        except OSError:
+            self.skipTest("make is not available")
+
+    def up_to_date(self):
+        return self.make('-q', 'stamp') == 0
+
+    def test_dependencies(self):
+        self.assertEqual(self.make(), 0)
+        with open(os.path.join(self.repo.path, 'out.d'), 'r') as f:
+            deps = [l.strip(' \\\n') for l in f if l.startswith('  ')]
+        self.assertEqual(
+            [os.path.relpath(d, self.repo.path) for d in deps],
+            ['.git/HEAD', '.git/refs/heads/master', '.git/refs/tags',
+             '.gitver/config', '.gitver/.hashlen_state', '.gitver/templates',
+             '.gitver/templates/version'])
+
+    def test_rebuilt(self):
+        self.assertEqual(self.make(), 0)
+        self.assertTrue(self.up_to_date())
+
+        self.repo.commit()
+        self.assertFalse(self.up_to_date())
+        self.assertEqual(self.make(), 0)
+        self.assertTrue(self.up_to_date())
+        with open(os.path.join(self.repo.path, 'version.txt'), 'r') as f:
+            self.assertEqual(f.read(), '2\n')
+
+    def test_hash_length(self):
+        # another run noticed a new branch, the hash length may have grown
+        self.assertEqual(self.make(), 0)
+        self.repo.git('branch', 'side', 'HEAD~1')
+        self.assertTrue(self.up_to_date())
+        self.repo.gitver('--no-cache', 'current')
+        self.assertFalse(self.up_to_date())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,131 @@
+#!/usr/bin/env python2
+# coding=utf-8
+
+"""
+Tests for the machine-readable emitters and "gitver current" custom formats
+"""
+
+import os
+import json
+import shutil
+import tempfile
+import unittest
+import subprocess
+
+from scratch import ScratchRepo
+from gitver.emitters import emitters
+
+# values needing some quoting, for every consumer
+TRICKY = 'a "quoted" $(value) with \'single\' quotes, # and \\ too'
+
+VARIABLES = {'version': '1.0.0', 'tricky': TRICKY, 'next': None}
+FORMATS = [('short', '1.0')]
+
+
+def run(args, stdin=None):
+    try:
+        p = subprocess.Popen(args, stdin=subprocess.PIPE,
+                             stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    except OSError:
+        raise unittest.SkipTest(args[0] + " is not available")
+    out, err = p.communicate(stdin)
+    if p.returncode != 0:
+        raise RuntimeError(' '.join(args) + " failed: " + err)
+    return out
+
+
+class EmittersTest(unittest.TestCase):
+    def emit(self, name):
+        return emitters[name](VARIABLES, FORMATS)
+
+    def test_json(self):
+        self.assertEqual(json.loads(self.emit('json')),
+                         {'version': '1.0.0', 'tricky': TRICKY, 'next': None,
+                          'formats': {'short': '1.0'}})
+
+    def test_env(self):
+        out = run(['sh', '-c', self.emit('env') + '\nprintf "%s|%s|%s|%s" '
+                   '"$GITVER_VERSION" "$GITVER_TRICKY" "$GITVER_NEXT" '
+                   '"$GITVER_SHORT"'])
+        self.assertEqual(out, '1.0.0|' + TRICKY + '||1.0')
+
+    def test_make(self):
+        makefile = self.emit('make') + '\n' \
+            '$(info $(GITVER_VERSION)|$(GITVER_TRICKY)|$(GITVER_SHORT))\n' \
+            'all:\n\t@:\n'
+        self.assertEqual(run(['make', '-s', '-f', '-'], makefile),
+                         '1.0.0|' + TRICKY + '|1.0\n')
+
+    def test_cmake(self):
+        path = tempfile.mkdtemp(prefix='gitver-test-')
+        try:
+            script = os.path.join(path, 'version.cmake')
+            with open(script, 'w') as f:
+                f.write(self.emit('cmake') + '\n'
+                        'message("${GITVER_VERSION}|${GITVER_TRICKY}|'
+                        '${GITVER_NEXT}|${GITVER_SHORT}")\n')
+            # message() prints to the stderr
+            out, err = subprocess.Popen(['cmake', '-P', script],
+                                        stdout=subprocess.PIPE,
+                                        stderr=subprocess.PIPE).communicate()
+        except OSError:
+            self.skipTest("cmake is not available")
+        finally:
+            shutil.rmtree(path, ignore_errors=True)
+        self.assertEqual(err, '1.0.0|' + TRICKY + '||1.0\n')
+
+
+class CurrentTest(unittest.TestCase):
+    def setUp(self):
+        self.repo = ScratchRepo()
+        self.repo.commit()
+        self.repo.tag('v1.2.3')
+        self.repo.commits(2)
+        self.repo.gitver('init')
+        with open(os.path.join(self.repo.path, '.gitignore'), 'w') as f:
+            f.write('.gitver\n')
+
+    def tearDown(self):
+        self.repo.close()
+
+    def current(self, *args):
+        status, out, err = self.repo.gitver('current', *args)
+        self.assertEqual(status, 0, err)
+        return out
+
+    def test_json(self):
+        version = self.current().strip()
+        data = json.loads(self.current('--json', '--format',
+                                       'short=%(maj)s.%(min)s'))
+        self.assertEqual(data['version'], version)
+        self.assertEqual(data['last_tag'], 'v1.2.3')
+        self.assertEqual(data['build_id_full'], self.repo.head())
+        self.assertEqual((data['maj'], data['min'], data['patch']),
+                         ('1', '2', '3'))
+        self.assertEqual(data['formats'], {'short': '1.2'})
+        self.assertEqual((data['next'], data['promoted']), (None, ''))
+
+        self.repo.gitver('next', '1.3.0')
+        data = json.loads(self.current('--json'))
+        self.assertEqual((data['next'], data['promoted']), ('1.3.0', '1.3.0'))
+        self.assertEqual(data['version'], self.current().strip())
+        self.assertEqual(data['formats'], {})
+
+    def test_env(self):
+        out = run(['sh', '-c', self.current('--env') +
+                   'printf "%s %s" "$GITVER_VERSION" "$GITVER_BUILD_ID"'])
+        self.assertEqual(out, self.current().strip() + ' ' +
+                         self.repo.head()[:7])
+
+    def test_formats(self):
+        self.assertEqual(self.current('--format', 'short=%(maj)s.%(min)s',
+                                      '--format', '%(build_id_full)s'),
+                         '1.2\n' + self.repo.head() + '\n')
+
+        status, out, err = self.repo.gitver('current', '--format', '%(nope)s')
+        self.assertEqual((status, out), (1, ''))
+        self.assertIn('Invalid format string', err)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,235 @@
+#!/usr/bin/env python2
+# coding=utf-8
+
+"""
+Tests for the git support library, checked against git itself
+"""
+
+import os
+import unittest
+
+from scratch import ScratchRepo
+from gitver import git
+from gitver.backends import create_backend
+from gitver.defines import repository
+from gitver.storage import KVStore
+
+
+class GitTestCase(unittest.TestCase):
+    def setUp(self):
+        self.repo = ScratchRepo()
+        os.mkdir(os.path.join(self.repo.path, '.gitver'))
+
+    def tearDown(self):
+        self.repo.close()
+
+    def call(self, func, *args, **kwargs):
+        """
+        Calls the specified function on the scratch repository.
+        """
+        with repository(self.repo.path, create_backend(cwd=self.repo.path)):
+            return func(*args, **kwargs)
+
+
+class MinHashLengthTest(GitTestCase):
+    def setUp(self):
+        super(MinHashLengthTest, self).setUp()
+        self.repo.commit()
+
+        # a few hundred commits are enough for 4 characters to be ambiguous
+        self.saved = git.MIN_HASH_LENGTH
+        git.MIN_HASH_LENGTH = 4
+
+    def tearDown(self):
+        git.MIN_HASH_LENGTH = self.saved
+        super(MinHashLengthTest, self).tearDown()
+
+    def expected(self):
+        out = self.repo.git('rev-list', '--all', '--abbrev=0',
+                            '--abbrev-commit')
+        return max([git.MIN_HASH_LENGTH] + [len(l) for l in out.split()])
+
+    def state(self):
+        return KVStore(os.path.join(self.repo.path, '.gitver',
+                                    '.hashlen_state'))
+
+    def test_growth(self):
+        self.assertEqual(self.call(git.min_hash_length), 4)
+        for count in [400, 600]:
+            self.repo.import_commits(count)
+            self.assertEqual(self.call(git.min_hash_length), self.expected())
+
+        self.assertGreater(self.call(git.min_hash_length), 4)
+        self.assertEqual(self.state().get('tips'), {self.repo.head()})
+
+    def test_incremental(self):
+        # only the new commits are examined, the persisted length stays
+        self.call(git.min_hash_length)
+        self.state().set('length', 9).save()
+        self.repo.commits(2)
+        self.assertEqual(self.call(git.min_hash_length), 9)
+
+    def test_unchanged(self):
+        self.call(git.min_hash_length)
+        self.state().set('length', 9).save()
+        self.assertEqual(self.call(git.min_hash_length), 9)
+
+    def test_rewritten(self):
+        self.repo.import_commits(1000)
+        self.assertGreater(self.call(git.min_hash_length), 4)
+
+        # i.e. a force-push, the dropped commits are then pruned
+        self.repo.git('reset', '-q', '--hard', 'HEAD~999')
+        self.repo.git('reflog', 'expire', '--expire=now', '--all')
+        self.repo.git('gc', '-q', '--prune=now')
+        self.repo.commit()
+        self.assertEqual(self.call(git.min_hash_length), self.expected())
+        self.assertEqual(self.call(git.min_hash_length), 4)
+
+    def test_rewritten_state(self):
+        # a length persisted for tips that are gone isn't trusted anymore
+        self.call(git.min_hash_length)
+        self.state().set('length', 9).save()
+        self.repo.git('commit', '-q', '--amend', '--allow-empty', '-m', 'x')
+        self.repo.git('reflog', 'expire', '--expire=now', '--all')
+        self.assertEqual(self.call(git.min_hash_length), 4)
+
+
+class HistoryTest(GitTestCase):
+    def setUp(self):
+        super(HistoryTest, self).setUp()
+        # master:   A - v1.0.0 - B ----------- M1 - E - M2 - F
+        #                         \           /         /
+        # feature:                 C - D (rc) -         /
+        # orphan:                        G (no tag) ----
+        repo = self.repo
+        repo.commit('A')
+        repo.tag('v1.0.0')
+        repo.commit('B')
+        repo.git('checkout', '-q', '-b', 'feature')
+        repo.commit('C')
+        repo.tag('light', annotated=False)
+        repo.commit('D')
+        repo.tag('v1.1.0-rc1')
+        repo.git('checkout', '-q', 'master')
+        repo.commits(2)
+        repo.git('merge', '-q', '--no-ff', '-m', 'M1', 'feature')
+        repo.commit('E')
+        repo.tag('other-1')
+        orphan = repo.git('commit-tree', '-m', 'G', 'HEAD^{tree}')
+        repo.git('merge', '-q', '--allow-unrelated-histories', '-m', 'M2',
+                 orphan)
+        repo.commit('F')
+        self.orphan = orphan
+
+    def expected(self, sha, match=None):
+        try:
+            tag, count, _ = self.repo.describe(sha, match)
+        except RuntimeError:
+            return None
+        return tag, count
+
+    def history(self, func, *args, **kwargs):
+        # the generators have to be consumed in the repository
+        return self.call(lambda: list(func(*args, **kwargs)))
+
+    def shas(self, *revs):
+        return self.repo.git('rev-list', *revs).split()
+
+    def test_walk(self):
+        for patterns in [None, ['v*'], ['v1.0.*']]:
+            described = dict(self.history(git.walk_history, ['--all'],
+                                          patterns=patterns))
+            shas = self.shas('--all')
+            self.assertEqual(sorted(described), sorted(shas))
+            for sha in shas:
+                self.assertEqual(described[sha],
+                                 self.expected(sha, patterns and patterns[0]),
+                                 (sha, patterns))
+
+    def test_range(self):
+        described = self.history(git.walk_history, ['v1.0.0..feature'])
+        self.assertEqual([sha for sha, d in described],
+                         list(reversed(self.shas('v1.0.0..feature'))))
+        self.assertEqual([d for sha, d in described],
+                         [('v1.0.0', 1), ('v1.0.0', 2), ('v1.1.0-rc1', 0)])
+
+    def test_revisions(self):
+        names = self.shas('--all') + ['HEAD', 'master~2', 'feature^',
+                                      'v1.0.0', self.orphan, 'missing']
+        described = self.history(git.describe_revisions, names)
+        self.assertEqual([name for name, sha, d in described], names)
+
+        for name, sha, d in described:
+            if name == 'missing':
+                self.assertEqual((sha, d), (None, None))
+            else:
+                self.assertEqual(sha, self.repo.rev_parse(name + '^{commit}'))
+                self.assertEqual(d, self.expected(sha), name)
+        self.assertIsNone(dict((n, d) for n, s, d in described)[self.orphan])
+
+
+class DescribeSinceTest(GitTestCase):
+    def setUp(self):
+        super(DescribeSinceTest, self).setUp()
+        self.repo.commits(3)
+        self.repo.tag('v1.0.0')
+        self.repo.commits(4)
+        self.base = self.repo.head()
+        self.described = self.repo.describe()
+
+    def describe_since(self, head=None, patterns=None):
+        tag, count, base = self.described
+        return self.call(git.describe_since, base, tag, count,
+                         head or self.repo.head(), patterns)
+
+    def test_linear(self):
+        self.repo.commits(5)
+        self.assertEqual(self.describe_since(), self.repo.describe())
+        self.assertEqual(self.describe_since()[1], 9)
+
+    def test_single_commit(self):
+        self.repo.commit()
+        self.assertEqual(self.describe_since(), self.repo.describe())
+
+    def test_unchanged(self):
+        # nothing to extend, the caller describes HEAD as usual
+        self.assertIsNone(self.describe_since())
+
+    def test_tagged(self):
+        self.repo.commits(2)
+        self.repo.tag('v1.1.0')
+        self.repo.commit()
+        self.assertIsNone(self.describe_since())
+
+    def test_tag_not_matching(self):
+        # tags not matching the patterns don't stop the walk
+        self.repo.commits(2)
+        self.repo.tag('nightly')
+        self.repo.commit()
+        self.assertEqual(self.describe_since(patterns=['v[0-9]*']),
+                         self.repo.describe(match='v[0-9]*'))
+
+    def test_lightweight_tag(self):
+        # git describe only considers annotated tags by default
+        self.repo.commit()
+        self.repo.tag('light', annotated=False)
+        self.repo.commit()
+        self.assertEqual(self.describe_since(), self.repo.describe())
+
+    def test_merge(self):
+        self.repo.git('checkout', '-q', '-b', 'topic', 'v1.0.0')
+        self.repo.commit()
+        self.repo.git('checkout', '-q', 'master')
+        self.repo.git('merge', '-q', '--no-ff', '-m', 'merge', 'topic')
+        self.assertIsNone(self.describe_since())
+
+    def test_rewritten(self):
+        # HEAD doesn't descend from the described commit anymore
+        self.repo.git('reset', '-q', '--hard', 'HEAD~2')
+        self.repo.commits(3)
+        self.assertIsNone(self.describe_since())
+
+
+if __name__ == '__main__':
+    unittest.main()
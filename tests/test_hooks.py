@@ -0,0 +1,151 @@
+#!/usr/bin/env python2
+# coding=utf-8
+
+"""
+Tests for the managed git hooks and the process waiting for an operation in
+progress to complete
+"""
+
+import os
+import json
+import time
+import unittest
+
+from scratch import ScratchRepo
+from gitver.hooks import MANAGED_HOOKS, MANAGED_MARKER, WAITER_FILE
+from gitver.watch import wait_operation
+
+
+class HooksTest(unittest.TestCase):
+    def setUp(self):
+        self.repo = ScratchRepo()
+        self.repo.commit()
+        self.repo.tag('v1.0.0')
+        self.repo.gitver('init')
+        self.write('.gitignore', '.gitver\nversion.txt\ntrace.jsonl\n')
+        self.repo.git('add', '.gitignore')
+        self.write('.gitver/templates/version',
+                   '#version.txt\n$COMMIT_COUNT\n')
+        self.hooks = os.path.join(self.repo.git_dir, 'hooks')
+        self.waiter = os.path.join(self.repo.git_dir, WAITER_FILE)
+        self.bisect = os.path.join(self.repo.git_dir, 'BISECT_LOG')
+
+        # the hooks inherit the environment git runs with
+        self.trace = os.path.join(self.repo.path, 'trace.jsonl')
+        self.saved = os.environ.get('GITVER_TRACE')
+        os.environ['GITVER_TRACE'] = self.trace
+
+    def tearDown(self):
+        if self.saved is None:
+            os.environ.pop('GITVER_TRACE', None)
+        else:
+            os.environ['GITVER_TRACE'] = self.saved
+        # lets a waiter left behind by a failure go
+        if os.path.exists(self.bisect):
+            os.unlink(self.bisect)
+        self.repo.close()
+
+    def write(self, name, text):
+        with open(os.path.join(self.repo.path, name), 'w') as f:
+            f.write(text)
+
+    def version(self):
+        try:
+            with open(os.path.join(self.repo.path, 'version.txt'), 'r') as f:
+                return f.read()
+        except IOError:
+            return None
+
+    def runs(self):
+        try:
+            with open(self.trace, 'r') as f:
+                return [json.loads(l)['argv'] for l in f]
+        except IOError:
+            return []
+
+    def install(self, *args):
+        status, out, err = self.repo.gitver('hooks', 'install', 'version',
+                                            *args)
+        self.assertEqual(status, 0, err)
+        # only the runs of the hooks are looked at
+        os.unlink(self.trace)
+
+    def wait_released(self):
+        deadline = time.time() + 10
+        while os.path.exists(self.waiter) and time.time() < deadline:
+            time.sleep(0.1)
+        self.assertFalse(os.path.exists(self.waiter))
+
+    def test_installed(self):
+        self.install()
+        for h in MANAGED_HOOKS:
+            path = os.path.join(self.hooks, h)
+            self.assertTrue(os.access(path, os.X_OK), path)
+            with open(path, 'r') as f:
+                self.assertIn(MANAGED_MARKER, f.read())
+
+    def test_head(self):
+        self.install()
+        self.repo.commits(2)
+        self.assertEqual(self.version(), '2\n')
+        self.assertEqual(self.runs()[-1],
+                         ['update', '--head', self.repo.head(), 'version'])
+
+        self.repo.git('checkout', '-q', 'HEAD^')
+        self.assertEqual(self.version(), '1\n')
+        self.assertEqual(self.runs()[-1][:3],
+                         ['update', '--head', self.repo.head()])
+
+        # file checkouts don't move HEAD
+        self.repo.git('checkout', '-q', 'HEAD', '--', '.gitignore')
+        self.assertEqual(len(self.runs()), 3)
+
+    def test_waiter(self):
+        self.install()
+        open(self.bisect, 'w').close()
+        self.repo.commit()
+        self.repo.commit()
+        self.assertIsNone(self.version())
+        self.assertEqual(self.runs(), [])
+
+        with open(self.waiter, 'r') as f:
+            pid = int(f.read())
+        # a single waiter, still running
+        os.kill(pid, 0)
+
+        os.unlink(self.bisect)
+        self.wait_released()
+        self.assertEqual(self.version(), '2\n')
+        self.assertEqual(self.runs(), [['hooks', 'wait', 'version']])
+
+    def test_timeout(self):
+        open(self.bisect, 'w').close()
+        self.assertFalse(wait_operation(self.repo.git_dir, 0.05, 0.2))
+
+        started = time.time()
+        status, out, err = self.repo.gitver('hooks', 'wait', 'version',
+                                            '--timeout', '0.2')
+        self.assertEqual(status, 0, err)
+        self.assertLess(time.time() - started, 5)
+        self.assertIsNone(self.version())
+
+        os.unlink(self.bisect)
+        self.assertTrue(wait_operation(self.repo.git_dir, 0.05, 0.2))
+
+    def test_uninstall(self):
+        self.write('.git/hooks/post-merge', '#!/bin/sh\n')
+        status, out, err = self.repo.gitver('hooks', 'install', 'version')
+        self.assertEqual((status, out), (1, ''))
+        self.assertIn('use --force', err)
+        self.assertFalse(os.path.exists(os.path.join(self.hooks,
+                                                     'post-commit')))
+
+        self.install('--force')
+        status, out, err = self.repo.gitver('hooks', 'uninstall')
+        self.assertEqual(status, 0, err)
+        for h in MANAGED_HOOKS:
+            self.assertFalse(os.path.exists(os.path.join(self.hooks, h)))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,140 @@
+#!/usr/bin/env python2
+# coding=utf-8
+
+"""
+Tests for writing the template outputs only if changed, and atomically
+"""
+
+import os
+import stat
+import shutil
+import tempfile
+import unittest
+
+from scratch import ScratchRepo
+from gitver.commands import write_output, move_output
+
+# modification time set on the outputs, to tell whether they're rewritten
+OLD_MTIME = 1000000000
+
+
+def mode(path):
+    return stat.S_IMODE(os.stat(path).st_mode)
+
+
+class WriteOutputTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp(prefix='gitver-test-')
+        self.output = os.path.join(self.dir, 'version.txt')
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def read(self):
+        with open(self.output, 'rb') as fp:
+            return fp.read()
+
+    def temp(self, data):
+        fd, tmp = tempfile.mkstemp(dir=self.dir)
+        with os.fdopen(fd, 'wb') as fp:
+            fp.write(data)
+        return tmp
+
+    def test_created(self):
+        umask = os.umask(0o022)
+        try:
+            self.assertTrue(write_output(self.output, '1.0.0\n'))
+        finally:
+            os.umask(umask)
+        self.assertEqual(self.read(), '1.0.0\n')
+        self.assertEqual(mode(self.output), 0o644)
+        self.assertEqual(os.listdir(self.dir), ['version.txt'])
+
+    def test_unchanged(self):
+        write_output(self.output, '1.0.0\n')
+        os.utime(self.output, (OLD_MTIME, OLD_MTIME))
+
+        self.assertFalse(write_output(self.output, '1.0.0\n'))
+        self.assertEqual(os.stat(self.output).st_mtime, OLD_MTIME)
+
+        # same size, different contents
+        self.assertTrue(write_output(self.output, '1.0.1\n'))
+        self.assertEqual(self.read(), '1.0.1\n')
+        self.assertNotEqual(os.stat(self.output).st_mtime, OLD_MTIME)
+
+    def test_replaced(self):
+        # the output is replaced by a new file, keeping its permissions
+        write_output(self.output, '1.0.0\n')
+        os.chmod(self.output, 0o640)
+        inode = os.stat(self.output).st_ino
+
+        self.assertTrue(write_output(self.output, '1.1.0\n'))
+        self.assertNotEqual(os.stat(self.output).st_ino, inode)
+        self.assertEqual(mode(self.output), 0o640)
+        self.assertEqual(os.listdir(self.dir), ['version.txt'])
+
+    def test_moved(self):
+        write_output(self.output, '1.0.0\n')
+        os.chmod(self.output, 0o640)
+        os.utime(self.output, (OLD_MTIME, OLD_MTIME))
+
+        tmp = self.temp('1.0.0\n')
+        self.assertFalse(move_output(tmp, self.output))
+        self.assertFalse(os.path.exists(tmp))
+        self.assertEqual(os.stat(self.output).st_mtime, OLD_MTIME)
+
+        tmp = self.temp('1.1.0\n')
+        self.assertTrue(move_output(tmp, self.output))
+        self.assertFalse(os.path.exists(tmp))
+        self.assertEqual(self.read(), '1.1.0\n')
+        self.assertEqual(mode(self.output), 0o640)
+
+
+class UpdateTest(unittest.TestCase):
+    def setUp(self):
+        self.repo = ScratchRepo()
+        self.repo.commit()
+        self.repo.tag('v1.0.0')
+        self.repo.gitver('init')
+        os.mkdir(os.path.join(self.repo.path, 'out'))
+        self.output = os.path.join(self.repo.path, 'out', 'version.txt')
+        self.template('version', '#out/version.txt\n$MAJOR.$MINOR.$PATCH '
+                                 '$COMMIT_COUNT\n')
+
+    def tearDown(self):
+        self.repo.close()
+
+    def template(self, name, text):
+        path = os.path.join(self.repo.path, '.gitver', 'templates', name)
+        with open(path, 'w') as fp:
+            fp.write(text)
+
+    def update(self, *templates):
+        status, out, err = self.repo.gitver('update', *templates)
+        self.assertEqual(status, 0, err)
+        return err
+
+    def test_up_to_date(self):
+        self.update('version')
+        os.utime(self.output, (OLD_MTIME, OLD_MTIME))
+
+        self.assertIn('up to date', self.update('version'))
+        self.assertEqual(os.stat(self.output).st_mtime, OLD_MTIME)
+
+        self.repo.commit()
+        self.update('version')
+        self.assertNotEqual(os.stat(self.output).st_mtime, OLD_MTIME)
+        with open(self.output, 'r') as fp:
+            self.assertEqual(fp.read(), '1.0.0 1\n')
+
+    def test_failed(self):
+        # nothing is written when any template fails, no file is left behind
+        self.template('broken', '#missing/broken.txt\n$MAJOR\n')
+        status, out, err = self.repo.gitver('update', 'version', 'broken')
+        self.assertEqual(status, 1)
+        self.assertIn('no output has been written', err)
+        self.assertEqual(os.listdir(os.path.dirname(self.output)), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
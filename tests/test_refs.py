@@ -0,0 +1,179 @@
+#!/usr/bin/env python2
+# coding=utf-8
+
+"""
+Tests for the refs database reader
+"""
+
+import os
+import unittest
+
+from scratch import ScratchRepo
+from gitver import refs
+
+
+class RefsTestCase(unittest.TestCase):
+    def setUp(self):
+        self.repo = ScratchRepo()
+        self.first = self.repo.commit()
+        self.repo.tag('v1.0.0')
+        self.repo.tag('light', annotated=False)
+        self.second = self.repo.commit()
+        self.repo.tag('v1.1.0')
+
+    def tearDown(self):
+        self.repo.close()
+
+    def write_packed_refs(self, text):
+        with open(os.path.join(self.repo.git_dir, 'packed-refs'), 'w') as f:
+            f.write(text)
+
+
+class PackedRefsTest(RefsTestCase):
+    def test_missing(self):
+        self.assertEqual(refs.read_packed_refs(self.repo.git_dir), dict())
+
+    def test_fully_peeled(self):
+        self.repo.git('pack-refs', '--all')
+        packed = refs.read_packed_refs(self.repo.git_dir)
+
+        self.assertEqual(packed['refs/tags/v1.0.0'],
+                         (self.repo.rev_parse('v1.0.0'), self.first))
+        self.assertEqual(packed['refs/tags/v1.1.0'],
+                         (self.repo.rev_parse('v1.1.0'), self.second))
+        self.assertEqual(packed['refs/tags/light'], (self.first, self.first))
+        self.assertEqual(packed['refs/heads/master'],
+                         (self.second, self.second))
+
+    def test_peeled_tags_only(self):
+        tag = self.repo.rev_parse('v1.0.0')
+        self.write_packed_refs(
+            "# pack-refs with: peeled \n" +
+            self.second + " refs/heads/master\n" +
+            tag + " refs/tags/v1.0.0\n" +
+            "^" + self.first + "\n" +
+            self.first + " refs/tags/light\n")
+        packed = refs.read_packed_refs(self.repo.git_dir)
+
+        self.assertEqual(packed['refs/heads/master'], (self.second, None))
+        self.assertEqual(packed['refs/tags/v1.0.0'], (tag, self.first))
+        self.assertEqual(packed['refs/tags/light'], (self.first, self.first))
+
+    def test_unpeeled(self):
+        # files written by old git versions have no header at all
+        tag = self.repo.rev_parse('v1.0.0')
+        self.write_packed_refs(tag + " refs/tags/v1.0.0\n")
+        packed = refs.read_packed_refs(self.repo.git_dir)
+
+        self.assertEqual(packed['refs/tags/v1.0.0'], (tag, None))
+        self.assertIsNone(refs.tags_at(
+            {'v1.0.0': packed['refs/tags/v1.0.0']}, self.first))
+
+
+class TagsTest(RefsTestCase):
+    def check_tags(self):
+        tags = refs.read_tags(self.repo.git_dir)
+        self.assertEqual(sorted(tags.keys()), ['light', 'v1.0.0', 'v1.1.0'])
+        for name, (sha, peeled) in tags.items():
+            self.assertEqual(sha, self.repo.rev_parse(name))
+            self.assertEqual(peeled, self.repo.rev_parse(name + '^{commit}'))
+
+        self.assertEqual(refs.tags_at(tags, self.first), ['v1.0.0'])
+        self.assertEqual(refs.tags_at(tags, self.second), ['v1.1.0'])
+
+    def test_loose(self):
+        self.check_tags()
+
+    def test_packed(self):
+        self.repo.git('pack-refs', '--all', '--prune')
+        self.check_tags()
+
+    def test_packed_objects(self):
+        # loose tags pointing to packed objects can't be peeled
+        self.repo.git('gc', '-q', '--prune=now')
+        self.repo.tag('v1.2.0')
+        self.repo.git('repack', '-a', '-d', '-q')
+        tags = refs.read_tags(self.repo.git_dir)
+
+        self.assertEqual(tags['v1.1.0'][1], self.second)
+        self.assertIsNone(tags['v1.2.0'][1])
+        self.assertIsNone(refs.tags_at(tags, self.second))
+
+    def test_head(self):
+        self.assertEqual(refs.head_ref(self.repo.git_dir), 'refs/heads/master')
+        self.assertEqual(refs.head_sha(self.repo.git_dir), self.second)
+
+        self.repo.git('checkout', '-q', '--detach', 'v1.0.0')
+        self.assertIsNone(refs.head_ref(self.repo.git_dir))
+        self.assertEqual(refs.head_sha(self.repo.git_dir), self.first)
+
+
+class FingerprintTest(RefsTestCase):
+    def assertChanges(self, action):
+        before = refs.fingerprint(self.repo.git_dir)
+        action()
+        self.assertNotEqual(refs.fingerprint(self.repo.git_dir), before)
+
+    def test_stable(self):
+        before = refs.fingerprint(self.repo.git_dir)
+        self.repo.commit()
+        self.assertEqual(refs.fingerprint(self.repo.git_dir), before)
+
+    def test_tag_added(self):
+        self.assertChanges(lambda: self.repo.tag('v2.0.0'))
+
+    def test_tag_deleted(self):
+        self.assertChanges(lambda: self.repo.git('tag', '-d', 'v1.0.0'))
+
+    def test_tag_moved(self):
+        self.assertChanges(lambda: self.repo.git('tag', '-f', 'light',
+                                                 self.second))
+
+    def test_packed(self):
+        self.assertChanges(lambda: self.repo.git('pack-refs', '--all',
+                                                 '--prune'))
+
+    def test_shallow(self):
+        self.assertChanges(lambda: self.write_shallow(self.first))
+
+    def write_shallow(self, sha):
+        with open(os.path.join(self.repo.git_dir, 'shallow'), 'w') as f:
+            f.write(sha + '\n')
+
+
+class StateFilesTest(RefsTestCase):
+    def path(self, *names):
+        return os.path.join(self.repo.git_dir, *names)
+
+    def test_loose(self):
+        paths = refs.state_files(self.repo.git_dir)
+        self.assertEqual(paths, [self.path('HEAD'),
+                                 self.path('refs', 'heads', 'master'),
+                                 self.path('refs', 'tags')])
+
+    def test_packed(self):
+        # the packed branch is represented by the directory it would live in
+        self.repo.git('pack-refs', '--all', '--prune')
+        paths = refs.state_files(self.repo.git_dir)
+        self.assertEqual(paths, [self.path('HEAD'),
+                                 self.path('refs', 'heads'),
+                                 self.path('packed-refs'),
+                                 self.path('refs', 'tags')])
+
+    def test_detached(self):
+        self.repo.git('checkout', '-q', '--detach')
+        with open(self.path('shallow'), 'w') as f:
+            f.write(self.first + '\n')
+        paths = refs.state_files(self.repo.git_dir)
+        self.assertEqual(paths, [self.path('HEAD'),
+                                 self.path('refs', 'tags'),
+                                 self.path('shallow')])
+
+    def test_nested_tags(self):
+        self.repo.tag('release/v2.0.0')
+        paths = refs.state_files(self.repo.git_dir)
+        self.assertIn(self.path('refs', 'tags', 'release'), paths)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,104 @@
+#!/usr/bin/env python2
+# coding=utf-8
+
+"""
+Tests for the version anchors extended by shallow clones
+"""
+
+import os
+import json
+import unittest
+
+from scratch import ScratchRepo
+
+
+def init(repo):
+    repo.gitver('init')
+    with open(os.path.join(repo.path, '.gitignore'), 'w') as f:
+        f.write('.gitver\n')
+
+
+class ShallowCloneTest(unittest.TestCase):
+    def setUp(self):
+        # v1.0.0 + 20 commits, anchored, + 5 commits
+        self.full = ScratchRepo()
+        self.full.commit()
+        self.full.tag('v1.0.0')
+        self.full.commits(20)
+        init(self.full)
+        self.assertEqual(self.full.gitver('anchor')[0], 0)
+        self.full.git('add', '.gitver-anchor')
+        self.full.commit('anchor')
+        self.full.commits(5)
+        self.clones = []
+
+    def tearDown(self):
+        for repo in self.clones + [self.full]:
+            repo.close()
+
+    def clone(self, depth):
+        repo = ScratchRepo()
+        self.clones.append(repo)
+        repo.git('fetch', '-q', '--depth', str(depth), 'file://' +
+                 self.full.path, '+master:refs/remotes/origin/master')
+        repo.git('reset', '-q', '--hard', 'origin/master')
+        init(repo)
+        self.assertTrue(os.path.exists(os.path.join(repo.git_dir,
+                                                    'shallow')))
+        return repo
+
+    def variables(self, repo, **kwargs):
+        status, out, err = repo.gitver('current', '--json', **kwargs)
+        self.assertEqual(status, 0, err)
+        return json.loads(out)
+
+    def error(self, repo, *args, **kwargs):
+        status, out, err = repo.gitver(*(args or ['current']), **kwargs)
+        self.assertEqual((status, out), (1, ''))
+        return err
+
+    def test_anchored(self):
+        expected = self.variables(self.full)
+        self.assertEqual(expected['commit_count'], 26)
+
+        shallow = self.clone(10)
+        self.assertEqual(self.variables(shallow), expected)
+
+        shallow.commits(3)
+        self.full.git('fetch', '-q', shallow.path, 'HEAD')
+        self.full.git('reset', '-q', '--hard', 'FETCH_HEAD')
+        self.assertEqual(self.variables(shallow)['commit_count'], 29)
+        self.assertEqual(self.variables(shallow), self.variables(self.full))
+
+    def test_anchor_env(self):
+        anchor = self.full.gitver('anchor', '--print')[1].strip()
+        self.assertEqual(json.loads(anchor)['commit'], self.full.head())
+
+        shallow = self.clone(2)
+        # the committed anchor is too old for this clone
+        self.assertIn('The anchored commit', self.error(shallow))
+        self.assertEqual(self.variables(shallow,
+                                        env={'GITVER_ANCHOR': anchor}),
+                         self.variables(self.full))
+
+    def test_no_anchor(self):
+        self.full.git('rm', '-q', '.gitver-anchor')
+        self.full.commit('no anchor')
+        shallow = self.clone(3)
+        self.assertIn('This is a shallow clone', self.error(shallow))
+
+    def test_invalid_anchor(self):
+        shallow = self.clone(10)
+        err = self.error(shallow, env={'GITVER_ANCHOR': '{"commit": 1}'})
+        self.assertIn('Invalid version anchor in the GITVER_ANCHOR', err)
+        err = self.error(shallow, env={'GITVER_ANCHOR': 'nope'})
+        self.assertIn('Invalid version anchor', err)
+
+    def test_anchor_in_shallow_clone(self):
+        shallow = self.clone(10)
+        self.assertIn('anchors can only be created from the full history',
+                      self.error(shallow, 'anchor'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,151 @@
+#!/usr/bin/env python2
+# coding=utf-8
+
+"""
+Tests for the key-value store and the migration of the pickled format
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+import cPickle as pickle
+
+from scratch import ScratchRepo
+from gitver.storage import KVStore, migrate, SQLITE_HEADER
+
+
+class StoreTestCase(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp(prefix='gitver-test-')
+        self.file = os.path.join(self.dir, '.repo_cache')
+
+    def tearDown(self):
+        shutil.rmtree(self.dir, ignore_errors=True)
+
+
+class MigrateTest(StoreTestCase):
+    def write(self, data):
+        with open(self.file, 'wb') as f:
+            f.write(data)
+
+    def header(self):
+        with open(self.file, 'rb') as f:
+            return f.read(len(SQLITE_HEADER))
+
+    def test_pickled(self):
+        data = {'key': 'abc', 'info': {'tag': 'v1.0.0', 'count': 3},
+                'misses': 7}
+        self.write(pickle.dumps(data))
+
+        migrate(self.file)
+        self.assertEqual(self.header(), SQLITE_HEADER)
+        self.assertEqual(dict(KVStore(self.file).items()), data)
+        self.assertEqual(os.listdir(self.dir), ['.repo_cache'])
+
+    def test_current(self):
+        store = KVStore(self.file)
+        store.set('key', [1, 2]).save()
+        inode = os.stat(self.file).st_ino
+
+        migrate(self.file)
+        self.assertEqual(os.stat(self.file).st_ino, inode)
+        self.assertEqual(KVStore(self.file).get('key'), [1, 2])
+
+    def test_on_first_use(self):
+        self.write(pickle.dumps({'a': 1}, pickle.HIGHEST_PROTOCOL))
+        store = KVStore(self.file)
+        self.assertEqual(store.get('a'), 1)
+        self.assertFalse(store.has('b'))
+
+        store.set('b', 2).rm('a').save()
+        self.assertEqual(dict(KVStore(self.file).items()), {'b': 2})
+
+    def test_unreadable(self):
+        self.write('this is not a pickle')
+        migrate(self.file)
+        self.assertEqual(self.header(), SQLITE_HEADER)
+        self.assertTrue(KVStore(self.file).empty())
+
+    def test_empty(self):
+        self.write('')
+        migrate(self.file)
+        self.assertEqual(os.path.getsize(self.file), 0)
+
+    def test_missing(self):
+        migrate(self.file)
+        self.assertFalse(os.path.exists(self.file))
+
+
+class KVStoreTest(StoreTestCase):
+    def test_read_missing(self):
+        # reading doesn't create the database
+        store = KVStore(self.file)
+        self.assertFalse(store.get('key'))
+        self.assertTrue(store.empty())
+        self.assertFalse(os.path.exists(self.file))
+
+        store.set('key', 1).save()
+        self.assertEqual(store.get('key'), 1)
+
+    def test_read_empty_file(self):
+        open(self.file, 'w').close()
+        self.assertTrue(KVStore(self.file).empty())
+        KVStore(self.file).set('key', 1).save()
+        self.assertEqual(KVStore(self.file).get('key'), 1)
+
+    def test_clear(self):
+        store = KVStore(self.file)
+        store.set('a', 1).set('b', 2).save()
+        other = KVStore(self.file)
+        self.assertEqual(other.get('a'), 1)
+        inode = os.stat(self.file).st_ino
+
+        store.set('c', 3)
+        self.assertTrue(store.clear())
+        self.assertTrue(store.empty())
+        self.assertTrue(other.empty())
+        self.assertEqual(os.stat(self.file).st_ino, inode)
+
+        other.set('d', 4).save()
+        self.assertEqual(dict(store.items()), {'d': 4})
+
+    def test_clear_missing(self):
+        self.assertTrue(KVStore(self.file).clear())
+        self.assertFalse(os.path.exists(self.file))
+
+
+class CleanAllTest(unittest.TestCase):
+    def setUp(self):
+        self.repo = ScratchRepo()
+        self.repo.commit()
+        self.repo.tag('v1.0.0')
+        self.repo.gitver('init')
+        with open(os.path.join(self.repo.path, '.gitignore'), 'w') as f:
+            f.write('.gitver\n')
+        self.store = os.path.join(self.repo.path, '.gitver', '.next_store')
+
+    def tearDown(self):
+        self.repo.close()
+
+    def test_nothing_stored(self):
+        self.assertEqual(self.repo.gitver('current')[1], '1.0.0\n')
+        self.assertEqual(self.repo.gitver('clean-all'),
+                         (0, 'No NEXT custom strings found.\n', ''))
+        self.assertFalse(os.path.exists(self.store))
+
+    def test_stored(self):
+        self.repo.gitver('next', '2.0.0')
+        self.repo.commit()
+        self.assertIn('2.0.0-SNAPSHOT', self.repo.gitver('current')[1])
+
+        self.assertEqual(self.repo.gitver('clean-all'),
+                         (0, 'All previously set custom strings have been '
+                             'removed.\n', ''))
+        self.assertIn('1.0.0-NEXT', self.repo.gitver('current')[1])
+        self.assertEqual(self.repo.gitver('clean-all')[1],
+                         'No NEXT custom strings found.\n')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,116 @@
+#!/usr/bin/env python2
+# coding=utf-8
+
+"""
+Tests for the persistent index of the version tags
+"""
+
+import os
+import unittest
+
+from scratch import ScratchRepo
+from gitver.backends import create_backend
+from gitver.defines import repository
+from gitver.storage import KVStore
+from gitver.tags import TagIndex, SeriesError, parse_series
+
+
+class TagIndexTest(unittest.TestCase):
+    def setUp(self):
+        # master:  v1.0.0 - v1.1.0-beta - v1.1.0 - v1.1.0.1 - v2.0.0-rc1
+        # release:                         \ v1.1.1
+        repo = self.repo = ScratchRepo()
+        os.mkdir(os.path.join(repo.path, '.gitver'))
+        for tag in ['v1.0.0', 'v1.1.0-beta', 'v1.1.0']:
+            repo.commit()
+            repo.tag(tag)
+        repo.git('branch', 'release')
+        for tag in ['v1.1.0.1', 'v2.0.0-rc1']:
+            repo.commit()
+            repo.tag(tag)
+        repo.commit()
+        repo.tag('v3.0.0', annotated=False)
+        repo.tag('nightly')
+
+        repo.git('checkout', '-q', 'release')
+        repo.commit()
+        repo.tag('v1.1.1')
+        repo.git('checkout', '-q', 'master')
+
+    def tearDown(self):
+        self.repo.close()
+
+    def call(self, func, *args):
+        with repository(self.repo.path, create_backend(cwd=self.repo.path)):
+            return func(*args)
+
+    def index(self):
+        return KVStore(os.path.join(self.repo.path, '.gitver', '.tag_index'))
+
+    def test_tags(self):
+        index = TagIndex()
+        self.assertEqual(self.call(index.tags),
+                         ['v2.0.0-rc1', 'v1.1.1', 'v1.1.0.1', 'v1.1.0',
+                          'v1.1.0-beta', 'v1.0.0'])
+        self.assertEqual(self.call(index.tags, '1.1'),
+                         ['v1.1.1', 'v1.1.0.1', 'v1.1.0', 'v1.1.0-beta'])
+        self.assertEqual(self.call(index.tags, 'v1.1.0.x'),
+                         ['v1.1.0.1', 'v1.1.0', 'v1.1.0-beta'])
+        self.assertEqual(self.call(index.tags, '3'), [])
+
+    def test_patterns(self):
+        index = TagIndex(['v1.1*', 'v1.0.0'])
+        self.assertEqual(self.call(index.tags, '1'),
+                         ['v1.1.1', 'v1.1.0.1', 'v1.1.0', 'v1.1.0-beta',
+                          'v1.0.0'])
+
+    def test_reachable(self):
+        index = TagIndex()
+        self.assertEqual(self.call(index.reachable, '1.x'),
+                         ['v1.1.0.1', 'v1.1.0', 'v1.1.0-beta', 'v1.0.0'])
+        self.assertEqual(self.call(index.latest), 'v2.0.0-rc1')
+        self.assertEqual(self.call(index.latest, '1'), 'v1.1.0.1')
+        self.assertEqual(self.call(index.latest, '1', 'release'), 'v1.1.1')
+        self.assertEqual(self.call(index.latest, '1.0', 'v1.0.0'), 'v1.0.0')
+        self.assertIsNone(self.call(index.latest, '3'))
+
+    def test_persisted(self):
+        self.call(TagIndex().tags)
+        stamp, entries = self.index().get('index')
+        self.assertEqual(len(entries), 6)
+
+        # served from the index, until the tags change
+        self.index().set('index', (stamp, entries[:1])).save()
+        self.assertEqual(self.call(TagIndex().tags), ['v2.0.0-rc1'])
+
+        self.repo.tag('v2.0.0')
+        self.assertEqual(self.call(TagIndex().tags)[:2],
+                         ['v2.0.0', 'v2.0.0-rc1'])
+        self.assertEqual(len(self.index().get('index')[1]), 7)
+
+    def test_series(self):
+        self.assertEqual(parse_series('1'), (1,))
+        self.assertEqual(parse_series('v1.2.x'), (1, 2))
+        self.assertEqual(parse_series(' 1.2.* '), (1, 2))
+        for series in ['', 'x', '1.x.2', 'v1.2-rc']:
+            self.assertRaises(SeriesError, parse_series, series)
+
+    def test_command(self):
+        self.repo.gitver('init')
+        with open(os.path.join(self.repo.path, '.gitignore'), 'w') as f:
+            f.write('.gitver\n')
+        self.assertEqual(self.repo.gitver('list-tags', '--latest', '1.x'),
+                         (0, 'v1.1.0.1\n', ''))
+        self.assertEqual(self.repo.gitver('list-tags', '--reachable',
+                                          '1.1.0')[1],
+                         'v1.1.0.1\nv1.1.0\nv1.1.0-beta\n')
+
+        status, out, err = self.repo.gitver('list-tags', '--latest', '3')
+        self.assertEqual((status, out), (1, ''))
+        status, out, err = self.repo.gitver('list-tags', 'nope')
+        self.assertEqual(status, 1)
+        self.assertIn('Invalid release series', err)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,87 @@
+#!/usr/bin/env python2
+# coding=utf-8
+
+"""
+Tests for the chunked template scanner
+"""
+
+import unittest
+from cStringIO import StringIO
+
+from gitver.templates import scan_placeholders, compile_template, splice, \
+    TemplateError, CHUNK_SIZE
+
+BODY = "v$MAJOR.${MINOR}.$PATCH costs $$5\n$$$BUILD_ID ${REV_PREFIX}$REV\n"
+
+KEYWORDS = {'MAJOR': 1, 'MINOR': 2, 'PATCH': 3, 'BUILD_ID': 'abc',
+            'REV_PREFIX': '.', 'REV': 4}
+
+
+def chunked(text, size):
+    return [text[i:i + size] for i in range(0, len(text), size)]
+
+
+class ScanPlaceholdersTest(unittest.TestCase):
+    def test_single_chunk(self):
+        placeholders = list(scan_placeholders([BODY]))
+        self.assertEqual([v for s, e, v in placeholders],
+                         ['MAJOR', 'MINOR', 'PATCH', None, None, 'BUILD_ID',
+                          'REV_PREFIX', 'REV'])
+        self.assertEqual(splice(BODY, placeholders, KEYWORDS),
+                         "v1.2.3 costs $5\n$abc .4\n")
+
+    def test_chunk_boundaries(self):
+        # every placeholder straddles a chunk boundary for some chunk size
+        expected = list(scan_placeholders([BODY]))
+        for size in range(1, len(BODY) + 1):
+            self.assertEqual(list(scan_placeholders(chunked(BODY, size))),
+                             expected, "chunk size " + str(size))
+
+    def test_escaped_at_boundary(self):
+        # "$$" split across chunks is still an escaped dollar sign, whatever
+        # follows it
+        self.assertEqual(list(scan_placeholders(['a$', '$MAJOR'])),
+                         [(1, 3, None)])
+        expected = [(1, 3, None), (3, 9, 'MAJOR')]
+        for chunks in [['a$$$MAJOR'], ['a$', '$$MAJOR'], ['a$$', '$MAJOR'],
+                       ['a$$$', 'MAJOR']]:
+            self.assertEqual(list(scan_placeholders(chunks)), expected)
+
+    def test_unknown_key(self):
+        with self.assertRaises(TemplateError):
+            list(scan_placeholders(['$MAJ', 'ORITY']))
+
+    def test_invalid_line(self):
+        try:
+            list(scan_placeholders(chunked("a\nb\n\nc $ d\n", 3)))
+        except TemplateError as e:
+            # line numbers count the output path too
+            self.assertIn("line 5", str(e))
+        else:
+            self.fail("invalid placeholder not detected")
+
+
+class CompileTemplateTest(unittest.TestCase):
+    def test_straddling_placeholder(self):
+        for shift in range(0, 12):
+            pad = 'x' * (CHUNK_SIZE - shift)
+            body = pad + '${FULL_BUILD_ID} $$ $COMMIT_COUNT_STR\n'
+            compiled = compile_template('t', StringIO('#out.txt\n' + body))
+
+            self.assertEqual(compiled['output'], 'out.txt')
+            self.assertEqual(compiled['offset'], len('#out.txt\n'))
+            self.assertEqual(compiled['variables'],
+                             {'FULL_BUILD_ID', 'COMMIT_COUNT_STR'})
+            self.assertEqual(
+                compiled['placeholders'],
+                [(len(pad), len(pad) + 16, 'FULL_BUILD_ID'),
+                 (len(pad) + 17, len(pad) + 19, None),
+                 (len(pad) + 20, len(pad) + 37, 'COMMIT_COUNT_STR')])
+
+    def test_no_output(self):
+        with self.assertRaises(TemplateError):
+            compile_template('t', StringIO('out.txt\n$MAJOR\n'))
+
+
+if __name__ == '__main__':
+    unittest.main()
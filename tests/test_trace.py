@@ -0,0 +1,115 @@
+#!/usr/bin/env python2
+# coding=utf-8
+
+"""
+Tests for the timings and git invocations instrumentation
+"""
+
+import os
+import json
+import unittest
+
+from scratch import ScratchRepo
+from gitver.trace import Tracer, format_report
+
+
+class TracerTest(unittest.TestCase):
+    def test_disabled(self):
+        tracer = Tracer()
+        with tracer.phase('phase'):
+            tracer.count('hits')
+        self.assertFalse(tracer.enabled)
+
+    def test_report(self):
+        tracer = Tracer()
+        # neither a table nor a trace file: nothing is written on exit
+        tracer.enable()
+        with tracer.phase('outer'):
+            with tracer.phase('inner'):
+                tracer.git(['rev-parse', 'HEAD'], 0.002, 41, 0)
+            tracer.git(['describe'], 0.001, 0, 128)
+        tracer.count('hits')
+        tracer.count('hits')
+
+        report = tracer.report()
+        self.assertEqual([(p['name'], p['depth']) for p in report['phases']],
+                         [('outer', 0), ('inner', 1)])
+        self.assertEqual([(g['args'], g['bytes'], g['status'])
+                          for g in report['git']],
+                         [(['rev-parse', 'HEAD'], 41, 0),
+                          (['describe'], 0, 128)])
+        self.assertEqual(report['counters'], {'hits': 2})
+        self.assertGreater(report['peak_rss_kib'], 0)
+
+        table = format_report(report)
+        phases = [l for l in table.splitlines() if l.endswith('outer') or
+                  l.endswith('inner')]
+        self.assertEqual([l.split(' ms')[1] for l in phases],
+                         ['  outer', '    inner'])
+        self.assertIn('  git invocations: 2, ', table)
+        self.assertIn('    2.0 ms         41      0  rev-parse HEAD', table)
+        self.assertIn('hits', table)
+
+
+class TraceFileTest(unittest.TestCase):
+    def setUp(self):
+        self.repo = ScratchRepo()
+        self.repo.commit()
+        self.repo.tag('v1.0.0')
+        self.repo.commit()
+        self.repo.gitver('init')
+        with open(os.path.join(self.repo.path, '.gitignore'), 'w') as f:
+            f.write('.gitver\n')
+        self.trace = os.path.join(self.repo.path, 'trace.jsonl')
+
+    def tearDown(self):
+        self.repo.close()
+
+    def gitver(self, *args):
+        return self.repo.gitver(*args, env={'GITVER_TRACE': self.trace})
+
+    def reports(self):
+        with open(self.trace, 'r') as f:
+            return [json.loads(l) for l in f]
+
+    def test_appended(self):
+        status, out, err = self.gitver('--no-cache', 'current')
+        self.assertEqual((status, err), (0, ''))
+        for i in range(2):
+            self.assertEqual(self.gitver('current')[1], out)
+
+        first, second, third = self.reports()
+        self.assertEqual(first['argv'], ['--no-cache', 'current'])
+        self.assertEqual(first['cwd'], self.repo.path)
+        self.assertIn('describe', [g['args'][0] for g in first['git']])
+        self.assertTrue(all(g['status'] == 0 for g in first['git']))
+        self.assertIn('get_repo_info', [p['name'] for p in first['phases']])
+
+        # the last run is served by the cache the second one filled
+        self.assertNotEqual(second['git'], [])
+        self.assertEqual(third['counters'].get('repo cache hits'), 1)
+        self.assertEqual(third['git'], [])
+
+    def test_failed_git(self):
+        self.repo.git('tag', '-d', 'v1.0.0')
+        self.assertEqual(self.gitver('--no-cache', 'current')[0], 1)
+        statuses = [g['status'] for g in self.reports()[0]['git']]
+        self.assertTrue(any(s not in [0, None] for s in statuses), statuses)
+
+    def test_timings(self):
+        status, out, err = self.repo.gitver('--timings', 'current')
+        self.assertEqual(status, 0)
+        self.assertEqual(out, self.repo.gitver('current')[1])
+        self.assertTrue(err.startswith('gitver timings: '), err)
+        self.assertIn('get_repo_info', err)
+        self.assertFalse(os.path.exists(self.trace))
+
+    def test_unwritable(self):
+        self.trace = os.path.join(self.repo.path, 'missing', 'trace.jsonl')
+        status, out, err = self.gitver('current')
+        self.assertEqual(status, 0)
+        self.assertIn("Couldn't write the trace", err)
+
+
+if __name__ == '__main__':
+    unittest.main()
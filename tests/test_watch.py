@@ -0,0 +1,98 @@
+#!/usr/bin/env python2
+# coding=utf-8
+
+"""
+Tests for the HEAD and refs watchers
+"""
+
+import os
+import unittest
+
+from scratch import ScratchRepo
+from gitver.watch import InotifyWatcher, PollingWatcher, \
+    operation_in_progress
+
+# seconds to wait for changes which are expected, or not
+TIMEOUT = 2.0
+QUIET = 0.3
+
+
+class WatcherTests(object):
+    """
+    Checks shared by the watcher implementations.
+    """
+    def setUp(self):
+        self.repo = ScratchRepo()
+        self.repo.commits(2)
+        self.watcher = self.create_watcher(self.repo.git_dir)
+
+    def tearDown(self):
+        self.watcher.close()
+        self.repo.close()
+
+    def assertChanged(self, action):
+        # drain any leftover event first
+        while self.watcher.wait(QUIET):
+            pass
+        action()
+        self.assertTrue(self.watcher.wait(TIMEOUT))
+
+    def test_quiet(self):
+        self.assertFalse(self.watcher.wait(QUIET))
+
+    def test_commit(self):
+        self.assertChanged(lambda: self.repo.commit())
+
+    def test_checkout(self):
+        self.assertChanged(lambda: self.repo.git('checkout', '-q', '--detach',
+                                                 'HEAD~1'))
+
+    def test_tags(self):
+        self.assertChanged(lambda: self.repo.tag('v1.0.0'))
+        self.assertChanged(lambda: self.repo.git('tag', '-d', 'v1.0.0'))
+
+    def test_index_ignored(self):
+        with open(os.path.join(self.repo.path, 'file'), 'w') as f:
+            f.write('data')
+        self.repo.git('add', 'file')
+        self.assertFalse(self.watcher.wait(QUIET))
+
+    def test_refs_dirs(self):
+        # nested refs directories are watched as they're created, and again
+        # once they're pruned and created anew
+        self.assertChanged(lambda: self.repo.tag('release/v1.0.0'))
+        self.assertChanged(lambda: self.repo.tag('release/v1.1.0'))
+        self.assertChanged(lambda: self.repo.git('pack-refs', '--all',
+                                                 '--prune'))
+        self.assertChanged(lambda: self.repo.tag('release/v1.2.0'))
+        self.assertChanged(lambda: self.repo.git('tag', '-f', '-a', '-m', 'x',
+                                                 'release/v1.2.0', 'HEAD~1'))
+
+
+class InotifyWatcherTest(WatcherTests, unittest.TestCase):
+    def create_watcher(self, git_dir):
+        try:
+            return InotifyWatcher(git_dir)
+        except OSError:
+            self.skipTest("inotify is not available")
+
+
+class PollingWatcherTest(WatcherTests, unittest.TestCase):
+    def create_watcher(self, git_dir):
+        return PollingWatcher(git_dir, 0.05)
+
+
+class OperationTest(unittest.TestCase):
+    def test_in_progress(self):
+        repo = ScratchRepo()
+        try:
+            repo.commit()
+            self.assertFalse(operation_in_progress(repo.git_dir))
+            open(os.path.join(repo.git_dir, 'BISECT_LOG'), 'w').close()
+            self.assertTrue(operation_in_progress(repo.git_dir))
+        finally:
+            repo.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,84 @@
+#!/usr/bin/env python2
+# coding=utf-8
+
+"""
+Tests for computing the version information of many repositories at once
+"""
+
+import os
+import json
+import sqlite3
+import unittest
+
+from scratch import ScratchRepo
+from gitver.workspace import repo_versions
+
+
+class WorkspaceTest(unittest.TestCase):
+    def setUp(self):
+        self.repos = [self.create_repo() for i in range(2)]
+        self.good, self.broken = [r.path for r in self.repos]
+
+    def tearDown(self):
+        for repo in self.repos:
+            repo.close()
+
+    def create_repo(self):
+        repo = ScratchRepo()
+        repo.commit()
+        repo.tag('v1.0.0')
+        repo.gitver('init')
+        with open(os.path.join(repo.path, '.gitignore'), 'w') as f:
+            f.write('.gitver\n')
+        return repo
+
+    def versions(self, paths):
+        return dict((r['path'], r) for r in repo_versions(paths, 2))
+
+    def break_next_store(self):
+        # a NEXT custom string that can't be unpickled anymore
+        self.repos[1].gitver('next', '2.0.0')
+        path = os.path.join(self.broken, '.gitver', '.next_store')
+        db = sqlite3.connect(path)
+        db.execute("UPDATE kv SET value = ?", (sqlite3.Binary('garbage'),))
+        db.commit()
+        db.close()
+
+    def check_good(self, results):
+        self.assertTrue(results[self.good]['ok'])
+        self.assertEqual(results[self.good]['version'], '1.0.0')
+
+    def test_corrupted_store(self):
+        self.break_next_store()
+        results = self.versions([self.good, self.broken])
+        self.check_good(results)
+        self.assertFalse(results[self.broken]['ok'])
+        self.assertIn(self.broken, results[self.broken]['error'])
+
+    def test_broken_config(self):
+        with open(os.path.join(self.broken, '.gitver', 'config'), 'w') as f:
+            f.write('{"format": ')
+        results = self.versions([self.good, self.broken])
+        self.check_good(results)
+        self.assertFalse(results[self.broken]['ok'])
+        self.assertIn('configuration file', results[self.broken]['error'])
+
+    def test_not_a_repository(self):
+        missing = os.path.join(self.good, 'missing')
+        results = self.versions([self.good, missing])
+        self.check_good(results)
+        self.assertFalse(results[missing]['ok'])
+
+    def test_command(self):
+        self.break_next_store()
+        status, out, err = self.repos[0].gitver('multi', self.good,
+                                                self.broken)
+        self.assertEqual(status, 1)
+        results = [json.loads(l) for l in out.splitlines()]
+        self.assertEqual(sorted((r['path'], r['ok']) for r in results),
+                         sorted([(self.good, True), (self.broken, False)]))
+        self.assertIn('2 repositories processed, 1 failed', err)
+
+
+if __name__ == '__main__':
+    unittest.main()